@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the bloscpickle command line tool for 'python -m bloscpickle' from the 
+repository root.
+"""
+import sys
+from bloscpickle.bloscpickle import main
+
+sys.exit( main() )
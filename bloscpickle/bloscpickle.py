@@ -1,233 +1,4539 @@
-# -*- coding: utf-8 -*-
-"""
-bloscpickle
-
-Created on Mon Dec 26 15:35:42 2016
-@author: Robert A. McLeod
-@email: robbmcleod@gmail.com
-
-bloscpickle is a serialization interface that sits between the Python pickle 
-library.  It leverages the blosc meta-compressor library to compress data 
-before it is written to disk.
-
-bloscpickle is compatible with the following Python serialization modules:
-    
-* `pickle`
-* `marshal`
-* `json`
-* `jsonpickle`
-* `ujson`
-* `rapidjson`
-* `msgpack-python`
-
-
-TODO: test for speed-ups on IO
-TODO: test for speed-ups on Multiprocessing
-    Unfortunately with the way Multiprocessing is written we can't easily 
-    monkey patch it.  You would have to re-write this file:
-        https://github.com/python/cpython/blob/master/Lib/multiprocessing/reduction.py
-        
-TODO: numpy integration
-TODO: Can we pass blosc a ByteIO instead of a byte object?
-"""
-####### INITIALIZATION ON IMPORT ######
-import sys # TODO: add support for Python 2.7
-import pickle, json, marshal, rapidjson
-import blosc
-NOSHUFFLE = blosc.NOSHUFFLE
-SHUFFLE = blosc.SHUFFLE
-BISHUFFLE = blosc.BITSHUFFLE
-from io import BytesIO, StringIO
-
-
-# Build a dict that references all the pickling options we have available to us.
-_picklers = {}
-_picklers['pickle'] = pickle
-_picklers['json'] = json
-_picklers['marshal'] = marshal
-try:
-    import ujson
-    _picklers['ujson'] =  ujson
-except ImportError:
-    pass
-try:
-    import rapidjson
-    _picklers['rapidjson'] =  rapidjson
-except ImportError:
-    pass
-
-if sys.version_info < (2,8):
-    try:
-        import jsonpickler # Only compatible with Python 2.7
-        _picklers['jsonpickler'] =  jsonpickler
-        # jsonpickler is a little complicated by the fact it can handle multiple 
-        # backends.
-    except ImportError:
-        pass
-    
-try:
-    import msgpack
-    _picklers['msgpack'] =  msgpack
-except ImportError:
-    pass
-
-_defaultPickler = pickle
-_defaultBlocksize = 0 # a value of zero let's blosc pick the blocksize
-blosc.set_blocksize(_defaultBlocksize)
-# Allow blosc to handle the default number of threads
-_defaultCompressor = 'zstd'
-_defaultCLevel = 1
-_defaultShuffle = blosc.NOSHUFFLE
-__version__ = "0.1.0.a0" 
-
-####### SETTING MODULE LEVEL PARAMETERS ######
-def set_pickler( pickler='pickle' ):
-    global _defaultPickler
-    try:
-        _defaultPickler = _picklers[pickler]
-    except:
-        raise KeyError( "Unknown/unfound pickler: {}".format(pickler) )
-
-def set_blocksize( blocksize=0 ):
-    # a value of zero let's blosc pick the blocksize
-    blosc.set_blocksize( blocksize )
-    
-def set_nthreads( nthreads = 1 ):
-    blosc.set_nthreads( nthreads )
-    
-def set_compressor( compressor='zstd' ):
-    global _defaultCompressor
-    _defaultCompressor = compressor
-    
-def set_clevel( clevel=1 ):
-    global _defaultCLevel
-    _defaultCLevel = clevel
-    
-def set_shuffle( shuffle=blosc.NOSHUFFLE ):
-    global _defaultShuffle
-    _defaultShuffle = shuffle
-    
-
-####### MODULE API #######
-def dump( pyObject, stream, pickler=None, compressor=None, 
-          clevel=None, shuffle=None, **pickler_args ):
-    """
-    Dump a Python object 'pyObject' into an io.IOBase subclass (typically 
-    io.FileIO or io.BytesIO) as compressed bytes.
-    
-      pickler: { 'pickle','marshal','json','ujson','jsonpickle' }
-      compressor: { 'zstd', 'lz4' } and others in the blosc library.
-      clevel: {1 ... 9}, for compression level.  1 is advised for 'ztd' and 
-        9 for 'lz4'.  'zstd' sees little benefit to compression ratio for 
-        levels above 4.
-      shuffle: {blosc.NOSHUFFLE,blosc.SHUFFLE,blosc.BITSHUFFLE}, re-orders the 
-      data by most-significant byte or bit. For text data BITSHUFFLE is 
-      recommended for compression ratio or NOSHUFFLE for speed.
-      **pickle_args: are keyword arguments that will be passed to the called 
-        'pickle'-style module, so refer to the documentation for those modules 
-        for their particular keywords.  
-    
-    """
-    if pickler is None: pickler = _defaultPickler
-    if compressor is None: compressor = _defaultCompressor
-    if clevel is None: clevel = _defaultCLevel
-    if shuffle is None: shuffle = _defaultShuffle
-    
-    if pickler in (pickle, marshal, msgpack):
-        bloscStream = BytesIO()
-        pickler.dump( pyObject, bloscStream, **pickler_args )
-        stream.write( blosc.compress( bloscStream.getvalue(), \
-                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor ) )
-        
-#    elif pickler == rapidjson:
-#        # rapidjson's stream interface is not a proper io.StringIO object, so
-#        # we have to use dumps
-#        stream.write(  blosc.compress( pickler.dumps(pyObject, **pickler_args).encode('utf-8'), \
-#                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor ) )
-        
-    else: # JSON works with Unicode, not Bytes
-        bloscStream = StringIO()
-        pickler.dump( pyObject, bloscStream, **pickler_args )
-        stream.write( blosc.compress( bloscStream.getvalue().encode('utf-8'), \
-                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor ) )
-        
-
-
-def dumps(pyObject, pickler=None, compressor=None, 
-          clevel=None, shuffle=None, **pickler_args ):
-    """
-    Dump a Python object 'pyObject' and returns a bytes object that has been
-    compressed by blosc.
-    
-      pickler: { 'pickle','marshal','json','ujson','jsonpickle' }
-      compressor: { 'zstd', 'lz4' } and others in the blosc library.
-      clevel: {1 ... 9}, for compression level.  1 is advised for 'ztd' and 
-        9 for 'lz4'.  'zstd' sees little benefit to compression ratio for 
-        levels above 4.
-      shuffle: {blosc.NOSHUFFLE,blosc.SHUFFLE,blosc.BITSHUFFLE}, re-orders the 
-      data by most-significant byte or bit. For text data BITSHUFFLE is 
-      recommended for compression ratio or NOSHUFFLE for speed.
-      **pickler_args: are keyword arguments that will be passed to the called 
-        'pickle'-style module, so refer to the documentation for those modules 
-        for their particular keywords.  
-    
-    """
-    if pickler is None: pickler = _defaultPickler
-    if compressor is None: compressor = _defaultCompressor
-    if clevel is None: clevel = _defaultCLevel
-    if shuffle is None: shuffle = _defaultShuffle
-    
-    if pickler in (pickle, marshal, msgpack):
-        bloscStream = BytesIO()
-        pickler.dump( pyObject, bloscStream, **pickler_args )
-        return blosc.compress( bloscStream.getvalue(), \
-                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor )
-#    elif pickler == rapidjson:
-#        # rapidjson's stream interface is not a proper io.StringIO object, so
-#        # we have to use dumps
-#        return blosc.compress( pickler.dumps(pyObject, **pickler_args), \
-#                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor )
-    else: # JSON works with Unicode, not Bytes
-        bloscStream = StringIO()
-        pickler.dump( pyObject, bloscStream, **pickler_args )
-        return blosc.compress( bloscStream.getvalue().encode('utf-8'), \
-                    typesize=1, clevel=clevel, shuffle=shuffle, cname=compressor )
-
-def load( stream, pickler=None, **pickler_args ):
-    """
-    Reads an object from a open file-like object and returns it. 
-    
-    stream must have a read() method that returns a bytes string which is blosc 
-    compressed data, with the appropriate blosc header.
-    
-      pickler: { 'pickle','marshal','json','ujson','jsonpickle' }
-      **pickler_args: are keyword arguments that will be passed to the called 
-        'pickle'-style module, so refer to the documentation for those modules 
-        for their particular keywords.
-    """
-    if pickler is None: pickler = _defaultPickler
-    
-    if pickler in (pickle, marshal, msgpack):
-        return pickler.loads( blosc.decompress( stream.read() ), **pickler_args )
-    else:
-        return pickler.loads( blosc.decompress( stream.read() ).decode(), **pickler_args )
-
-
-def loads( bloscBytes, pickler=None, **pickler_args ):
-    """
-    Reads an object from a open file-like object and returns it. 
-    
-    bloscBytes must be a bytes string which is blosc compressed data, with the 
-    appropriate blosc header.
-    
-      pickler: { 'pickle','marshal','json','ujson','jsonpickle' }
-      **pickler_args: are keyword arguments that will be passed to the called 
-        'pickle'-style module, so refer to the documentation for those modules 
-        for their particular keywords.
-    """
-    if pickler is None: pickler = _defaultPickler
-    
-    if pickler in (pickle, marshal, msgpack):
-        return pickler.loads( blosc.decompress( bloscBytes ), **pickler_args )
-    else:
-        return pickler.loads( blosc.decompress( bloscBytes ).decode(), **pickler_args )
+# -*- coding: utf-8 -*-
+"""
+bloscpickle
+
+Created on Mon Dec 26 15:35:42 2016
+@author: Robert A. McLeod
+@email: robbmcleod@gmail.com
+
+bloscpickle is a serialization interface that sits between the Python pickle 
+library.  It leverages the blosc meta-compressor library to compress data 
+before it is written to disk.
+
+bloscpickle is compatible with the following Python serialization modules:
+    
+* `pickle`
+* `marshal`
+* `json`
+* `jsonpickle`
+* `ujson`
+* `rapidjson`
+* `orjson`
+* `msgpack-python`
+
+The command line tool inspects, recompresses, converts and benchmarks trees 
+of bloscpickle files across several processes:
+
+    python -m bloscpickle inspect archive/
+    python -m bloscpickle recompress archive/ --compressor zstd --clevel 1
+    python -m bloscpickle convert archive/ --pickler msgpack --output converted/
+    python -m bloscpickle bench archive/ --codecs lz4 zstd
+
+
+TODO: test for speed-ups on IO
+TODO: Can we pass blosc a ByteIO instead of a byte object?
+"""
+####### INITIALIZATION ON IMPORT ######
+import sys # TODO: add support for Python 2.7
+import pickle, json, marshal
+import blosc
+NOSHUFFLE = blosc.NOSHUFFLE
+SHUFFLE = blosc.SHUFFLE
+BISHUFFLE = blosc.BITSHUFFLE
+import io, os, struct, ctypes, mmap, threading, queue, copy, importlib.util, time, array
+from time import perf_counter
+from collections import deque, OrderedDict
+from bisect import bisect_right
+from collections.abc import MutableMapping, Sequence
+from functools import partial
+import operator
+from itertools import accumulate, chain
+from contextlib import contextmanager
+from io import BytesIO
+
+
+# Registry of the pickling options, name -> (module or import name, kind).  
+# Backends are only imported when first used, and third-party packages can 
+# add their own through the 'bloscpickle.picklers' entry point group (see 
+# register_pickler).  The kind says how a backend is called:
+#   _STREAM: bytes-native with streams, dump() to and load() from binary files
+#   _BYTES:  bytes-native, dumps() returns bytes and loads() takes any buffer
+#   _TEXT:   text-native (the JSON family), dumps() returns str that is 
+#            encoded to UTF-8, and loads() takes the UTF-8 bytes
+_STREAM, _BYTES, _TEXT = 'stream', 'bytes', 'text'
+_PICKLER_ENTRY_POINTS = 'bloscpickle.picklers'
+_registry = { 'pickle': ('pickle', _STREAM), 
+              'marshal': ('marshal', _STREAM), 
+              'msgpack': ('msgpack', _STREAM), 
+              'orjson': ('orjson', _BYTES), 
+              'json': ('json', _TEXT), 
+              'ujson': ('ujson', _TEXT), 
+              'rapidjson': ('rapidjson', _TEXT) }
+_entryPointsLoaded = False
+# Imported backends by name, and the kind of each module object
+_picklers = { 'pickle': pickle, 'marshal': marshal, 'json': json }
+_picklerKinds = { pickle: _STREAM, marshal: _STREAM, json: _TEXT }
+# Whether each pickler gives tuples back as tuples, see _keepsTuples()
+_tupleKeepers = { pickle: True, marshal: True, json: False }
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_defaultPickler = pickle
+_defaultBlocksize = 0 # a value of zero let's blosc pick the blocksize
+blosc.set_blocksize(_defaultBlocksize)
+# Allow blosc to handle the default number of threads
+_defaultCompressor = 'zstd'
+_defaultCLevel = 1
+_defaultShuffle = blosc.NOSHUFFLE
+# dump() and load() stream the serialized bytes through fixed-size blosc chunks
+# so that peak memory is a few chunks regardless of the size of the object.
+_defaultChunksize = 2**22
+# Once enabled with set_typed(), lists of at least this many ints, floats, 
+# bools, strs or records (dicts sharing their keys) are stored as typed arrays 
+# rather than serialized element by element, records column by column.
+_typedMinLength = None
+_defaultTypedMinLength = 2**10
+_typedMaxDepth = 16         # guards against self-referencing containers
+# Elements per block for dumps(..., chunked_sequence=True)
+_defaultSequenceBlock = 2**10
+
+# compressor='auto' picks (cname, clevel, shuffle) by compressing a sample of 
+# the serialized bytes with each candidate.  The choice is cached per object 
+# type (and dtype) so the sampling is only paid once.
+_AUTO = 'auto'
+_autoCandidates = [ (cname, clevel) for cname, clevel in 
+                   (('lz4',1), ('lz4',9), ('zstd',1), ('zstd',5), ('blosclz',5)) 
+                   if cname in blosc.cnames ]
+_autoTarget = 'speed'
+_autoMinSpeed = 0.0         # MB/s, for the 'size' target
+_autoSampleSize = 2**16
+_autoMinSize = 2**10        # payloads smaller than this are stored raw
+_autoMinRatio = 1.05        # samples compressing worse than this are stored raw
+_autoCacheSize = 1024
+_autoCache = {}
+# A clevel of zero makes blosc store the data uncompressed behind its header
+_RAW_SETTINGS = ('blosclz', 0, blosc.NOSHUFFLE)
+
+# dumps_many() and loads_many() share a lazily created thread pool
+_defaultWorkers = os.cpu_count() or 1
+_executor = None
+_executorLock = threading.Lock()
+
+# Callables registered with add_hook() receive a record of the phase timings 
+# and sizes of every dump(), dumps(), load() and loads() call.  With no hooks 
+# registered nothing is timed.
+_hooks = []
+
+# nthreads and blocksize are process-wide in blosc, so changes to them, and 
+# compression by BloscPickler instances that override them, are serialized.
+_bloscSettingsLock = threading.RLock()
+
+# Framed on-disk format:
+#   file header:  magic, format version, flags, chunksize
+#   chunks:       uint32 compressed length followed by a blosc buffer
+#   terminator:   a chunk length of zero
+# The magic can never be mistaken for the first bytes of a bare blosc buffer, 
+# whose first byte is the blosc format version.
+_FRAME_MAGIC = b'BPKF'
+_FRAME_VERSION = 1
+_frameHeader = struct.Struct( '<4sBBxxI' )
+_chunkHeader = struct.Struct( '<I' )
+# With the out-of-band flag set the file header is followed by a buffer count 
+# and, per buffer, its itemsize and length plus its own chunk sequence.  The 
+# in-band pickle stream comes last, so every buffer is available when 
+# unpickling starts.
+_FLAG_OUT_OF_BAND = 0x01
+_countHeader = struct.Struct( '<I' )
+_bufferHeader = struct.Struct( '<IQ' )
+# With the NumPy flag set the file header is followed by a length-prefixed JSON 
+# description of the array container and then one chunk sequence per array.
+_FLAG_NUMPY = 0x02
+# With the typed flag set the file header is followed by a length-prefixed JSON 
+# description of the container, with the typecode and length of each typed 
+# buffer, then one chunk sequence per buffer and last a chunk sequence holding 
+# the serialized list of everything that could not be typed.
+_FLAG_TYPED = 0x04
+# With the sequence flag set the chunksize field holds the number of elements 
+# per block, and the file header is followed by the total number of elements, 
+# the number of blocks and whether the sequence is a tuple, then the 
+# compressed length of every block, then the blocks, each a complete dumps() 
+# of its elements, so any one of them can be located and loaded on its own.
+_FLAG_SEQUENCE = 0x08
+_sequenceHeader = struct.Struct( '<QIB3x' )
+# Streams with any of these flags hold more than one serialized byte stream
+_FLAGS_MULTIPART = _FLAG_OUT_OF_BAND | _FLAG_NUMPY | _FLAG_TYPED | _FLAG_SEQUENCE
+# Self-describing header, written by default in front of the frame header or 
+# bare blosc buffer of every dump()/dumps():  magic, version, clevel, shuffle, 
+# raw size (all ones if unknown), then the pickler name, compressor and content 
+# type, each a length byte and UTF-8.  loads() picks the pickler from it.  The 
+# raw size is the total uncompressed size of every part, filled in after they 
+# have been written where the output is seekable.
+_INFO_MAGIC = b'BPKI'
+_INFO_VERSION = 1
+_infoHeader = struct.Struct( '<4sBBBxQ' )
+_rawSizeField = struct.Struct( '<Q' )
+_rawSizeOffset = _infoHeader.size - _rawSizeField.size
+_RAW_SIZE_UNKNOWN = 2**64 - 1
+_selfDescribing = True
+# The blosc header stores the uncompressed, block and compressed sizes after 
+# four bytes of version and flags.  blosc.get_cbuffer_sizes() only accepts 
+# bytes, so the header is parsed here to work on memoryviews and mmaps too.
+_bloscHeader = struct.Struct( '<4xIII' )
+__version__ = "0.1.0.a0" 
+
+####### SETTING MODULE LEVEL PARAMETERS ######
+def set_pickler( pickler='pickle' ):
+    global _defaultPickler
+    _defaultPickler = _loadPickler( pickler )
+
+def set_blocksize( blocksize=0 ):
+    # a value of zero let's blosc pick the blocksize
+    with _bloscSettingsLock:
+        blosc.set_blocksize( blocksize )
+    
+def set_nthreads( nthreads = 1 ):
+    with _bloscSettingsLock:
+        blosc.set_nthreads( nthreads )
+    
+def set_compressor( compressor='zstd' ):
+    global _defaultCompressor
+    _defaultCompressor = compressor
+    
+def set_clevel( clevel=1 ):
+    global _defaultCLevel
+    _defaultCLevel = clevel
+    
+def set_shuffle( shuffle=blosc.NOSHUFFLE ):
+    global _defaultShuffle
+    _defaultShuffle = shuffle
+    
+def set_chunksize( chunksize=2**22 ):
+    global _defaultChunksize
+    if not 0 < chunksize <= blosc.MAX_BUFFERSIZE:
+        raise ValueError( "chunksize must be in the range (0, {}]".format(blosc.MAX_BUFFERSIZE) )
+    _defaultChunksize = chunksize
+    
+def set_auto( target='speed', min_speed=0.0, sample_size=2**16 ):
+    """
+    Configure compressor='auto'.
+    
+      target: 'speed' picks the candidate with the highest compression 
+        throughput, 'size' the smallest output among the candidates that 
+        compress at min_speed MB/s or faster.
+      sample_size: the number of serialized bytes compressed per candidate.
+    """
+    global _autoTarget, _autoMinSpeed, _autoSampleSize
+    if target not in ('speed', 'size'):
+        raise ValueError( "Unknown auto target: {}".format(target) )
+    _autoTarget = target
+    _autoMinSpeed = min_speed
+    _autoSampleSize = sample_size
+    _autoCache.clear()
+    
+def set_typed( min_length=_defaultTypedMinLength ):
+    """
+    Set the shortest list of scalars or records that dump() and dumps() 
+    store as typed arrays (see dumps).  Typed storage is off by default, 
+    and None turns it off again.  Its output holds several parts, so it 
+    cannot be read by load_into(), load_mmap() or BloscFile.
+    """
+    global _typedMinLength
+    _typedMinLength = min_length
+    
+def set_self_describing( enabled=True ):
+    """
+    If False, dump() and dumps() write no header recording the pickler, 
+    codec settings and raw size (see inspect), for readers of earlier versions.
+    """
+    global _selfDescribing
+    _selfDescribing = bool(enabled)
+    
+def clear_auto_cache():
+    _autoCache.clear()
+    
+def set_workers( nworkers=None ):
+    """
+    Set the number of threads that dumps_many() and loads_many() spread 
+    blosc compression over.  None uses one thread per core.  Leave blosc's 
+    own nthreads at 1 when the pool is in use to avoid oversubscription.
+    """
+    global _defaultWorkers, _executor
+    with _executorLock:
+        _defaultWorkers = nworkers or os.cpu_count() or 1
+        if _executor is not None:
+            _executor.shutdown( wait=False )
+            _executor = None
+    
+
+####### PICKLER REGISTRY #######
+def _picklerKindOf( bytes_native, streaming ):
+    if not bytes_native:
+        return _TEXT
+    return _STREAM if streaming else _BYTES
+
+def register_pickler( name, module, bytes_native=True, streaming=True ):
+    """
+    Make a serialization module available by name to every function that 
+    takes a pickler.  
+    
+      module: the module, or any object with the same interface, or its 
+        import name, in which case it is only imported when first used.
+      bytes_native: True if the module produces bytes.  False if 
+        module.dumps() returns str, as json does; the str is encoded to 
+        UTF-8 and module.loads() is given the UTF-8 bytes.
+      streaming: for bytes-native modules, True if module.dump() writes to 
+        and module.load() reads from a binary stream, as pickle does.  False 
+        if module.dumps() returns bytes and module.loads() accepts bytes and 
+        memoryviews, as orjson does.
+    
+    Installed packages can register backends without being imported by 
+    declaring an entry point in the 'bloscpickle.picklers' group, naming the 
+    module or object.  Its bytes_native and streaming attributes, if any, 
+    override the defaults of True.
+    """
+    kind = _picklerKindOf( bytes_native, streaming )
+    _registry[name] = (module, kind)
+    loaded = _picklers.pop( name, None )
+    if loaded is not None:
+        _picklerKinds.pop( loaded, None )
+    if not isinstance( module, str ):
+        _picklerKinds[module] = kind
+
+def _loadEntryPoints():
+    """
+    Add the backends declared by installed packages to the registry.  
+    importlib.metadata is slow to import and scan, so this only happens when 
+    a name is not registered, or for available_picklers().
+    """
+    global _entryPointsLoaded
+    if _entryPointsLoaded:
+        return
+    _entryPointsLoaded = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return
+    try:
+        found = entry_points( group=_PICKLER_ENTRY_POINTS )
+    except TypeError: # Python < 3.10
+        found = entry_points().get( _PICKLER_ENTRY_POINTS, [] )
+    for entryPoint in found:
+        if entryPoint.name not in _registry:
+            _registry[entryPoint.name] = (entryPoint, None)
+
+def available_picklers():
+    """
+    Return the sorted names of the registered picklers that can be imported, 
+    without importing them.
+    """
+    _loadEntryPoints()
+    names = []
+    for name, (module, kind) in _registry.items():
+        if isinstance( module, str ):
+            try:
+                if importlib.util.find_spec( module ) is None:
+                    continue
+            except (ImportError, ValueError):
+                continue
+        names.append( name )
+    return sorted( names )
+
+def _loadPickler( name ):
+    """
+    Import the pickler registered as name on first use.
+    """
+    try:
+        return _picklers[name]
+    except KeyError:
+        pass
+    if name not in _registry:
+        _loadEntryPoints()
+    try:
+        module, kind = _registry[name]
+    except KeyError:
+        raise KeyError( "Unknown/unfound pickler: {}".format(name) )
+    if isinstance( module, str ):
+        module = importlib.import_module( module )
+    elif kind is None: # an entry point
+        module = module.load()
+        kind = _picklerKindOf( getattr( module, 'bytes_native', True ), 
+                               getattr( module, 'streaming', True ) )
+    _picklerKinds[module] = kind
+    _picklers[name] = module
+    return module
+
+def _resolvePickler( pickler ):
+    if pickler is None:
+        return _defaultPickler
+    if isinstance( pickler, str ):
+        return _loadPickler( pickler )
+    return pickler
+
+def _picklerKind( pickler ):
+    """
+    Return how pickler is called, _STREAM, _BYTES or _TEXT.  Modules passed 
+    in directly are looked up in the registry by their __name__; unknown 
+    ones are treated as text-native.
+    """
+    try:
+        return _picklerKinds[pickler]
+    except KeyError:
+        pass
+    entry = _registry.get( getattr( pickler, '__name__', None ) )
+    kind = entry[1] if entry and entry[1] is not None else _TEXT
+    _picklerKinds[pickler] = kind
+    return kind
+
+def _keepsTuples( pickler ):
+    """
+    True if pickler gives tuples back as tuples.  JSON and msgpack give lists, 
+    so the typed and chunked sequence layouts rebuild lists for them as 
+    well, and a tuple comes back the same way whichever layout it was in.
+    """
+    try:
+        return _tupleKeepers[pickler]
+    except KeyError:
+        pass
+    try:
+        serialized = bytes( _serialize( ((),), pickler ) )
+        if _picklerKind( pickler ) is _TEXT:
+            serialized = serialized.decode( 'utf-8' )
+        keeps = type( pickler.loads( serialized ) ) is tuple
+    except Exception:
+        keeps = False
+    _tupleKeepers[pickler] = keeps
+    return keeps
+    
+
+####### THREAD POOL #######
+def _getExecutor():
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            # python-blosc holds the GIL while (de)compressing unless told 
+            # otherwise, which would serialize the pool
+            blosc.set_releasegil( True )
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor( max_workers=_defaultWorkers, 
+                                            thread_name_prefix='bloscpickle' )
+        return _executor
+
+def _forgetExecutor():
+    # A forked child inherits the pool but none of its threads, so anything 
+    # submitted to it would wait forever; the child creates its own instead
+    global _executor, _executorLock
+    _executor = None
+    _executorLock = threading.Lock()
+
+if hasattr( os, 'register_at_fork' ):
+    os.register_at_fork( after_in_child=_forgetExecutor )
+
+def _mapOrdered( tasks ):
+    """
+    Run an iterable of zero-argument callables on the thread pool and yield 
+    their results in order.  Only a few tasks per worker are kept in flight, 
+    so a generator input is not consumed far ahead of the output.
+    """
+    executor = _getExecutor()
+    window = 4 * _defaultWorkers
+    pending = deque()
+    for task in tasks:
+        pending.append( executor.submit( task ) )
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+    
+
+####### INSTRUMENTATION #######
+def add_hook( hook ):
+    """
+    Register hook, a callable that is passed a dict for every completed 
+    dump(), dumps(), load() and loads() call, including those made by 
+    BloscPickler, BloscUnpickler and the other helpers:
+    
+      op: { 'dump', 'dumps', 'load', 'loads' }
+      pickler: the name of the pickler module.
+      compressor, clevel, shuffle: the blosc settings used for the last chunk, 
+        after 'auto' has been resolved.  None for loads.
+      raw_size, compressed_size: bytes before and after blosc.
+      serialize_time: seconds spent in the pickler, i.e. the rest of the call.
+      compress_time: seconds in blosc, compressing or decompressing.
+      io_time: seconds spent writing to or reading from the stream.
+      total_time: seconds for the whole call.
+    
+    Hooks run on the calling thread; BloscStats is a ready-made collector.  
+    While no hook is registered the calls are not timed at all.
+    """
+    if hook not in _hooks:
+        _hooks.append( hook )
+    
+def remove_hook( hook ):
+    if hook in _hooks:
+        _hooks.remove( hook )
+
+
+class _CallState(threading.local):
+    timings = None
+
+_callState = _CallState()
+
+class _CallTimings(object):
+    """
+    Accumulates the blosc and stream time of one instrumented call.
+    """
+    __slots__ = ('rawSize', 'compressedSize', 'codecTime', 'ioTime', 'settings')
+    
+    def __init__( self ):
+        self.rawSize = 0
+        self.compressedSize = 0
+        self.codecTime = 0.0
+        self.ioTime = 0.0
+        self.settings = (None, None, None)
+        
+    def codec( self, rawSize, compressedSize, seconds ):
+        self.rawSize += rawSize
+        self.compressedSize += compressedSize
+        self.codecTime += seconds
+
+def _instrument( op, pickler, task ):
+    """
+    Run task, a zero-argument call back into the public function or method 
+    that called _instrument(), with timing switched on for this thread, and 
+    pass the resulting record to the hooks.  Nested calls (dumps() of NumPy 
+    arrays goes through dump(), for instance) are only recorded once.
+    """
+    timings = _callState.timings = _CallTimings()
+    t0 = perf_counter()
+    try:
+        result = task()
+    finally:
+        _callState.timings = None
+    totalTime = perf_counter() - t0
+    
+    pickler = _resolvePickler( pickler )
+    compressor, clevel, shuffle = timings.settings
+    record = { 'op': op, 'pickler': getattr( pickler, '__name__', str(pickler) ),
+               'compressor': compressor, 'clevel': clevel, 'shuffle': shuffle,
+               'raw_size': timings.rawSize, 'compressed_size': timings.compressedSize,
+               'serialize_time': max( totalTime - timings.codecTime - timings.ioTime, 0.0 ),
+               'compress_time': timings.codecTime, 'io_time': timings.ioTime,
+               'total_time': totalTime }
+    for hook in tuple(_hooks):
+        hook( record )
+    return result
+
+
+class BloscStats(object):
+    """
+    Hook that keeps cumulative counters and histograms per operation, for 
+    export to a metrics system:
+    
+        stats = bloscpickle.BloscStats()
+        bloscpickle.add_hook( stats )
+        ...
+        stats.snapshot()['dumps']['total_time']
+    
+    Histograms are cumulative, in the style of Prometheus: each bucket counts 
+    the calls whose value was less than or equal to its upper bound.
+    
+      time_buckets: upper bounds, in seconds, for the 'total_time' histogram.
+      ratio_buckets: upper bounds for the compression ratio histogram.
+    """
+    _counters = ('raw_size', 'compressed_size', 'serialize_time', 
+                 'compress_time', 'io_time', 'total_time')
+    
+    def __init__( self, time_buckets=(1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0), 
+                  ratio_buckets=(1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 50.0) ):
+        self.time_buckets = tuple(time_buckets)
+        self.ratio_buckets = tuple(ratio_buckets)
+        self._lock = threading.Lock()
+        self._ops = {}
+        
+    def _newOp( self ):
+        op = dict.fromkeys( self._counters, 0 )
+        op['calls'] = 0
+        op['time_histogram'] = [0] * (len(self.time_buckets) + 1)
+        op['ratio_histogram'] = [0] * (len(self.ratio_buckets) + 1)
+        return op
+    
+    @staticmethod
+    def _bucket( bounds, value ):
+        for I, bound in enumerate( bounds ):
+            if value <= bound:
+                return I
+        return len(bounds)
+        
+    def __call__( self, record ):
+        timeBucket = self._bucket( self.time_buckets, record['total_time'] )
+        ratioBucket = None
+        if record['compressed_size']:
+            ratioBucket = self._bucket( self.ratio_buckets, 
+                                        record['raw_size'] / record['compressed_size'] )
+        with self._lock:
+            op = self._ops.get( record['op'] )
+            if op is None:
+                op = self._ops[record['op']] = self._newOp()
+            op['calls'] += 1
+            for counter in self._counters:
+                op[counter] += record[counter]
+            op['time_histogram'][timeBucket] += 1
+            if ratioBucket is not None:
+                op['ratio_histogram'][ratioBucket] += 1
+    
+    @staticmethod
+    def _cumulative( bounds, counts ):
+        buckets = []
+        total = 0
+        for bound, count in zip( bounds + (float('inf'),), counts ):
+            total += count
+            buckets.append( (bound, total) )
+        return buckets
+        
+    def snapshot( self ):
+        """
+        Return {op: counters} where the counters are the number of calls, the 
+        summed sizes and phase times, and the 'time_histogram' and 
+        'ratio_histogram' as lists of (upper bound, cumulative count).
+        """
+        with self._lock:
+            snapshot = {}
+            for name, op in self._ops.items():
+                counters = { key: value for key, value in op.items() 
+                            if not key.endswith( '_histogram' ) }
+                counters['time_histogram'] = self._cumulative( self.time_buckets, op['time_histogram'] )
+                counters['ratio_histogram'] = self._cumulative( self.ratio_buckets, op['ratio_histogram'] )
+                snapshot[name] = counters
+            return snapshot
+    
+    def reset( self ):
+        with self._lock:
+            self._ops.clear()
+    
+
+####### AUTOMATIC SETTINGS #######
+def _autoKey( pyObject, pickler=None ):
+    """
+    Cache key for the settings chosen by compressor='auto'.
+    """
+    dtype = getattr( pyObject, 'dtype', None )
+    return ( type(pyObject), getattr(pickler, '__name__', None), 
+            None if dtype is None else str(dtype) )
+
+def _autoSample( view, typesize ):
+    """
+    Gather up to _autoSampleSize bytes from four evenly spaced positions of 
+    view, keeping the pieces aligned to typesize.
+    """
+    if len(view) <= _autoSampleSize:
+        return view
+    pieceSize = max( _autoSampleSize // 4 - (_autoSampleSize // 4) % typesize, typesize )
+    stride = (len(view) - pieceSize) // 3
+    stride -= stride % typesize
+    return b''.join( view[I*stride:I*stride+pieceSize] for I in range(4) )
+
+def _probeSettings( sample, typesize ):
+    """
+    Compress sample with every candidate and return the settings that best 
+    fit the configured target, or raw storage if the sample is incompressible.
+    """
+    shuffles = [blosc.NOSHUFFLE, blosc.BITSHUFFLE]
+    if typesize > 1:
+        shuffles.insert( 1, blosc.SHUFFLE )
+    results = []
+    for cname, clevel in _autoCandidates:
+        for shuffle in shuffles:
+            t0 = perf_counter()
+            size = len( blosc.compress( sample, typesize=typesize, clevel=clevel, 
+                                        shuffle=shuffle, cname=cname ) )
+            speed = len(sample) / 2**20 / max( perf_counter() - t0, 1e-9 )
+            results.append( (cname, clevel, shuffle, size, speed) )
+    if not results or len(sample) / min( result[3] for result in results ) < _autoMinRatio:
+        return _RAW_SETTINGS
+    if _autoTarget == 'size':
+        fastEnough = [ result for result in results if result[4] >= _autoMinSpeed ]
+        if fastEnough:
+            best = min( fastEnough, key=lambda result: result[3] )
+        else:
+            best = max( results, key=lambda result: result[4] )
+    else:
+        compressible = [ result for result in results if len(sample) / result[3] >= _autoMinRatio ]
+        best = max( compressible, key=lambda result: result[4] )
+    return best[:3]
+
+def _autoSettings( key, data, typesize=1 ):
+    """
+    Return the (cname, clevel, shuffle) to use for data, probing a sample 
+    the first time a key is seen.  Tiny payloads are stored raw.
+    """
+    view = memoryview(data).cast('B')
+    if len(view) < _autoMinSize:
+        return _RAW_SETTINGS
+    settings = _autoCache.get( key )
+    if settings is None:
+        settings = _probeSettings( _autoSample( view, typesize ), typesize )
+        if len(_autoCache) >= _autoCacheSize:
+            _autoCache.clear()
+        _autoCache[key] = settings
+    return settings
+    
+
+####### FRAMED STREAMS #######
+def _readExact( stream, nbytes ):
+    """
+    Read exactly nbytes from stream, looping over short reads.  Raises 
+    EOFError if the stream ends early.
+    """
+    data = stream.read( nbytes )
+    if data is None: data = b''
+    if len(data) == nbytes:
+        return data
+    parts = [data]
+    remaining = nbytes - len(data)
+    while remaining > 0:
+        data = stream.read( remaining )
+        if not data:
+            raise EOFError( "Truncated bloscpickle stream: expected {} more bytes".format(remaining) )
+        parts.append( data )
+        remaining -= len(data)
+    return b''.join( parts )
+
+
+def _writeFrameHeader( stream, chunksize, flags=0 ):
+    stream.write( _frameHeader.pack( _FRAME_MAGIC, _FRAME_VERSION, flags, chunksize ) )
+
+
+def _bloscSizes( bloscBytes ):
+    """
+    Return the (uncompressed, compressed) sizes from a blosc buffer header.
+    """
+    nbytes, blocksize, cbytes = _bloscHeader.unpack_from( bloscBytes )
+    return nbytes, cbytes
+
+def _bufferAddress( view ):
+    """
+    Return the memory address of a writable, contiguous, non-empty byte 
+    memoryview (bytearray, mmap, NumPy array, ...) for blosc's pointer API.
+    """
+    return ctypes.addressof( ctypes.c_char.from_buffer(view) )
+
+def _readIntoExact( stream, view ):
+    """
+    Fill the byte memoryview view from stream, looping over short reads.
+    """
+    offset = 0
+    while offset < len(view):
+        if hasattr( stream, 'readinto' ):
+            nbytes = stream.readinto( view[offset:] )
+        else:
+            data = stream.read( len(view) - offset )
+            nbytes = len(data)
+            view[offset:offset+nbytes] = data
+        if not nbytes:
+            raise EOFError( "Truncated bloscpickle stream: expected {} more bytes".format(len(view) - offset) )
+        offset += nbytes
+
+
+class _BufferStream(object):
+    """
+    Minimal read-only stream over an in-memory or memory-mapped buffer.  
+    read() returns memoryview slices, so compressed chunks are handed to blosc 
+    without being copied out of the buffer first.
+    """
+    def __init__( self, buffer ):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+        
+    def read( self, nbytes=-1 ):
+        start = self._pos
+        if nbytes is None or nbytes < 0:
+            self._pos = len(self._view)
+        else:
+            self._pos = min( start + nbytes, len(self._view) )
+        return self._view[start:self._pos]
+    
+    def readinto( self, buffer ):
+        data = self.read( len(memoryview(buffer).cast('B')) )
+        memoryview(buffer).cast('B')[:len(data)] = data
+        return len(data)
+
+
+class _BloscChunkWriter(io.RawIOBase):
+    """
+    Write-only file-like sink that cuts everything written to it into 
+    chunksize blocks, compresses each block with blosc and writes it as a 
+    chunk to stream.  close() flushes the last partial chunk and writes the 
+    terminator; it does not close the underlying stream.  rawSize counts the 
+    bytes written.
+    """
+    def __init__( self, stream, chunksize, compressor, clevel, shuffle, typesize=1, 
+                  autoKey=None ):
+        super().__init__()
+        if not 0 < chunksize <= blosc.MAX_BUFFERSIZE:
+            raise ValueError( "chunksize must be in the range (0, {}]".format(blosc.MAX_BUFFERSIZE) )
+        self._stream = stream
+        self._chunksize = chunksize
+        self._compressor = compressor
+        self._clevel = clevel
+        self._shuffle = shuffle
+        self._typesize = typesize
+        self._autoKey = autoKey
+        self._buffer = bytearray()
+        self._timings = _callState.timings if _hooks else None
+        self.rawSize = 0
+        
+    def writable( self ):
+        return True
+    
+    def _writeChunk( self, chunk ):
+        if self._compressor == _AUTO:
+            # Settings are chosen from the first chunk and kept for the rest
+            self._compressor, self._clevel, self._shuffle = _autoSettings( 
+                    self._autoKey, chunk, self._typesize )
+        timings = self._timings
+        if timings is not None:
+            t0 = perf_counter()
+        compressed = blosc.compress( chunk, typesize=self._typesize, clevel=self._clevel, 
+                                     shuffle=self._shuffle, cname=self._compressor )
+        if timings is not None:
+            t1 = perf_counter()
+            timings.codec( len(chunk), len(compressed), t1 - t0 )
+            timings.settings = (self._compressor, self._clevel, self._shuffle)
+        self._stream.write( _chunkHeader.pack( len(compressed) ) )
+        self._stream.write( compressed )
+        if timings is not None:
+            timings.ioTime += perf_counter() - t1
+    
+    def write( self, data ):
+        if self.closed:
+            raise ValueError( "write to closed file" )
+        view = memoryview(data).cast('B')
+        nbytes = len(view)
+        self.rawSize += nbytes
+        chunksize = self._chunksize
+        if self._buffer:
+            fill = min( chunksize - len(self._buffer), len(view) )
+            self._buffer += view[:fill]
+            view = view[fill:]
+            if len(self._buffer) < chunksize:
+                return nbytes
+            self._writeChunk( self._buffer )
+            self._buffer = bytearray()
+        # Whole chunks are compressed directly out of the caller's buffer
+        while len(view) >= chunksize:
+            self._writeChunk( view[:chunksize] )
+            view = view[chunksize:]
+        self._buffer += view
+        return nbytes
+    
+    def close( self ):
+        if not self.closed:
+            if self._buffer:
+                self._writeChunk( self._buffer )
+                self._buffer = bytearray()
+            self._stream.write( _chunkHeader.pack( 0 ) )
+        super().close()
+    
+    def abort( self ):
+        """
+        Close without flushing or terminating the chunk sequence, after the 
+        serializer failed.
+        """
+        super().close()
+
+
+class _PipelinedChunkWriter(_BloscChunkWriter):
+    """
+    _BloscChunkWriter that hands each chunk to the thread pool for 
+    compression and returns at once, so the serializer keeps running while 
+    blosc works.  A dedicated thread writes the compressed chunks to stream 
+    in order.  At most a few chunks per worker are in flight, which bounds 
+    the memory held and pushes back on a serializer that outruns the pool.
+    """
+    def __init__( self, *args, **kwargs ):
+        super().__init__( *args, **kwargs )
+        self._executor = _getExecutor()
+        self._pending = queue.Queue( maxsize=2 * _defaultWorkers + 1 )
+        self._error = None
+        self._thread = threading.Thread( target=self._drain, name='bloscpickle-writer', 
+                                         daemon=True )
+        self._thread.start()
+    
+    @staticmethod
+    def _compress( chunk, typesize, clevel, shuffle, compressor ):
+        t0 = perf_counter()
+        compressed = blosc.compress( chunk, typesize=typesize, clevel=clevel, 
+                                     shuffle=shuffle, cname=compressor )
+        return compressed, perf_counter() - t0
+    
+    def _drain( self ):
+        # Timings are only updated from this thread
+        timings = self._timings
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue # keep consuming so that _writeChunk() never blocks
+            future, rawSize = item
+            try:
+                compressed, codecTime = future.result()
+                t0 = perf_counter()
+                self._stream.write( _chunkHeader.pack( len(compressed) ) )
+                self._stream.write( compressed )
+                if timings is not None:
+                    timings.codec( rawSize, len(compressed), codecTime )
+                    timings.ioTime += perf_counter() - t0
+            except BaseException as e:
+                self._error = e
+    
+    def _writeChunk( self, chunk ):
+        if self._error is not None:
+            raise self._error
+        if self._compressor == _AUTO:
+            self._compressor, self._clevel, self._shuffle = _autoSettings( 
+                    self._autoKey, chunk, self._typesize )
+        if self._timings is not None:
+            self._timings.settings = (self._compressor, self._clevel, self._shuffle)
+        if isinstance( chunk, memoryview ) and not chunk.readonly:
+            # A writable buffer may be reused by the caller once write() 
+            # returns; read-only ones are compressed where they are
+            chunk = bytes( chunk )
+        future = self._executor.submit( self._compress, chunk, self._typesize, 
+                                        self._clevel, self._shuffle, self._compressor )
+        self._pending.put( (future, len(chunk)) )
+    
+    def _join( self ):
+        self._pending.put( None )
+        self._thread.join()
+    
+    def close( self ):
+        if not self.closed:
+            try:
+                if self._buffer:
+                    self._writeChunk( self._buffer )
+                    self._buffer = bytearray()
+            finally:
+                self._join()
+                io.RawIOBase.close( self )
+            if self._error is not None:
+                raise self._error
+            self._stream.write( _chunkHeader.pack( 0 ) )
+    
+    def abort( self ):
+        if not self.closed:
+            self._join()
+        io.RawIOBase.close( self )
+
+
+class _BloscChunkReader(io.RawIOBase):
+    """
+    Read-only file-like source that decompresses the frames written by 
+    _BloscChunkWriter one chunk at a time.  The file header must already have 
+    been consumed from stream.
+    """
+    def __init__( self, stream ):
+        super().__init__()
+        self._stream = stream
+        self._chunk = b''
+        self._pos = 0
+        self._eof = False
+        self._timings = _callState.timings if _hooks else None
+        
+    def readable( self ):
+        return True
+    
+    def _nextChunk( self, view ):
+        """
+        Decompress the next chunk, straight into view if it is large enough 
+        to hold all of it.  Returns the number of bytes written to view.
+        """
+        self._chunk = b''
+        self._pos = 0
+        timings = self._timings
+        if timings is not None:
+            t0 = perf_counter()
+        clen, = _chunkHeader.unpack( _readExact( self._stream, _chunkHeader.size ) )
+        if clen == 0:
+            self._eof = True
+            if timings is not None:
+                timings.ioTime += perf_counter() - t0
+            return 0
+        compressed = _readExact( self._stream, clen )
+        rawsize = _bloscSizes( compressed )[0]
+        if timings is not None:
+            t1 = perf_counter()
+            timings.ioTime += t1 - t0
+        if 0 < rawsize <= len(view):
+            blosc.decompress_ptr( compressed, _bufferAddress( view ) )
+            nbytes = rawsize
+        else:
+            self._chunk = blosc.decompress( compressed )
+            nbytes = 0
+        if timings is not None:
+            timings.codec( rawsize, clen, perf_counter() - t1 )
+        return nbytes
+    
+    def readinto( self, buffer ):
+        view = memoryview(buffer).cast('B')
+        if len(view) == 0:
+            return 0
+        while self._pos >= len(self._chunk):
+            if self._eof:
+                return 0
+            nbytes = self._nextChunk( view )
+            if nbytes:
+                return nbytes
+        nbytes = min( len(view), len(self._chunk) - self._pos )
+        view[:nbytes] = self._chunk[self._pos:self._pos+nbytes]
+        self._pos += nbytes
+        return nbytes
+
+
+def _readChunksInto( stream, buffer, exact=True ):
+    """
+    Decompress a chunk sequence from stream directly into the writable 
+    buffer, which must be exactly the size of the uncompressed data unless 
+    exact is False.  Returns the number of bytes written.
+    """
+    view = memoryview(buffer).cast('B')
+    nbytes = len(view)
+    if nbytes > 0:
+        address = _bufferAddress( view )
+    offset = 0
+    timings = _callState.timings if _hooks else None
+    while True:
+        if timings is not None:
+            t0 = perf_counter()
+        clen, = _chunkHeader.unpack( _readExact( stream, _chunkHeader.size ) )
+        if clen == 0:
+            break
+        compressed = _readExact( stream, clen )
+        rawsize = _bloscSizes( compressed )[0]
+        if offset + rawsize > nbytes:
+            raise ValueError( "Buffer of {} bytes is too small for the decompressed data".format(nbytes) )
+        if timings is not None:
+            t1 = perf_counter()
+            timings.ioTime += t1 - t0
+        blosc.decompress_ptr( compressed, address + offset )
+        if timings is not None:
+            timings.codec( rawsize, clen, perf_counter() - t1 )
+        offset += rawsize
+    if exact and offset != nbytes:
+        raise ValueError( "Corrupt bloscpickle stream: expected {} bytes, got {}".format(nbytes, offset) )
+    return offset
+
+
+def _isFramed( bloscBytes ):
+    return bytes(bloscBytes[:len(_FRAME_MAGIC)]) == _FRAME_MAGIC
+
+def _parseFrameHeader( header ):
+    """
+    Validate an already read file header, returning its flags and chunksize.
+    """
+    magic, version, flags, chunksize = _frameHeader.unpack( header )
+    if version > _FRAME_VERSION:
+        raise ValueError( "Unsupported bloscpickle frame version: {}".format(version) )
+    return flags, chunksize
+
+def _openFrameReader( stream, chunksize ):
+    """
+    Return a buffered reader over the decompressed contents of stream.
+    """
+    return io.BufferedReader( _BloscChunkReader(stream), buffer_size=min(chunksize, 2**20) )
+
+def _loadFrames( stream, chunksize, pickler, **pickler_args ):
+    """
+    Deserialize the run of chunks at stream with pickler, and leave stream 
+    at whatever follows the run.
+    """
+    bloscStream = _openFrameReader( stream, chunksize )
+    if _picklerKind( pickler ) is not _STREAM:
+        # The JSON decoders accept UTF-8 bytes, which skips a decode()
+        return pickler.loads( bloscStream.read(), **pickler_args )
+    pyObject = pickler.load( bloscStream, **pickler_args )
+    # pickle stops at its STOP opcode, short of the terminating chunk header
+    bloscStream.read()
+    return pyObject
+
+
+def _readLegacy( stream, header ):
+    """
+    Read the rest of a headerless single blosc buffer whose first bytes have 
+    already been consumed, sizing the result from the blosc header instead 
+    of concatenating a full stream.read().
+    """
+    if len(header) < _bloscHeader.size:
+        header += _readExact( stream, _bloscHeader.size - len(header) )
+    cbytes = _bloscSizes( header )[1]
+    bloscBytes = bytearray( max(cbytes, len(header)) )
+    bloscBytes[:len(header)] = header
+    _readIntoExact( stream, memoryview(bloscBytes)[len(header):] )
+    return bloscBytes
+
+
+def _rawSize( bloscBytes ):
+    """
+    Return the uncompressed size of a legacy blob or a framed byte stream by 
+    walking the chunk headers, without decompressing anything.
+    """
+    info, bloscBytes = _splitInfo( bloscBytes )
+    if not _isFramed( bloscBytes ):
+        return _bloscSizes( bloscBytes )[0]
+    view = memoryview(bloscBytes).cast('B')
+    flags, chunksize = _parseFrameHeader( view[:_frameHeader.size] )
+    if flags & _FLAGS_MULTIPART:
+        raise ValueError( "Only streams holding a single serialized byte stream have a raw size" )
+    offset = _frameHeader.size
+    nbytes = 0
+    while True:
+        clen, = _chunkHeader.unpack_from( view, offset )
+        offset += _chunkHeader.size
+        if clen == 0:
+            return nbytes
+        nbytes += _bloscSizes( view[offset:offset+clen] )[0]
+        offset += clen
+
+def _mapFile( path ):
+    """
+    Memory-map the file at path read-only.
+    """
+    with io.open( path, 'rb' ) as fh:
+        if os.fstat( fh.fileno() ).st_size == 0:
+            raise EOFError( "Cannot load from an empty file: {}".format(path) )
+        return mmap.mmap( fh.fileno(), 0, access=mmap.ACCESS_READ )
+
+def _closeMapping( mapped ):
+    try:
+        mapped.close()
+    except BufferError:
+        # A memoryview is still alive (e.g. held by a traceback); the mapping 
+        # is released when it is garbage collected.
+        pass
+
+
+####### SELF-DESCRIBING HEADER #######
+# blosc's compressor format codes (bits 5-7 of its flags byte)
+_bloscFormats = { 0: 'blosclz', 1: 'lz4', 2: 'snappy', 3: 'zlib', 4: 'zstd' }
+
+def _picklerName( pickler ):
+    """
+    Return the registered name of a pickler module, or '' if it has none.
+    """
+    if isinstance( pickler, str ):
+        return pickler
+    for name, module in _picklers.items():
+        if module is pickler:
+            return name
+    for name, (module, kind) in _registry.items():
+        if module is pickler:
+            return name
+    name = getattr( pickler, '__name__', '' )
+    return name if name in _registry else ''
+
+def _infoBlock( pickler, compressor, clevel, shuffle, rawSize=None, content_type=None ):
+    parts = [ _infoHeader.pack( _INFO_MAGIC, _INFO_VERSION, clevel, shuffle, 
+                                _RAW_SIZE_UNKNOWN if rawSize is None else rawSize ) ]
+    for field in ( _picklerName( pickler ), compressor, content_type or '' ):
+        encoded = field.encode( 'utf-8' )
+        if len(encoded) > 255:
+            raise ValueError( "{!r} is too long for the bloscpickle header".format(field) )
+        parts += [ bytes( (len(encoded),) ), encoded ]
+    return b''.join( parts )
+
+def _seekablePosition( stream ):
+    """
+    The position of stream, if the raw size can be filled in there later: 
+    None for unseekable streams and for files opened for appending, where 
+    every write goes to the end.
+    """
+    try:
+        if not stream.seekable() or 'a' in getattr( stream, 'mode', '' ):
+            return None
+        return stream.tell()
+    except (AttributeError, OSError):
+        return None
+
+def _recordRawSize( stream, infoAt, rawSize ):
+    """
+    Fill in the raw size of the header written at infoAt, once every part 
+    after it has been written, leaving stream positioned at the end.
+    """
+    if infoAt is None:
+        return
+    end = stream.tell()
+    stream.seek( infoAt + _rawSizeOffset )
+    stream.write( _rawSizeField.pack( rawSize ) )
+    stream.seek( end )
+
+def _isDescribed( bloscBytes ):
+    return bytes(bloscBytes[:len(_INFO_MAGIC)]) == _INFO_MAGIC
+
+def _parseInfo( view ):
+    """
+    Parse the header at the start of view, returning it as a dict and its 
+    size.  Raises ValueError if it is truncated or malformed.
+    """
+    if len(view) < _infoHeader.size:
+        raise ValueError( "Truncated bloscpickle header" )
+    magic, version, clevel, shuffle, rawSize = _infoHeader.unpack_from( view )
+    if magic != _INFO_MAGIC:
+        raise ValueError( "Not a bloscpickle header" )
+    if not 0 < version <= _INFO_VERSION:
+        raise ValueError( "Unsupported bloscpickle header version: {}".format(version) )
+    if clevel > 9 or shuffle not in (blosc.NOSHUFFLE, blosc.SHUFFLE, blosc.BITSHUFFLE):
+        raise ValueError( "Corrupt bloscpickle header: clevel {}, shuffle {}".format(clevel, shuffle) )
+    offset = _infoHeader.size
+    fields = []
+    for I in range( 3 ):
+        if offset >= len(view) or offset + 1 + view[offset] > len(view):
+            raise ValueError( "Truncated bloscpickle header" )
+        length = view[offset]
+        try:
+            fields.append( bytes( view[offset+1:offset+1+length] ).decode('utf-8') )
+        except UnicodeDecodeError:
+            raise ValueError( "Corrupt bloscpickle header: a field is not UTF-8" ) from None
+        offset += 1 + length
+    pickler, compressor, contentType = fields
+    return {'pickler': pickler or None, 'compressor': compressor, 'clevel': clevel, 
+            'shuffle': shuffle, 'raw_size': None if rawSize == _RAW_SIZE_UNKNOWN else rawSize, 
+            'content_type': contentType or None}, offset
+
+def _splitInfo( bloscBytes ):
+    """
+    Return the parsed header of bloscBytes, or None if it has none, and the 
+    payload that follows it.
+    """
+    if not _isDescribed( bloscBytes ):
+        return None, bloscBytes
+    view = memoryview(bloscBytes).cast('B')
+    info, size = _parseInfo( view )
+    return info, view[size:]
+
+def _readInfo( stream, header ):
+    """
+    Read the rest of a header whose first bytes have already been consumed, 
+    returning it parsed and the _frameHeader.size bytes that follow it.  
+    Raises EOFError if the stream ends first.
+    """
+    parts = [ bytes(header), bytes( _readExact( stream, _infoHeader.size - len(header) ) ) ]
+    for I in range( 3 ):
+        length = _readExact( stream, 1 )
+        parts += [ bytes(length), bytes( _readExact( stream, length[0] ) ) ]
+    info, size = _parseInfo( b''.join( parts ) )
+    return info, _readExact( stream, _frameHeader.size )
+
+def _dispatchPickler( info, pickler ):
+    """
+    The pickler given by the caller, else the one named in the header, else 
+    the default.
+    """
+    if pickler is None and info is not None and info['pickler']:
+        return _loadPickler( info['pickler'] )
+    return _resolvePickler( pickler )
+
+def _describe( bloscBytes, pickler, compressor, clevel, shuffle, rawSize=None, content_type=None ):
+    if not _selfDescribing:
+        return bloscBytes
+    return _infoBlock( pickler, compressor, clevel, shuffle, rawSize, content_type ) + bloscBytes
+
+def _checkBlosc( header, size ):
+    """
+    Raise ValueError unless header is the start of a blosc buffer of size 
+    bytes.  Any 16 bytes unpack as a blosc header, so the stored size is 
+    what tells a real one apart.
+    """
+    if len(header) < _bloscHeader.size or header[0] not in (1, 2) or \
+            _bloscSizes( header )[1] != size:
+        raise ValueError( "Not a bloscpickle or blosc buffer" )
+
+def inspect( bloscBytes ):
+    """
+    Return a dict describing bloscBytes, as returned by dumps() or read from 
+    the start of a file written by dump(), by reading its headers only:
+    
+      format: 'blosc' for a single blosc buffer, else 'framed', 
+        'out_of_band', 'numpy', 'typed' or 'sequence' for the framed layouts.
+      pickler: the registered name of the pickler, or None if unknown.
+      compressor, clevel, shuffle: the settings given to dumps(), with 
+        compressor 'auto' replaced by the choice made for a single buffer.
+      raw_size: the total uncompressed size of every part, or None if it 
+        was not recorded (dump() to an unseekable stream, or no header).
+      compressed_size: len(bloscBytes).
+      content_type: as passed to dumps(), or None.
+    
+    Blobs written without the header, by earlier versions or after 
+    set_self_describing(False), report what their blosc or frame headers 
+    hold, with None for the rest.  Raises ValueError if bloscBytes is 
+    neither.
+    """
+    return _inspect( bloscBytes, len(memoryview(bloscBytes).cast('B')) )
+
+def _inspect( bloscBytes, size ):
+    """
+    inspect() of the first bytes of a blob of size bytes in all.
+    """
+    info, payload = _splitInfo( bloscBytes )
+    result = {'format': 'blosc', 'pickler': None, 'compressor': None, 'clevel': None, 
+              'shuffle': None, 'raw_size': None, 'compressed_size': size, 
+              'content_type': None}
+    if info is not None:
+        result.update( info )
+    if _isFramed( payload ):
+        if len(payload) < _frameHeader.size:
+            raise ValueError( "Truncated bloscpickle frame header" )
+        flags, chunksize = _parseFrameHeader( payload[:_frameHeader.size] )
+        for flag, layout in ( (_FLAG_OUT_OF_BAND, 'out_of_band'), (_FLAG_NUMPY, 'numpy'), 
+                              (_FLAG_TYPED, 'typed'), (_FLAG_SEQUENCE, 'sequence') ):
+            if flags & flag:
+                result['format'] = layout
+                break
+        else:
+            result['format'] = 'framed'
+        return result
+    header = bytes( payload[:_bloscHeader.size] )
+    _checkBlosc( header, size - (len(memoryview(bloscBytes).cast('B')) - len(payload)) )
+    result['raw_size'] = _bloscSizes( header )[0]
+    if info is None:
+        bloscFlags = header[2]
+        result['compressor'] = _bloscFormats.get( bloscFlags >> 5 )
+        result['shuffle'] = ( blosc.BITSHUFFLE if bloscFlags & 0x04 else 
+                              blosc.SHUFFLE if bloscFlags & 0x01 else blosc.NOSHUFFLE )
+    return result
+
+
+####### OUT-OF-BAND BUFFERS #######
+def _dumpOutOfBand( pyObject, stream, compressor, clevel, shuffle, buffer_shuffle, 
+                    chunksize, chunkWriter=_BloscChunkWriter, **pickler_args ):
+    """
+    Pickle pyObject with protocol 5, compressing every out-of-band 
+    PickleBuffer separately with its own itemsize as the blosc typesize.  The 
+    in-band pickle stream only holds metadata, so it is kept in memory until 
+    the buffers have been written.  Returns the raw size of every part.
+    """
+    if not hasattr( pickle, 'PickleBuffer' ):
+        raise ValueError( "out_of_band requires pickle protocol 5 (Python 3.8+)" )
+    if pickler_args.setdefault( 'protocol', 5 ) < 5:
+        raise ValueError( "out_of_band requires pickle protocol 5 or higher" )
+    buffers = []
+    inBand = pickle.dumps( pyObject, buffer_callback=buffers.append, **pickler_args )
+    
+    _writeFrameHeader( stream, chunksize, _FLAG_OUT_OF_BAND )
+    stream.write( _countHeader.pack( len(buffers) ) )
+    rawSize = 0
+    for pickleBuffer in buffers:
+        itemsize = memoryview(pickleBuffer).itemsize
+        raw = pickleBuffer.raw()
+        stream.write( _bufferHeader.pack( itemsize, raw.nbytes ) )
+        if itemsize > blosc.MAX_TYPESIZE:
+            itemsize = 1
+        if buffer_shuffle is None:
+            bufferShuffle = blosc.SHUFFLE if itemsize > 1 else blosc.NOSHUFFLE
+        else:
+            bufferShuffle = buffer_shuffle
+        # Keep chunk boundaries aligned to whole items so shuffle stays valid
+        bufferChunksize = max( chunksize - chunksize % itemsize, itemsize )
+        bufferStream = chunkWriter( stream, bufferChunksize, compressor, clevel, 
+                                    bufferShuffle, typesize=itemsize, 
+                                    autoKey=(pickle.PickleBuffer, raw.format, itemsize) )
+        bufferStream.write( raw.toreadonly() )
+        bufferStream.close()
+        raw.release()
+        rawSize += bufferStream.rawSize
+        
+    bloscStream = chunkWriter( stream, chunksize, compressor, clevel, shuffle, 
+                               autoKey=_autoKey(pyObject, pickle) )
+    bloscStream.write( inBand )
+    bloscStream.close()
+    return rawSize + bloscStream.rawSize
+
+def _loadOutOfBand( stream, chunksize, **pickler_args ):
+    """
+    Decompress every out-of-band buffer straight into a freshly allocated 
+    bytearray, which the unpickled objects then take ownership of without 
+    any further copy.
+    """
+    nbuffers, = _countHeader.unpack( _readExact( stream, _countHeader.size ) )
+    buffers = []
+    for I in range( nbuffers ):
+        itemsize, nbytes = _bufferHeader.unpack( _readExact( stream, _bufferHeader.size ) )
+        buffer = bytearray( nbytes )
+        _readChunksInto( stream, buffer )
+        buffers.append( buffer )
+    bloscStream = _openFrameReader( stream, chunksize )
+    pyObject = pickle.load( bloscStream, buffers=buffers, **pickler_args )
+    bloscStream.read() # up to the terminating chunk header
+    return pyObject
+    
+
+####### NUMPY ARRAYS #######
+def _isNumpyArray( pyObject ):
+    return ( np is not None and type(pyObject) is np.ndarray 
+            and not pyObject.dtype.hasobject and pyObject.dtype.names is None )
+
+def _isArrayTree( pyObject ):
+    """
+    True if pyObject is a NumPy array, or dicts (with str keys), lists and 
+    tuples nested down to NumPy arrays, containing at least one array.  
+    Objects that appear more than once, cycles included, or are nested 
+    deeper than _typedMaxDepth are left to the pickler, which keeps them shared.
+    """
+    if np is None:
+        return False
+    return _scanArrayTree( pyObject, set(), 0 ) is True
+
+def _scanArrayTree( pyObject, seen, depth ):
+    """
+    Return None if pyObject cannot be written as an array tree, else whether 
+    it holds an array.  seen collects the ids of the arrays and containers 
+    visited so far.
+    """
+    if id(pyObject) in seen or depth > _typedMaxDepth:
+        return None
+    if _isNumpyArray( pyObject ):
+        seen.add( id(pyObject) )
+        return True
+    if type(pyObject) is dict:
+        if not all( type(key) is str for key in pyObject ):
+            return None
+        children = pyObject.values()
+    elif type(pyObject) in (list, tuple):
+        children = pyObject
+    else:
+        return None
+    seen.add( id(pyObject) )
+    hasArray = False
+    for child in children:
+        found = _scanArrayTree( child, seen, depth + 1 )
+        if found is None:
+            return None
+        hasArray = hasArray or found
+    return hasArray
+
+def _describeArrayTree( pyObject, arrays ):
+    """
+    Return a JSON-able description of the container structure, appending 
+    every array to arrays and referring to it by index.
+    """
+    if type(pyObject) is dict:
+        return ['d', [[key, _describeArrayTree(value, arrays)] for key, value in pyObject.items()]]
+    if type(pyObject) is list:
+        return ['l', [_describeArrayTree(value, arrays) for value in pyObject]]
+    if type(pyObject) is tuple:
+        return ['t', [_describeArrayTree(value, arrays) for value in pyObject]]
+    arrays.append( pyObject )
+    return ['a', len(arrays) - 1]
+
+def _buildArrayTree( spec, arrays ):
+    kind, contents = spec
+    if kind == 'd':
+        return { key: _buildArrayTree(value, arrays) for key, value in contents }
+    if kind == 'l':
+        return [ _buildArrayTree(value, arrays) for value in contents ]
+    if kind == 't':
+        return tuple( _buildArrayTree(value, arrays) for value in contents )
+    return arrays[contents]
+
+def _dumpNumpy( pyObject, stream, compressor, clevel, buffer_shuffle, chunksize, 
+                chunkWriter=_BloscChunkWriter ):
+    """
+    Write a container of NumPy arrays without pickling: the dtype, shape 
+    and memory order of each array go into a small JSON header, and the raw 
+    data is handed to blosc with the itemsize as the typesize.  Returns the 
+    raw size of the arrays.
+    """
+    arrays = []
+    tree = _describeArrayTree( pyObject, arrays )
+    arrayInfo = []
+    arrayData = []
+    for array in arrays:
+        shape = list(array.shape)
+        if array.flags.c_contiguous:
+            order = 'C'
+        elif array.flags.f_contiguous:
+            order = 'F'
+            array = array.T
+        else: # Strided views are compacted
+            order = 'C'
+            array = np.ascontiguousarray( array )
+        arrayInfo.append( {'dtype': array.dtype.str, 'shape': shape, 'order': order} )
+        arrayData.append( array )
+    header = json.dumps( {'tree': tree, 'arrays': arrayInfo} ).encode('utf-8')
+    
+    _writeFrameHeader( stream, chunksize, _FLAG_NUMPY )
+    stream.write( _countHeader.pack( len(header) ) )
+    stream.write( header )
+    rawSize = 0
+    for array in arrayData:
+        itemsize = array.dtype.itemsize
+        if itemsize > blosc.MAX_TYPESIZE:
+            itemsize = 1
+        if buffer_shuffle is None:
+            bufferShuffle = blosc.SHUFFLE if itemsize > 1 else blosc.NOSHUFFLE
+        else:
+            bufferShuffle = buffer_shuffle
+        bufferChunksize = max( chunksize - chunksize % itemsize, itemsize )
+        bufferStream = chunkWriter( stream, bufferChunksize, compressor, clevel, 
+                                    bufferShuffle, typesize=itemsize, autoKey=_autoKey(array) )
+        bufferStream.write( memoryview( array.reshape(-1).view(np.uint8) ).toreadonly() )
+        bufferStream.close()
+        rawSize += bufferStream.rawSize
+    return rawSize
+
+def _loadNumpy( stream ):
+    """
+    Decompress every array straight into a newly allocated NumPy array.
+    """
+    if np is None:
+        raise ImportError( "numpy is required to load this bloscpickle stream" )
+    headerSize, = _countHeader.unpack( _readExact( stream, _countHeader.size ) )
+    header = json.loads( bytes(_readExact( stream, headerSize )).decode('utf-8') )
+    arrays = []
+    for info in header['arrays']:
+        dtype = np.dtype( info['dtype'] )
+        array = np.empty( info['shape'], dtype=dtype, order=info['order'] )
+        _readChunksInto( stream, array.reshape(-1, order='A').view(np.uint8) )
+        arrays.append( array )
+    return _buildArrayTree( header['tree'], arrays )
+
+
+####### TYPED SEQUENCES #######
+# Int columns are tried as 32-bit then 64-bit arrays.  Finding the narrowest 
+# type up front with min() and max() costs more than the compression it saves, 
+# as shuffle already groups the zero high bytes.
+_intTypecodes = ('i', 'q')
+# str columns are joined with a separator and split again on loading, unless 
+# they contain it.  Columns sampled with few distinct values are stored as 
+# indices into the distinct values.
+_STR_SEPARATOR = '\x00'
+_categorySample = 2**10
+
+_typedTypes = frozenset( (int, float, bool, str, dict) )
+
+def _isTypedList( pyObject, minLength ):
+    return ( type(pyObject) in (list, tuple) and minLength is not None 
+            and len(pyObject) >= minLength and type(pyObject[0]) in _typedTypes )
+
+def _hasTypedCandidate( pyObject, minLength, _depth=0 ):
+    """
+    Cheap check for a list of scalars or records of at least minLength 
+    items, at the top or in nested dicts, that _describeTyped() may store as 
+    typed arrays.  Always False when typed storage is off (minLength None).
+    """
+    if minLength is None:
+        return False
+    if _isTypedList( pyObject, minLength ):
+        return True
+    if type(pyObject) is dict and _depth < _typedMaxDepth:
+        return any( type(value) in (dict, list, tuple) and 
+                    _hasTypedCandidate( value, minLength, _depth + 1 ) 
+                    for value in pyObject.values() )
+    return False
+
+def _objectColumn( values, leftovers ):
+    leftovers.append( values )
+    return ['o', len(leftovers) - 1]
+
+def _typedColumn( values, buffers, leftovers, seen, _depth=0 ):
+    """
+    Return a JSON-able description of a column of values, appending the 
+    typed buffers it is stored in to buffers.  Columns of mixed or 
+    unsupported types are appended to leftovers as they are, as are columns 
+    of dicts or lists that repeat one another or any of the containers in 
+    seen, the set of the ids of those already stored as columns.
+    
+      'i', 'f', 'b': int, float and bool columns, as one array each.
+      'z': str columns, as the UTF-8 of the strs joined by _STR_SEPARATOR.
+      's': str columns that contain the separator, as an array of lengths 
+        and the concatenated UTF-8.
+      'c': str columns of few distinct values, as an 's' column of those and 
+        an array of indices into it.
+      'r': dicts sharing their keys, as one column per key.
+      'L': lists, as an array of lengths and the column of their items.
+    """
+    if not values or _depth >= _typedMaxDepth:
+        return _objectColumn( values, leftovers )
+    valueTypes = set( map( type, values ) )
+    if len(valueTypes) != 1:
+        return _objectColumn( values, leftovers )
+    valueType = valueTypes.pop()
+    
+    if valueType is int:
+        for typecode in _intTypecodes:
+            try:
+                buffers.append( array.array( typecode, values ) )
+                return ['i', len(buffers) - 1]
+            except OverflowError:
+                pass
+        return _objectColumn( values, leftovers )
+    if valueType is float:
+        buffers.append( array.array( 'd', values ) )
+        return ['f', len(buffers) - 1]
+    if valueType is bool:
+        buffers.append( array.array( 'B', values ) )
+        return ['b', len(buffers) - 1]
+    if valueType is str:
+        sample = values[:_categorySample]
+        if len( set(sample) ) <= len(sample) // 4:
+            distinct = dict.fromkeys( values )
+            if len(distinct) <= len(values) // 4:
+                uniques = list(distinct)
+                distinct = { value: I for I, value in enumerate(uniques) }
+                codes = _typedColumn( list( map( distinct.__getitem__, values ) ), buffers, leftovers, seen )
+                return ['c', codes, _typedColumn( uniques, buffers, leftovers, seen )]
+        text = _STR_SEPARATOR.join( values )
+        separated = text.count( _STR_SEPARATOR ) == len(values) - 1
+        if not separated:
+            text = ''.join( values )
+        try: # lone surrogates cannot be encoded
+            buffers.append( text.encode( 'utf-8' ) )
+        except UnicodeEncodeError:
+            return _objectColumn( values, leftovers )
+        if separated:
+            return ['z', len(buffers) - 1]
+        blobIndex = len(buffers) - 1
+        return ['s', _typedColumn( list(map(len, values)), buffers, leftovers, seen ), blobIndex]
+    
+    # Containers are rebuilt one per row, so any that repeat, including 
+    # through cycles, are left to the pickler to keep them shared
+    ids = set( map( id, values ) )
+    if len(ids) < len(values) or not seen.isdisjoint( ids ):
+        return _objectColumn( values, leftovers )
+    if valueType is dict:
+        keys = tuple( values[0] )
+        if not all( type(key) is str for key in keys ) or \
+                not all( map( keys.__eq__, map( tuple, values ) ) ):
+            return _objectColumn( values, leftovers )
+        seen |= ids
+        return ['r', len(values), [ [key, _typedColumn( list( map( operator.itemgetter(key), values ) ), 
+                buffers, leftovers, seen, _depth + 1 )] for key in keys ]]
+    if valueType is list:
+        seen |= ids
+        items = _typedColumn( list( chain.from_iterable(values) ), buffers, leftovers, seen, _depth + 1 )
+        if items[0] == 'o': # not worth splitting up
+            leftovers.pop()
+            seen -= ids
+            return _objectColumn( values, leftovers )
+        return ['L', _typedColumn( list(map(len, values)), buffers, leftovers, seen ), items]
+    return _objectColumn( values, leftovers )
+
+def _describeTyped( pyObject, buffers, leftovers, seen, minLength, tuples=True, _depth=0 ):
+    """
+    Return a JSON-able description of pyObject in which every list of 
+    scalars or records of at least minLength items is a typed column, and 
+    whether there is any.  Dicts are described key by key; anything else is 
+    appended to leftovers.  The ids of the containers rebuilt on loading are 
+    added to seen.  Tuples are rebuilt as lists unless tuples is True.
+    """
+    if id(pyObject) in seen:
+        pass
+    elif _isTypedList( pyObject, minLength ):
+        seen.add( id(pyObject) )
+        column = _typedColumn( pyObject, buffers, leftovers, seen, _depth )
+        if column[0] != 'o':
+            return ['q', 't' if tuples and type(pyObject) is tuple else 'l', column], True
+        leftovers.pop()
+        seen.discard( id(pyObject) )
+    elif type(pyObject) is dict and _depth < _typedMaxDepth and \
+            all( type(key) is str for key in pyObject ):
+        seen.add( id(pyObject) )
+        mark = len(leftovers)
+        items = []
+        anyTyped = False
+        for key, value in pyObject.items():
+            spec, typed = _describeTyped( value, buffers, leftovers, seen, minLength, tuples, 
+                                          _depth + 1 )
+            items.append( [key, spec] )
+            anyTyped = anyTyped or typed
+        if anyTyped:
+            return ['d', items], True
+        del leftovers[mark:]
+        seen.discard( id(pyObject) )
+    return _objectColumn( pyObject, leftovers ), False
+
+def _reachesAny( pyObject, ids ):
+    """
+    True if pyObject, or a dict, list or tuple nested in it, has one of ids.
+    """
+    visited = set()
+    stack = [pyObject]
+    while stack:
+        item = stack.pop()
+        if id(item) in ids:
+            return True
+        if type(item) in (dict, list, tuple) and id(item) not in visited:
+            visited.add( id(item) )
+            stack.extend( item.values() if type(item) is dict else item )
+    return False
+
+def _typedTree( pyObject, pickler, minLength ):
+    """
+    Return (tree, buffers, leftovers) for _dumpTyped(), or None if pyObject 
+    holds no list of minLength items or more worth storing as typed arrays, 
+    or if the leftovers refer to containers that would be rebuilt as copies.  
+    The leftovers are for pickler.
+    """
+    if minLength is None or not _hasTypedCandidate( pyObject, minLength ):
+        return None
+    buffers = []
+    leftovers = []
+    seen = set()
+    tree, typed = _describeTyped( pyObject, buffers, leftovers, seen, minLength, 
+                                  _keepsTuples( pickler ) )
+    if not typed or _reachesAny( leftovers, seen ):
+        return None
+    return (tree, buffers, leftovers)
+
+def _recordMaker( keys ):
+    """
+    Return a function of one value per key that builds a record dict.  A 
+    dict display runs about twice as fast as dict(zip(keys, values)); the 
+    keys are bound as constants so none of them end up in the source.
+    """
+    names = [ 'v{}'.format(I) for I in range( len(keys) ) ]
+    namespace = { 'k{}'.format(I): key for I, key in enumerate( keys ) }
+    source = 'lambda {}: {{{}}}'.format( ', '.join(names), 
+            ', '.join( 'k{}: {}'.format(I, name) for I, name in enumerate(names) ) )
+    return eval( source, namespace )
+
+def _slices( sequence, ends ):
+    return list( map( sequence.__getitem__, map( slice, chain((0,), ends), ends ) ) )
+
+def _buildColumn( spec, buffers, leftovers ):
+    kind = spec[0]
+    if kind in ('i', 'f'):
+        return buffers[spec[1]].tolist()
+    if kind == 'b':
+        return list( map( bool, buffers[spec[1]] ) )
+    if kind == 's':
+        ends = list( accumulate( _buildColumn( spec[1], buffers, leftovers ) ) )
+        return _slices( str( buffers[spec[2]], 'utf-8' ), ends )
+    if kind == 'z':
+        return str( buffers[spec[1]], 'utf-8' ).split( _STR_SEPARATOR )
+    if kind == 'c':
+        uniques = _buildColumn( spec[2], buffers, leftovers )
+        return list( map( uniques.__getitem__, _buildColumn( spec[1], buffers, leftovers ) ) )
+    if kind == 'r':
+        count, columns = spec[1], spec[2]
+        if not columns:
+            return [ {} for I in range(count) ]
+        makeRecord = _recordMaker( [ key for key, column in columns ] )
+        return list( map( makeRecord, *[ _buildColumn( column, buffers, leftovers ) 
+                                         for key, column in columns ] ) )
+    if kind == 'L':
+        ends = list( accumulate( _buildColumn( spec[1], buffers, leftovers ) ) )
+        return _slices( _buildColumn( spec[2], buffers, leftovers ), ends )
+    return leftovers[spec[1]]
+
+def _buildTyped( spec, buffers, leftovers ):
+    kind = spec[0]
+    if kind == 'd':
+        return { key: _buildTyped(value, buffers, leftovers) for key, value in spec[1] }
+    if kind == 'q':
+        column = _buildColumn( spec[2], buffers, leftovers )
+        return tuple(column) if spec[1] == 't' else column
+    return leftovers[spec[1]]
+
+def _dumpTyped( typed, stream, pickler, compressor, clevel, shuffle, buffer_shuffle, 
+                chunksize, chunkWriter=_BloscChunkWriter, **pickler_args ):
+    """
+    Write the output of _typedTree(): every typed buffer is compressed with 
+    its itemsize as the blosc typesize, and the leftovers are serialized 
+    together with pickler.  Returns the raw size of every part.
+    """
+    tree, buffers, leftovers = typed
+    bufferInfo = [ [getattr(buffer, 'typecode', 'B'), len(buffer)] for buffer in buffers ]
+    header = json.dumps( {'tree': tree, 'buffers': bufferInfo, 
+                          'byteorder': sys.byteorder} ).encode('utf-8')
+    
+    _writeFrameHeader( stream, chunksize, _FLAG_TYPED )
+    stream.write( _countHeader.pack( len(header) ) )
+    stream.write( header )
+    rawSize = 0
+    for buffer, (typecode, length) in zip( buffers, bufferInfo ):
+        itemsize = getattr( buffer, 'itemsize', 1 )
+        if buffer_shuffle is None:
+            bufferShuffle = blosc.SHUFFLE if itemsize > 1 else blosc.NOSHUFFLE
+        else:
+            bufferShuffle = buffer_shuffle
+        bufferChunksize = max( chunksize - chunksize % itemsize, itemsize )
+        bufferStream = chunkWriter( stream, bufferChunksize, compressor, clevel, 
+                                    bufferShuffle, typesize=itemsize, 
+                                    autoKey=(array.array, typecode) )
+        bufferStream.write( memoryview( buffer ).cast('B').toreadonly() )
+        bufferStream.close()
+        rawSize += bufferStream.rawSize
+    
+    bloscStream = chunkWriter( stream, chunksize, compressor, clevel, shuffle, 
+                               autoKey=_autoKey(leftovers, pickler) )
+    try:
+        if _picklerKind( pickler ) is _STREAM:
+            pickler.dump( leftovers, bloscStream, **pickler_args )
+        else:
+            bloscStream.write( _serialize( leftovers, pickler, **pickler_args ) )
+    except BaseException:
+        bloscStream.abort()
+        raise
+    bloscStream.close()
+    return rawSize + bloscStream.rawSize
+
+def _dumpsTyped( typed, pickler, compressor, clevel, shuffle, buffer_shuffle, 
+                 content_type=None, **pickler_args ):
+    bloscStream = BytesIO()
+    infoAt = None
+    if _selfDescribing:
+        infoAt = 0
+        bloscStream.write( _infoBlock( pickler, compressor, clevel, shuffle, 
+                                       content_type=content_type ) )
+    rawSize = _dumpTyped( typed, bloscStream, pickler, compressor, clevel, shuffle, 
+                          buffer_shuffle, _defaultChunksize, **pickler_args )
+    _recordRawSize( bloscStream, infoAt, rawSize )
+    return bloscStream.getvalue()
+
+def _loadTyped( stream, chunksize, pickler, **pickler_args ):
+    """
+    Decompress every typed buffer straight into a new array, then rebuild 
+    the lists around the deserialized leftovers.
+    """
+    headerSize, = _countHeader.unpack( _readExact( stream, _countHeader.size ) )
+    header = json.loads( bytes(_readExact( stream, headerSize )).decode('utf-8') )
+    buffers = []
+    for typecode, length in header['buffers']:
+        buffer = array.array( typecode, [0] ) * length
+        _readChunksInto( stream, memoryview( buffer ).cast('B') )
+        if header['byteorder'] != sys.byteorder and buffer.itemsize > 1:
+            buffer.byteswap()
+        buffers.append( buffer )
+    leftovers = _loadFrames( stream, chunksize, pickler, **pickler_args )
+    return _buildTyped( header['tree'], buffers, leftovers )
+
+
+####### SINGLE BUFFERS #######
+def _serialize( pyObject, pickler, **pickler_args ):
+    """
+    Serialize pyObject with pickler, returning a bytes-like object.
+    """
+    kind = _picklerKind( pickler )
+    if kind is _STREAM:
+        bloscStream = BytesIO()
+        pickler.dump( pyObject, bloscStream, **pickler_args )
+        # getbuffer() hands over the BytesIO contents without a getvalue() copy
+        return bloscStream.getbuffer()
+    serialized = pickler.dumps( pyObject, **pickler_args )
+    if kind is _TEXT:
+        # The C encoders behind dumps() are several times faster than dump() 
+        # to a text stream, which json for one runs in pure Python
+        return serialized.encode( 'utf-8' )
+    return serialized
+
+def _compressSerialized( serialized, autoKey, compressor, clevel, shuffle, 
+                         pickler=None, content_type=None ):
+    """
+    Compress the bytes-like output of _serialize() into a single blosc buffer, 
+    behind the self-describing header if enabled.
+    """
+    with memoryview( serialized ) as view:
+        if compressor == _AUTO:
+            compressor, clevel, shuffle = _autoSettings( autoKey, view )
+        timings = _callState.timings if _hooks else None
+        if timings is not None:
+            t0 = perf_counter()
+        bloscBytes = blosc.compress( view, typesize=1, clevel=clevel, 
+                                     shuffle=shuffle, cname=compressor )
+        if timings is not None:
+            timings.codec( len(view), len(bloscBytes), perf_counter() - t0 )
+            timings.settings = (compressor, clevel, shuffle)
+        return _describe( bloscBytes, pickler, compressor, clevel, shuffle, len(view), 
+                          content_type )
+
+
+####### MODULE API #######
+def dump( pyObject, stream, pickler=None, compressor=None, 
+          clevel=None, shuffle=None, chunksize=None, out_of_band=False, 
+          buffer_shuffle=None, pipelined=False, content_type=None, typed_min_length=None, 
+          **pickler_args ):
+    """
+    Dump a Python object 'pyObject' into an io.IOBase subclass (typically 
+    io.FileIO or io.BytesIO) as compressed bytes.
+    
+    The serialized bytes are streamed through a sequence of blosc compressed 
+    chunks, so objects larger than blosc's 2 GB buffer limit can be written 
+    and peak memory stays at a few chunks.
+    
+    NumPy arrays, and dicts, lists and tuples of them, are not pickled: the 
+    array data is compressed directly with the itemsize as the blosc typesize.
+    
+    After set_typed(), long lists and tuples of a single scalar type, on 
+    their own or in dicts, are stored as typed arrays: ints, floats and bools 
+    compressed with their itemsize as the blosc typesize, strs as their 
+    lengths plus one UTF-8 blob.  Lists of records, dicts with the same str 
+    keys in the same order, are stored the same way column by column, 
+    including nested records and lists.  Other fields are serialized with 
+    pickler.  Records and lists that appear more than once, or that the 
+    rest of the object refers to through dicts, lists or tuples, are 
+    serialized with pickler as well, which keeps them shared.  Tuples come 
+    back as lists from picklers that have no tuples, such as JSON and 
+    msgpack, however they were stored.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      compressor: { 'zstd', 'lz4' } and others in the blosc library, or 
+        'auto' to choose the compressor, clevel and shuffle by compressing a 
+        sample of the data (see set_auto).  Tiny and incompressible payloads 
+        are then stored uncompressed.
+      clevel: {1 ... 9}, for compression level.  1 is advised for 'ztd' and 
+        9 for 'lz4'.  'zstd' sees little benefit to compression ratio for 
+        levels above 4.
+      shuffle: {blosc.NOSHUFFLE,blosc.SHUFFLE,blosc.BITSHUFFLE}, re-orders the 
+      data by most-significant byte or bit. For text data BITSHUFFLE is 
+      recommended for compression ratio or NOSHUFFLE for speed.
+      chunksize: the number of uncompressed bytes per blosc chunk, defaults 
+        to 4 MB (see set_chunksize).
+      out_of_band: if True, 'pickle' is used with protocol 5 and every 
+        PickleBuffer (NumPy arrays, bytearrays, ...) is compressed on its own 
+        with its itemsize as the blosc typesize.
+      buffer_shuffle: the shuffle used for out-of-band buffers, NumPy arrays 
+        and typed columns.  Defaults to blosc.SHUFFLE for an itemsize above 1.
+      pipelined: if True, chunks are compressed on the dumps_many() thread 
+        pool (see set_workers) while serialization continues, and written to 
+        stream by a separate thread, so the wall time approaches that of the 
+        slowest of the three stages rather than their sum.  Worthwhile for 
+        objects of several chunks.  Must not be used from inside that pool.
+      content_type: an optional label of up to 255 bytes, such as a MIME 
+        type, stored in the header for inspect().
+      typed_min_length: the shortest list stored as typed arrays by this 
+        call, as for set_typed().  None uses the set_typed() setting.
+      **pickle_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.  
+    
+    """
+    if _hooks and _callState.timings is None:
+        return _instrument( 'dump', pickler, partial( dump, pyObject, stream, 
+                pickler=pickler, compressor=compressor, clevel=clevel, shuffle=shuffle, 
+                chunksize=chunksize, out_of_band=out_of_band, buffer_shuffle=buffer_shuffle, 
+                pipelined=pipelined, content_type=content_type, typed_min_length=typed_min_length, 
+                **pickler_args ) )
+    pickler = _resolvePickler( pickler )
+    if compressor is None: compressor = _defaultCompressor
+    if clevel is None: clevel = _defaultCLevel
+    if shuffle is None: shuffle = _defaultShuffle
+    if chunksize is None: chunksize = _defaultChunksize
+    chunkWriter = _PipelinedChunkWriter if pipelined else _BloscChunkWriter
+    if out_of_band and pickler is not pickle:
+        raise ValueError( "out_of_band is only supported by the 'pickle' pickler" )
+    infoAt = None
+    if _selfDescribing:
+        infoAt = _seekablePosition( stream )
+        stream.write( _infoBlock( pickler, compressor, clevel, shuffle, content_type=content_type ) )
+    
+    if _isArrayTree( pyObject ):
+        _recordRawSize( stream, infoAt, _dumpNumpy( pyObject, stream, compressor, clevel, 
+                                                    buffer_shuffle, chunksize, chunkWriter ) )
+        return
+    
+    if out_of_band:
+        _recordRawSize( stream, infoAt, _dumpOutOfBand( pyObject, stream, compressor, clevel, 
+                shuffle, buffer_shuffle, chunksize, chunkWriter, **pickler_args ) )
+        return
+    
+    if typed_min_length is None: typed_min_length = _typedMinLength
+    typed = _typedTree( pyObject, pickler, typed_min_length )
+    if typed is not None:
+        _recordRawSize( stream, infoAt, _dumpTyped( typed, stream, pickler, compressor, clevel, 
+                shuffle, buffer_shuffle, chunksize, chunkWriter, **pickler_args ) )
+        return
+    
+    _writeFrameHeader( stream, chunksize )
+    bloscStream = chunkWriter( stream, chunksize, compressor, clevel, shuffle, 
+                               autoKey=_autoKey(pyObject, pickler) )
+    try:
+        if _picklerKind( pickler ) is _STREAM:
+            pickler.dump( pyObject, bloscStream, **pickler_args )
+        else:
+            bloscStream.write( _serialize( pyObject, pickler, **pickler_args ) )
+    except BaseException:
+        bloscStream.abort()
+        raise
+    bloscStream.close()
+    _recordRawSize( stream, infoAt, bloscStream.rawSize )
+        
+
+def dumps(pyObject, pickler=None, compressor=None, 
+          clevel=None, shuffle=None, out_of_band=False, buffer_shuffle=None, 
+          chunked_sequence=False, content_type=None, **pickler_args ):
+    """
+    Dump a Python object 'pyObject' and returns a bytes object that has been
+    compressed by blosc.
+    
+    NumPy arrays, and dicts, lists and tuples of them, are not pickled: the 
+    array data is compressed directly with the itemsize as the blosc typesize.
+    
+    After set_typed(), long lists and tuples of a single scalar type, on 
+    their own or in dicts, are stored as typed arrays: ints, floats and bools 
+    compressed with their itemsize as the blosc typesize, strs as their 
+    lengths plus one UTF-8 blob.  Lists of records, dicts with the same str 
+    keys in the same order, are stored the same way column by column, 
+    including nested records and lists.  Other fields are serialized with 
+    pickler.  Records and lists that appear more than once, or that the 
+    rest of the object refers to through dicts, lists or tuples, are 
+    serialized with pickler as well, which keeps them shared.  Tuples come 
+    back as lists from picklers that have no tuples, such as JSON and 
+    msgpack, however they were stored.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      compressor: { 'zstd', 'lz4' } and others in the blosc library, or 
+        'auto' to choose the compressor, clevel and shuffle by compressing a 
+        sample of the data (see set_auto).  Tiny and incompressible payloads 
+        are then stored uncompressed.
+      clevel: {1 ... 9}, for compression level.  1 is advised for 'ztd' and 
+        9 for 'lz4'.  'zstd' sees little benefit to compression ratio for 
+        levels above 4.
+      shuffle: {blosc.NOSHUFFLE,blosc.SHUFFLE,blosc.BITSHUFFLE}, re-orders the 
+      data by most-significant byte or bit. For text data BITSHUFFLE is 
+      recommended for compression ratio or NOSHUFFLE for speed.
+      out_of_band: if True, 'pickle' is used with protocol 5 and every 
+        PickleBuffer (NumPy arrays, bytearrays, ...) is compressed on its own 
+        with its itemsize as the blosc typesize.  The result is in the framed 
+        format written by dump().
+      buffer_shuffle: the shuffle used for out-of-band buffers, NumPy arrays 
+        and typed columns.  Defaults to blosc.SHUFFLE for an itemsize above 1.
+      chunked_sequence: if True, or a number of elements per block, a list 
+        or tuple is split into blocks of that many elements (1024 for True) 
+        which are compressed independently behind a table of their offsets.  
+        loads() returns the whole sequence, while loads_lazy() only 
+        decompresses the blocks that are indexed.
+      content_type: an optional label of up to 255 bytes, such as a MIME 
+        type, stored in the header for inspect().
+      **pickler_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.  
+    
+    """
+    if _hooks and _callState.timings is None:
+        return _instrument( 'dumps', pickler, partial( dumps, pyObject, pickler=pickler, 
+                compressor=compressor, clevel=clevel, shuffle=shuffle, out_of_band=out_of_band, 
+                buffer_shuffle=buffer_shuffle, chunked_sequence=chunked_sequence, 
+                content_type=content_type, **pickler_args ) )
+    pickler = _resolvePickler( pickler )
+    if compressor is None: compressor = _defaultCompressor
+    if clevel is None: clevel = _defaultCLevel
+    if shuffle is None: shuffle = _defaultShuffle
+    
+    if chunked_sequence:
+        if out_of_band:
+            raise ValueError( "chunked_sequence cannot be combined with out_of_band" )
+        blockLength = _defaultSequenceBlock if chunked_sequence is True else int(chunked_sequence)
+        return _dumpsSequence( pyObject, blockLength, pickler, compressor, clevel, shuffle, 
+                               content_type, **pickler_args )
+    
+    if out_of_band or _isArrayTree( pyObject ):
+        bloscStream = BytesIO()
+        dump( pyObject, bloscStream, pickler=pickler, compressor=compressor, 
+              clevel=clevel, shuffle=shuffle, out_of_band=out_of_band, 
+              buffer_shuffle=buffer_shuffle, content_type=content_type, **pickler_args )
+        return bloscStream.getvalue()
+    
+    typed = _typedTree( pyObject, pickler, _typedMinLength )
+    if typed is not None:
+        return _dumpsTyped( typed, pickler, compressor, clevel, shuffle, buffer_shuffle, 
+                            content_type, **pickler_args )
+    return _compressSerialized( _serialize( pyObject, pickler, **pickler_args ), 
+                                _autoKey(pyObject, pickler), compressor, clevel, shuffle, 
+                                pickler, content_type )
+
+def load( stream, pickler=None, **pickler_args ):
+    """
+    Reads an object from a open file-like object and returns it. 
+    
+    stream must have a read() method that returns bytes written by dump(), 
+    which are decompressed one chunk at a time.  Streams holding a single 
+    blosc buffer, as written by older versions, are also accepted.  Short 
+    reads are retried; EOFError is raised if the stream ends early.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }.  
+        None uses the pickler named in the stream's header, or the default 
+        one for streams written without it.
+      **pickler_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.
+    """
+    if _hooks and _callState.timings is None:
+        return _instrument( 'load', pickler, partial( load, stream, pickler=pickler, 
+                                                      **pickler_args ) )
+    header = _readExact( stream, _frameHeader.size )
+    info = None
+    if _isDescribed( header ):
+        info, header = _readInfo( stream, header )
+    pickler = _dispatchPickler( info, pickler )
+    if not _isFramed( header ):
+        return loads( _readLegacy( stream, header ), pickler=pickler, **pickler_args )
+    
+    flags, chunksize = _parseFrameHeader( header )
+    if flags & _FLAG_NUMPY:
+        return _loadNumpy( stream )
+    if flags & _FLAG_OUT_OF_BAND:
+        return _loadOutOfBand( stream, chunksize, **pickler_args )
+    if flags & _FLAG_TYPED:
+        return _loadTyped( stream, chunksize, pickler, **pickler_args )
+    if flags & _FLAG_SEQUENCE:
+        return _loadSequence( stream, pickler, **pickler_args )
+    
+    return _loadFrames( stream, chunksize, pickler, **pickler_args )
+
+
+def loads( bloscBytes, pickler=None, **pickler_args ):
+    """
+    Reads an object from a open file-like object and returns it. 
+    
+    bloscBytes must be a bytes string which is blosc compressed data, with the 
+    appropriate blosc header, or the framed contents of a file written by dump().
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }.  
+        None uses the pickler named in the header (see inspect), or the 
+        default one for data written without it.
+      **pickler_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.
+    """
+    if _hooks and _callState.timings is None:
+        return _instrument( 'loads', pickler, partial( loads, bloscBytes, pickler=pickler, 
+                                                       **pickler_args ) )
+    info, bloscBytes = _splitInfo( bloscBytes )
+    pickler = _dispatchPickler( info, pickler )
+    if _isFramed( bloscBytes ):
+        return load( _BufferStream( bloscBytes ), pickler=pickler, **pickler_args )
+    
+    timings = _callState.timings if _hooks else None
+    if timings is not None:
+        t0 = perf_counter()
+    serialized = blosc.decompress( bloscBytes )
+    if timings is not None:
+        timings.codec( len(serialized), len(bloscBytes), perf_counter() - t0 )
+    # The JSON decoders accept UTF-8 bytes as well, which skips a decode()
+    return pickler.loads( serialized, **pickler_args )
+
+
+def load_into( stream, buffer ):
+    """
+    Decompresses the serialized bytes in an open file-like object written by 
+    dump() directly into buffer, a writable bytearray, mmap or other 
+    contiguous buffer, and returns the number of bytes written.  The result 
+    can be deserialized in place, e.g. with pickle.loads(memoryview(buffer)[:n]).
+    
+    Raises ValueError if buffer is too small, or if the stream holds NumPy 
+    arrays, out-of-band buffers, typed arrays or sequence blocks rather than 
+    a single serialized byte stream, as dump() writes after set_typed().
+    Raises EOFError if the stream ends early.
+    """
+    header = _readExact( stream, _frameHeader.size )
+    if _isDescribed( header ):
+        info, header = _readInfo( stream, header )
+    if not _isFramed( header ):
+        return loads_into( _readLegacy( stream, header ), buffer )
+    flags, chunksize = _parseFrameHeader( header )
+    if flags & _FLAGS_MULTIPART:
+        raise ValueError( "load_into() requires a stream holding a single serialized byte stream" )
+    return _readChunksInto( stream, buffer, exact=False )
+
+
+def loads_into( bloscBytes, buffer ):
+    """
+    Decompresses bloscBytes, as returned by dumps() or read from a file 
+    written by dump(), directly into buffer, a writable bytearray, mmap or 
+    other contiguous buffer, and returns the number of bytes written.
+    """
+    info, bloscBytes = _splitInfo( bloscBytes )
+    if _isFramed( bloscBytes ):
+        return load_into( _BufferStream( bloscBytes ), buffer )
+    view = memoryview(buffer).cast('B')
+    nbytes = _bloscSizes( bloscBytes )[0]
+    if nbytes > len(view):
+        raise ValueError( "Buffer of {} bytes is too small for the decompressed data".format(len(view)) )
+    if nbytes > 0:
+        blosc.decompress_ptr( bloscBytes, _bufferAddress( view ) )
+    return nbytes
+
+
+def dumps_many( pyObjects, pickler=None, compressor=None, clevel=None, 
+                shuffle=None, as_generator=False, **pickler_args ):
+    """
+    Dump every Python object in the iterable pyObjects, returning the blosc 
+    compressed bytes objects in the same order, as dumps() would.
+    
+    Objects are serialized in the calling thread while the compression is 
+    spread over a thread pool (see set_workers) with the GIL released, so 
+    workloads of many small objects can use all cores.
+    
+      as_generator: if True, a generator is returned instead of a list.
+      
+    All other arguments are as for dumps().
+    """
+    pickler = _resolvePickler( pickler )
+    if compressor is None: compressor = _defaultCompressor
+    if clevel is None: clevel = _defaultCLevel
+    if shuffle is None: shuffle = _defaultShuffle
+    
+    def tasks():
+        for pyObject in pyObjects:
+            typed = None if _isArrayTree( pyObject ) else \
+                    _typedTree( pyObject, pickler, _typedMinLength )
+            if typed is not None:
+                yield partial( _dumpsTyped, typed, pickler, compressor, clevel, shuffle, 
+                               None, None, **pickler_args )
+            elif _isArrayTree( pyObject ):
+                # The array path does little but compress, so run all of it
+                yield partial( dumps, pyObject, pickler=pickler, compressor=compressor, 
+                               clevel=clevel, shuffle=shuffle, **pickler_args )
+            else:
+                yield partial( _compressSerialized, _serialize( pyObject, pickler, **pickler_args ), 
+                               _autoKey(pyObject, pickler), compressor, clevel, shuffle, pickler )
+    
+    results = _mapOrdered( tasks() )
+    return results if as_generator else list(results)
+
+
+def _decompressOrLoad( bloscBytes, pickler, pickler_args ):
+    """
+    Thread pool task for loads_many().  Framed data is loaded completely, 
+    since that is mostly decompression, while single buffers are only 
+    decompressed.  Returns (loaded, result), with result the pickler and the 
+    serialized bytes if not loaded.
+    """
+    info, payload = _splitInfo( bloscBytes )
+    if _isFramed( payload ):
+        return True, loads( bloscBytes, pickler=pickler, **pickler_args )
+    return False, (_dispatchPickler( info, pickler ), blosc.decompress( payload ))
+
+
+def loads_many( bloscBlobs, pickler=None, as_generator=False, **pickler_args ):
+    """
+    Load every object in the iterable bloscBlobs of compressed bytes, 
+    returning them in the same order, as loads() would.
+    
+    Decompression is spread over a thread pool (see set_workers) with the 
+    GIL released, while unpickling happens in the calling thread.
+    
+      as_generator: if True, a generator is returned instead of a list.
+      
+    All other arguments are as for loads().
+    """
+    if pickler is not None:
+        pickler = _resolvePickler( pickler )
+    
+    def results():
+        tasks = ( partial( _decompressOrLoad, bloscBytes, pickler, pickler_args ) 
+                 for bloscBytes in bloscBlobs )
+        for loaded, result in _mapOrdered( tasks ):
+            yield result if loaded else result[0].loads( result[1], **pickler_args )
+            
+    return results() if as_generator else list( results() )
+
+
+def load_path( path, pickler=None, **pickler_args ):
+    """
+    Reads an object from the file at path, written by dump(), and returns it. 
+    
+    The file is memory-mapped and the mapped pages are passed straight to 
+    blosc, so the compressed file is never copied into a bytes object and the 
+    OS page cache is used directly.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      **pickler_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.
+    """
+    mapped = _mapFile( path )
+    try:
+        return loads( mapped, pickler=pickler, **pickler_args )
+    finally:
+        _closeMapping( mapped )
+
+
+def load_mmap( path, target_path ):
+    """
+    Decompresses the serialized bytes in the file at path, written by dump() 
+    or dumps(), into a new memory-mapped file at target_path and returns the 
+    number of bytes written.  Neither the compressed nor the decompressed 
+    data is held in process memory.
+    
+    Raises ValueError if the file holds NumPy arrays or out-of-band buffers 
+    rather than a single serialized byte stream.
+    """
+    mapped = _mapFile( path )
+    try:
+        nbytes = _rawSize( mapped )
+        with io.open( target_path, 'w+b' ) as fh:
+            fh.truncate( nbytes )
+            if nbytes == 0:
+                return 0
+            target = mmap.mmap( fh.fileno(), nbytes )
+        try:
+            loads_into( mapped, target )
+            target.flush()
+        finally:
+            _closeMapping( target )
+        return nbytes
+    finally:
+        _closeMapping( mapped )
+
+
+####### REUSABLE PICKLER OBJECTS #######
+@contextmanager
+def _bloscSettings( nthreads, blocksize ):
+    """
+    Temporarily apply blosc's process-wide nthreads and blocksize, holding 
+    the settings lock so that concurrent threads cannot change them mid-call.  
+    Does nothing, and takes no lock, if both are None.
+    """
+    if nthreads is None and blocksize is None:
+        yield
+        return
+    with _bloscSettingsLock:
+        oldBlocksize = blosc.get_blocksize()
+        if nthreads is not None:
+            oldThreads = blosc.set_nthreads( nthreads )
+        if blocksize is not None:
+            blosc.set_blocksize( blocksize )
+        try:
+            yield
+        finally:
+            if nthreads is not None:
+                blosc.set_nthreads( oldThreads )
+            blosc.set_blocksize( oldBlocksize )
+
+
+class _ScratchBuffer(io.RawIOBase):
+    """
+    Write-only sink over a reusable bytearray.  Its capacity follows recent 
+    payload sizes: it grows as needed and is shrunk once it is far larger 
+    than anything written lately.
+    """
+    _history = 16
+    
+    def __init__( self ):
+        super().__init__()
+        self._buffer = bytearray()
+        self._length = 0
+        self._recent = deque( maxlen=self._history )
+        
+    def writable( self ):
+        return True
+    
+    def reset( self ):
+        if self._length:
+            self._recent.append( self._length )
+        self._length = 0
+        largest = max( self._recent, default=0 )
+        if len(self._buffer) > max( 4 * largest, 2**20 ):
+            self._buffer = bytearray( 2 * largest )
+    
+    def resize( self, nbytes ):
+        """
+        Set the length to nbytes, for filling through view().  The contents 
+        are not preserved if the buffer has to grow.
+        """
+        if nbytes > len(self._buffer):
+            self._buffer = bytearray( max( nbytes, 2 * len(self._buffer) ) )
+        self._length = nbytes
+    
+    def write( self, data ):
+        view = memoryview(data).cast('B')
+        end = self._length + len(view)
+        if end > len(self._buffer):
+            grown = bytearray( max( end, 2 * len(self._buffer) ) )
+            grown[:self._length] = memoryview(self._buffer)[:self._length]
+            self._buffer = grown
+        self._buffer[self._length:end] = view
+        self._length = end
+        return len(view)
+    
+    def view( self ):
+        return memoryview(self._buffer)[:self._length]
+
+
+class BloscPickler(object):
+    """
+    Reusable serializer with its own settings, for programs where different 
+    components need different settings than the module defaults.
+    
+    Settings are resolved once, on construction.  Each thread serializes into 
+    its own reusable scratch buffer, so an instance may be shared between 
+    threads.  nthreads and blocksize are process-wide in blosc; if given, they 
+    are applied under a lock around each call, so concurrent instances do not 
+    see each other's values.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      compressor, clevel, shuffle, chunksize, buffer_shuffle: as for dump().
+      nthreads, blocksize: blosc settings for this instance only.  None 
+        leaves blosc's current values in effect.
+      **pickler_args: passed to the 'pickle'-style module on every call.
+    """
+    def __init__( self, pickler=None, compressor=None, clevel=None, shuffle=None, 
+                  chunksize=None, buffer_shuffle=None, nthreads=None, blocksize=None, 
+                  **pickler_args ):
+        self.pickler = _resolvePickler( pickler )
+        self.compressor = _defaultCompressor if compressor is None else compressor
+        self.clevel = _defaultCLevel if clevel is None else clevel
+        self.shuffle = _defaultShuffle if shuffle is None else shuffle
+        self.chunksize = _defaultChunksize if chunksize is None else chunksize
+        self.buffer_shuffle = buffer_shuffle
+        self.nthreads = nthreads
+        self.blocksize = blocksize
+        self.pickler_args = pickler_args
+        self._local = threading.local()
+        
+    def _scratch( self ):
+        scratch = getattr( self._local, 'scratch', None )
+        if scratch is None:
+            scratch = self._local.scratch = _ScratchBuffer()
+        scratch.reset()
+        return scratch
+    
+    def dump( self, pyObject, stream ):
+        """
+        As the module dump(), with this instance's settings.
+        """
+        with _bloscSettings( self.nthreads, self.blocksize ):
+            dump( pyObject, stream, pickler=self.pickler, compressor=self.compressor, 
+                  clevel=self.clevel, shuffle=self.shuffle, chunksize=self.chunksize, 
+                  buffer_shuffle=self.buffer_shuffle, **self.pickler_args )
+    
+    def dumps( self, pyObject ):
+        """
+        As the module dumps(), with this instance's settings.
+        """
+        if _hooks and _callState.timings is None:
+            return _instrument( 'dumps', self.pickler, partial( self.dumps, pyObject ) )
+        if _isArrayTree( pyObject ) or (_typedMinLength is not None and 
+                                        _hasTypedCandidate( pyObject, _typedMinLength )):
+            with _bloscSettings( self.nthreads, self.blocksize ):
+                return dumps( pyObject, pickler=self.pickler, compressor=self.compressor, 
+                              clevel=self.clevel, shuffle=self.shuffle, 
+                              buffer_shuffle=self.buffer_shuffle, **self.pickler_args )
+        
+        if _picklerKind( self.pickler ) is _STREAM:
+            scratch = self._scratch()
+            self.pickler.dump( pyObject, scratch, **self.pickler_args )
+            view = scratch.view()
+        else: # dumps() already returns a fresh buffer, so scratch would be a copy
+            view = memoryview( _serialize( pyObject, self.pickler, **self.pickler_args ) )
+        with view:
+            compressor, clevel, shuffle = self.compressor, self.clevel, self.shuffle
+            if compressor == _AUTO:
+                compressor, clevel, shuffle = _autoSettings( _autoKey(pyObject, self.pickler), view )
+            timings = _callState.timings if _hooks else None
+            if timings is not None:
+                t0 = perf_counter()
+            with _bloscSettings( self.nthreads, self.blocksize ):
+                bloscBytes = blosc.compress( view, typesize=1, clevel=clevel, 
+                                             shuffle=shuffle, cname=compressor )
+            if timings is not None:
+                timings.codec( len(view), len(bloscBytes), perf_counter() - t0 )
+                timings.settings = (compressor, clevel, shuffle)
+            return _describe( bloscBytes, self.pickler, compressor, clevel, shuffle, len(view) )
+
+
+class BloscUnpickler(object):
+    """
+    Reusable deserializer with its own settings.  Single blosc buffers are 
+    decompressed into a reusable, per-thread scratch buffer and unpickled 
+    from there rather than from a new bytes object on every call.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      nthreads: blosc threads for this instance only (see BloscPickler).
+      **pickler_args: passed to the 'pickle'-style module on every call.
+    """
+    def __init__( self, pickler=None, nthreads=None, **pickler_args ):
+        self.pickler = _resolvePickler( pickler )
+        self.nthreads = nthreads
+        self.pickler_args = pickler_args
+        self._local = threading.local()
+        # Without a pickler of its own, every blob is loaded with the one its 
+        # header names
+        self._dispatch = pickler is None
+        
+    def load( self, stream ):
+        """
+        As the module load(), with this instance's settings.
+        """
+        with _bloscSettings( self.nthreads, None ):
+            return load( stream, pickler=None if self._dispatch else self.pickler, 
+                         **self.pickler_args )
+    
+    def loads( self, bloscBytes ):
+        """
+        As the module loads(), with this instance's settings.
+        """
+        if _hooks and _callState.timings is None:
+            return _instrument( 'loads', self.pickler, partial( self.loads, bloscBytes ) )
+        info, payload = _splitInfo( bloscBytes )
+        pickler = _dispatchPickler( info, None ) if self._dispatch else self.pickler
+        if _isFramed( payload ) or _picklerKind( pickler ) is _TEXT:
+            # The JSON decoders do not accept memoryviews
+            with _bloscSettings( self.nthreads, None ):
+                return loads( payload, pickler=pickler, **self.pickler_args )
+        bloscBytes = payload
+        
+        scratch = getattr( self._local, 'scratch', None )
+        if scratch is None:
+            scratch = self._local.scratch = _ScratchBuffer()
+        scratch.reset()
+        scratch.resize( _bloscSizes( bloscBytes )[0] )
+        with scratch.view() as view:
+            if len(view) > 0:
+                timings = _callState.timings if _hooks else None
+                if timings is not None:
+                    t0 = perf_counter()
+                with _bloscSettings( self.nthreads, None ):
+                    blosc.decompress_ptr( bloscBytes, _bufferAddress( view ) )
+                if timings is not None:
+                    timings.codec( len(view), len(bloscBytes), perf_counter() - t0 )
+            return pickler.loads( view, **self.pickler_args )
+
+
+####### OBJECT STORE #######
+# BloscShelf index file: a header followed by an append-only log of entries, 
+# each (data offset, record length, key length) plus the UTF-8 key.  A 
+# deletion is logged as an entry with the tombstone offset.
+_SHELF_MAGIC = b'BPKX'
+_SHELF_VERSION = 1
+_shelfHeader = struct.Struct( '<4sBxxx' )
+_shelfEntry = struct.Struct( '<QQI' )
+_SHELF_TOMBSTONE = 2**64 - 1
+
+class BloscShelf(MutableMapping):
+    """
+    Persistent, shelve-like dictionary of str keys to Python objects.
+    
+    Every value is stored with dumps() as one record appended to the data 
+    file at path; the offset and length of each record are logged in 
+    path + '.idx' and held in memory as a dict, so a lookup is one read and 
+    one decompress however large the store grows.  Overwritten and deleted 
+    records keep their space until compact() is called.
+    
+      flag: 'r' read-only, 'w' read/write an existing store, 'c' read/write 
+        and create if needed, 'n' always start empty.  Records do not carry 
+        their keys, so a data file whose index is missing cannot be rebuilt; 
+        'c' raises FileExistsError for it rather than overwrite it.
+      pickler, compressor, clevel, shuffle, nthreads, **pickler_args: as 
+        for BloscPickler.  Opened without a pickler, records are read with 
+        the one named in their headers.
+    """
+    def __init__( self, path, flag='c', pickler=None, compressor=None, clevel=None, 
+                  shuffle=None, nthreads=None, **pickler_args ):
+        if flag not in ('r', 'w', 'c', 'n'):
+            raise ValueError( "flag must be one of 'r', 'w', 'c' or 'n', not {}".format(flag) )
+        self.path = path
+        self.indexPath = path + '.idx'
+        self.readonly = flag == 'r'
+        self._pickler = BloscPickler( pickler, compressor=compressor, clevel=clevel, 
+                                      shuffle=shuffle, nthreads=nthreads, **pickler_args )
+        self._unpickler = BloscUnpickler( pickler, nthreads=nthreads )
+        self._lock = threading.RLock()
+        
+        dataExists, indexExists = os.path.exists( path ), os.path.exists( self.indexPath )
+        if flag == 'n' or (flag == 'c' and not dataExists and not indexExists):
+            # 'x' so that a store created meanwhile by another process is not clobbered
+            mode = 'wb' if flag == 'n' else 'xb'
+            with io.open( path, mode ), io.open( self.indexPath, mode ) as index:
+                index.write( _shelfHeader.pack( _SHELF_MAGIC, _SHELF_VERSION ) )
+        elif flag == 'c' and dataExists != indexExists:
+            raise FileExistsError( "{} exists without {}; refusing to overwrite a partial BloscShelf".format(
+                                   path if dataExists else self.indexPath, 
+                                   self.indexPath if dataExists else path) )
+        elif not (dataExists and indexExists):
+            raise FileNotFoundError( "No BloscShelf at {}".format(path) )
+        self._open()
+        
+    def _open( self ):
+        self._index, indexSize = self._readIndex()
+        self._dataFile = io.open( self.path, 'rb' if self.readonly else 'r+b' )
+        self._dataFile.seek( 0, os.SEEK_END )
+        self._dataSize = self._dataFile.tell()
+        self._indexFile = None
+        if not self.readonly:
+            self._indexFile = io.open( self.indexPath, 'ab' )
+            # Drop an entry cut short by a crash before appending after it
+            self._indexFile.truncate( indexSize )
+        
+    def _readIndex( self ):
+        """
+        Replay the index log, returning the index and the size of its valid 
+        part.
+        """
+        index = {}
+        with io.open( self.indexPath, 'rb' ) as fh:
+            indexBytes = fh.read()
+        if len(indexBytes) < _shelfHeader.size:
+            raise ValueError( "Corrupt BloscShelf index: {}".format(self.indexPath) )
+        magic, version = _shelfHeader.unpack_from( indexBytes )
+        if magic != _SHELF_MAGIC or version > _SHELF_VERSION:
+            raise ValueError( "Not a supported BloscShelf index: {}".format(self.indexPath) )
+        position = _shelfHeader.size
+        while position + _shelfEntry.size <= len(indexBytes):
+            offset, length, keySize = _shelfEntry.unpack_from( indexBytes, position )
+            position += _shelfEntry.size
+            if position + keySize > len(indexBytes):
+                position -= _shelfEntry.size
+                break
+            key = indexBytes[position:position+keySize].decode('utf-8')
+            position += keySize
+            if offset == _SHELF_TOMBSTONE:
+                index.pop( key, None )
+            else:
+                index[key] = (offset, length)
+        return index, position
+    
+    def _logEntry( self, key, offset, length ):
+        encodedKey = key.encode('utf-8')
+        self._indexFile.write( _shelfEntry.pack( offset, length, len(encodedKey) ) + encodedKey )
+        self._indexFile.flush()
+    
+    def _checkWritable( self ):
+        if self.readonly:
+            raise PermissionError( "BloscShelf opened read-only: {}".format(self.path) )
+    
+    def _read( self, offset, length ):
+        if hasattr( os, 'pread' ):
+            return os.pread( self._dataFile.fileno(), length, offset )
+        with self._lock:
+            self._dataFile.seek( offset )
+            return self._dataFile.read( length )
+        
+    def __getitem__( self, key ):
+        offset, length = self._index[key]
+        return self._unpickler.loads( self._read( offset, length ) )
+    
+    def get_many( self, keys ):
+        """
+        Return the values for keys, in order.  Records are read in file order 
+        and decompressed in parallel as by loads_many().  Raises KeyError if 
+        any key is missing.
+        """
+        locations = [ self._index[key] for key in keys ]
+        order = sorted( range(len(locations)), key=lambda I: locations[I][0] )
+        blobs = [None] * len(locations)
+        for I in order:
+            blobs[I] = self._read( *locations[I] )
+        return loads_many( blobs, pickler=None if self._unpickler._dispatch else self._unpickler.pickler )
+    
+    def put( self, key, pyObject ):
+        self[key] = pyObject
+        
+    def __setitem__( self, key, pyObject ):
+        self._checkWritable()
+        if not isinstance( key, str ):
+            raise TypeError( "BloscShelf keys must be str, not {}".format(type(key).__name__) )
+        bloscBytes = self._pickler.dumps( pyObject )
+        with self._lock:
+            offset = self._dataSize
+            self._dataFile.seek( offset )
+            self._dataFile.write( bloscBytes )
+            self._dataFile.flush()
+            self._dataSize += len(bloscBytes)
+            # The record is written before it is indexed, so a crash leaves at 
+            # worst an unreferenced record behind
+            self._logEntry( key, offset, len(bloscBytes) )
+            self._index[key] = (offset, len(bloscBytes))
+    
+    def delete( self, key ):
+        del self[key]
+        
+    def __delitem__( self, key ):
+        self._checkWritable()
+        with self._lock:
+            if key not in self._index:
+                raise KeyError( key )
+            self._logEntry( key, _SHELF_TOMBSTONE, 0 )
+            del self._index[key]
+    
+    def __contains__( self, key ):
+        return key in self._index
+    
+    def __iter__( self ):
+        return iter( list(self._index) )
+    
+    def __len__( self ):
+        return len(self._index)
+    
+    def sync( self ):
+        """
+        Flush both files to disk.
+        """
+        if not self.readonly:
+            with self._lock:
+                for fh in (self._dataFile, self._indexFile):
+                    fh.flush()
+                    os.fsync( fh.fileno() )
+    
+    def compact( self ):
+        """
+        Rewrite the data and index files with only the live records, in key 
+        order, reclaiming the space of overwritten and deleted values.  Other 
+        processes must not have the store open while it is compacted.
+        """
+        self._checkWritable()
+        with self._lock:
+            tmpPath = self.path + '.compact'
+            tmpIndexPath = self.indexPath + '.compact'
+            with io.open( tmpPath, 'wb' ) as data, io.open( tmpIndexPath, 'wb' ) as index:
+                index.write( _shelfHeader.pack( _SHELF_MAGIC, _SHELF_VERSION ) )
+                for key in sorted( self._index ):
+                    offset, length = self._index[key]
+                    encodedKey = key.encode('utf-8')
+                    index.write( _shelfEntry.pack( data.tell(), length, len(encodedKey) ) + encodedKey )
+                    data.write( self._read( offset, length ) )
+                for fh in (data, index):
+                    fh.flush()
+                    os.fsync( fh.fileno() )
+            self._close()
+            os.replace( tmpPath, self.path )
+            os.replace( tmpIndexPath, self.indexPath )
+            self._open()
+    
+    def _close( self ):
+        self._dataFile.close()
+        if self._indexFile is not None:
+            self._indexFile.close()
+        
+    def close( self ):
+        if not self._dataFile.closed:
+            self.sync()
+            self._close()
+    
+    def __enter__( self ):
+        return self
+    
+    def __exit__( self, *exc ):
+        self.close()
+
+
+####### SNAPSHOT STORE #######
+# Content-defined chunking: a cut is made after byte i when a rolling hash of 
+# the _CDC_WINDOW bytes ending at i has its low bits clear, so cut points move 
+# with the content and an insertion only changes the chunks around it.  The 
+# hash is the sum and the position-weighted sum of per-byte table values over 
+# the window, computed for a whole segment at once from NumPy cumulative sums 
+# (whose uint32 wrap-around cancels in the differences).  The table is 
+# derived from a fixed string, so cut points never change between versions.
+_CDC_WINDOW = 64
+_CDC_SEGMENT = 2**20
+_SNAPSHOT_VERSION = 1
+# pickle protocols 4 and up write a FRAME opcode and length about every 64 kB.  
+# The lengths and positions shift with any change upstream, which would touch 
+# nearly every chunk, but frames are optional for the unpickler and the C 
+# pickler writes each one to the stream in a single call, so they are dropped.
+_pickleFrame = struct.Struct( '<BQ' )
+
+_cdcTable = None
+def _getCDCTable():
+    global _cdcTable
+    if _cdcTable is None:
+        import hashlib
+        seed = hashlib.shake_128( b'bloscpickle content-defined chunking' ).digest( 256 * 4 )
+        _cdcTable = np.frombuffer( seed, dtype='<u4' ).astype( np.uint32 )
+    return _cdcTable
+
+def _cdcCuts( view, minSize, maxSize, mask, final ):
+    """
+    Return the chunk end offsets in view, which starts at a chunk boundary.  
+    mask selects the high bits of the 32-bit digest that must be zero.  
+    Unless final, the bytes after the last cut are left for the next call.
+    """
+    nbytes = len(view)
+    data = np.frombuffer( view, dtype=np.uint8 )
+    # C[i] and CC[i] are the sums of the first i table values and of C[1:i+1]
+    C = np.zeros( nbytes + 1, dtype=np.uint32 )
+    np.cumsum( _getCDCTable().take( data ), out=C[1:] )
+    CC = np.zeros( nbytes + 1, dtype=np.uint32 )
+    np.cumsum( C[1:], out=CC[1:] )
+    # Window sums for the windows ending at every offset from _CDC_WINDOW on, 
+    # mixed in place, keeping only the bits that the mask tests
+    digest = C[_CDC_WINDOW:] - C[:-_CDC_WINDOW]
+    digest *= np.uint32(0x9E3779B1)
+    weightedSum = CC[_CDC_WINDOW:]
+    weightedSum -= CC[:-_CDC_WINDOW]
+    del CC
+    C *= np.uint32(_CDC_WINDOW)
+    weightedSum -= C[:-_CDC_WINDOW]
+    weightedSum *= np.uint32(0x85EBCA77)
+    digest += weightedSum
+    digest &= np.uint32(mask)
+    candidates = np.flatnonzero( digest == 0 ) + _CDC_WINDOW
+    
+    cuts = []
+    last = 0
+    while True:
+        I = np.searchsorted( candidates, last + minSize )
+        if I < len(candidates) and candidates[I] - last <= maxSize:
+            last = int(candidates[I])
+        elif last + maxSize <= nbytes:
+            last += maxSize
+        else:
+            break
+        cuts.append( last )
+    if final and last < nbytes:
+        cuts.append( nbytes )
+    return cuts
+
+
+class _SnapshotWriter(io.RawIOBase):
+    """
+    Write-only sink that cuts the serialized stream into content-defined 
+    chunks and hands each one to store().  Only a segment plus one partial 
+    chunk is buffered.
+    """
+    def __init__( self, store, minSize, maxSize, mask, stripFrames=False ):
+        super().__init__()
+        self._store = store
+        self._sizes = (minSize, maxSize, mask)
+        self._stripFrames = stripFrames
+        self._buffer = bytearray()
+        
+    def writable( self ):
+        return True
+    
+    def _cut( self, final ):
+        view = memoryview( self._buffer )
+        start = 0
+        for end in _cdcCuts( view, *self._sizes, final=final ):
+            self._store( view[start:end] )
+            start = end
+        view.release()
+        del self._buffer[:start]
+    
+    def write( self, data ):
+        if self.closed:
+            raise ValueError( "write to closed file" )
+        view = memoryview(data).cast('B')
+        nbytes = len(view)
+        if self._stripFrames and nbytes > _pickleFrame.size:
+            opcode, frameSize = _pickleFrame.unpack_from( view )
+            if opcode == pickle.FRAME[0] and frameSize == nbytes - _pickleFrame.size:
+                view = view[_pickleFrame.size:]
+        self._buffer += view
+        if len(self._buffer) >= _CDC_SEGMENT + self._sizes[1]:
+            self._cut( False )
+        return nbytes
+    
+    def close( self ):
+        if not self.closed:
+            self._cut( True )
+        super().close()
+
+
+class _SnapshotReader(io.RawIOBase):
+    """
+    Read-only stream over the chunks of a snapshot, decompressing one chunk 
+    at a time.
+    """
+    def __init__( self, chunkPaths ):
+        super().__init__()
+        self._paths = iter( chunkPaths )
+        self._chunk = b''
+        self._pos = 0
+        
+    def readable( self ):
+        return True
+    
+    def readinto( self, buffer ):
+        view = memoryview(buffer).cast('B')
+        while self._pos >= len(self._chunk):
+            path = next( self._paths, None )
+            if path is None:
+                return 0
+            with io.open( path, 'rb' ) as fh:
+                self._chunk = blosc.decompress( fh.read() )
+            self._pos = 0
+        nbytes = min( len(view), len(self._chunk) - self._pos )
+        view[:nbytes] = self._chunk[self._pos:self._pos+nbytes]
+        self._pos += nbytes
+        return nbytes
+
+
+class BloscSnapshots(MutableMapping):
+    """
+    Deduplicating store for successive snapshots of slowly changing objects, 
+    as a dictionary of snapshot names to objects.
+    
+    The serialized stream is cut into content-defined chunks (about 
+    avg_chunksize bytes each), which are stored blosc compressed under 
+    path/chunks, named by their BLAKE2 digest.  Each snapshot is a JSON 
+    manifest under path/snapshots listing its chunks.  Chunks that are 
+    already stored are not compressed or written again, so a snapshot costs 
+    about the size of what changed since the last one.  Deleting a snapshot 
+    only removes its manifest; gc() removes the chunks no longer referenced.
+    
+      pickler, compressor, clevel, shuffle, **pickler_args: as for dump().  
+        The pickler is recorded in each manifest and used to load it.
+      avg_chunksize: the target chunk size, fixed when the store is created.  
+        Chunks are between a quarter and four times this size.
+    """
+    def __init__( self, path, pickler=None, compressor=None, clevel=None, shuffle=None, 
+                  avg_chunksize=2**16, **pickler_args ):
+        if np is None:
+            raise ImportError( "numpy is required for BloscSnapshots" )
+        self.path = path
+        self.pickler = _resolvePickler( pickler )
+        self.compressor = _defaultCompressor if compressor is None else compressor
+        self.clevel = _defaultCLevel if clevel is None else clevel
+        self.shuffle = _defaultShuffle if shuffle is None else shuffle
+        self.pickler_args = pickler_args
+        self._chunkDir = os.path.join( path, 'chunks' )
+        self._snapshotDir = os.path.join( path, 'snapshots' )
+        self._lock = threading.Lock()
+        
+        configPath = os.path.join( path, 'config.json' )
+        if os.path.exists( configPath ):
+            with io.open( configPath, 'r', encoding='utf-8' ) as fh:
+                config = json.load( fh )
+            if config['version'] > _SNAPSHOT_VERSION:
+                raise ValueError( "Not a supported BloscSnapshots store: {}".format(path) )
+            avg_chunksize = config['avg_chunksize']
+        else:
+            if avg_chunksize < 4 * _CDC_WINDOW:
+                raise ValueError( "avg_chunksize must be at least {}".format(4 * _CDC_WINDOW) )
+            os.makedirs( self._chunkDir, exist_ok=True )
+            os.makedirs( self._snapshotDir, exist_ok=True )
+            self._writeAtomic( configPath, json.dumps( 
+                    {'version': _SNAPSHOT_VERSION, 'avg_chunksize': avg_chunksize} ).encode('utf-8') )
+        self.avg_chunksize = avg_chunksize
+        minSize = avg_chunksize // 4
+        # Cuts are searched for from minSize on, so the mask covers the rest
+        maskBits = min( max( (avg_chunksize - minSize).bit_length() - 1, 1 ), 31 )
+        self._sizes = ( minSize, 4 * avg_chunksize, ((1 << maskBits) - 1) << (32 - maskBits) )
+        
+    @staticmethod
+    def _writeAtomic( path, data ):
+        tmpPath = '{}.{}.{}.tmp'.format( path, os.getpid(), threading.get_ident() )
+        with io.open( tmpPath, 'wb' ) as fh:
+            fh.write( data )
+        os.replace( tmpPath, path )
+        
+    def _chunkPath( self, digest ):
+        return os.path.join( self._chunkDir, digest[:2], digest )
+    
+    def _manifestPath( self, name ):
+        if not isinstance( name, str ) or not name or name.startswith( '.' ) \
+                or '/' in name or os.sep in name:
+            raise KeyError( "Invalid snapshot name: {!r}".format(name) )
+        return os.path.join( self._snapshotDir, name + '.json' )
+    
+    def _readManifest( self, name ):
+        try:
+            with io.open( self._manifestPath( name ), 'r', encoding='utf-8' ) as fh:
+                return json.load( fh )
+        except FileNotFoundError:
+            raise KeyError( name )
+    
+    def save( self, name, pyObject ):
+        """
+        Store pyObject as snapshot name, replacing any snapshot of that name, 
+        and return the number of chunks, new chunks, serialized bytes and 
+        compressed bytes written.
+        """
+        import hashlib
+        manifestPath = self._manifestPath( name )
+        chunks = []
+        stats = {'chunks': 0, 'new_chunks': 0, 'raw_size': 0, 'written_size': 0}
+        autoKey = _autoKey( pyObject, self.pickler )
+        
+        def store( chunk ):
+            digest = hashlib.blake2b( chunk, digest_size=20 ).hexdigest()
+            chunks.append( [digest, len(chunk)] )
+            stats['chunks'] += 1
+            stats['raw_size'] += len(chunk)
+            chunkPath = self._chunkPath( digest )
+            try:
+                # Refreshing the time keeps a concurrent gc() off the chunk
+                os.utime( chunkPath )
+                return
+            except FileNotFoundError:
+                pass
+            compressor, clevel, shuffle = self.compressor, self.clevel, self.shuffle
+            if compressor == _AUTO:
+                compressor, clevel, shuffle = _autoSettings( autoKey, chunk )
+            compressed = blosc.compress( chunk, typesize=1, clevel=clevel, 
+                                         shuffle=shuffle, cname=compressor )
+            os.makedirs( os.path.dirname( chunkPath ), exist_ok=True )
+            self._writeAtomic( chunkPath, compressed )
+            stats['new_chunks'] += 1
+            stats['written_size'] += len(compressed)
+        
+        sink = _SnapshotWriter( store, *self._sizes, stripFrames=self.pickler is pickle )
+        if _picklerKind( self.pickler ) is _STREAM:
+            self.pickler.dump( pyObject, sink, **self.pickler_args )
+        else:
+            sink.write( _serialize( pyObject, self.pickler, **self.pickler_args ) )
+        sink.close()
+        # The manifest is written last, so a crash leaves at worst 
+        # unreferenced chunks for gc()
+        manifest = {'version': _SNAPSHOT_VERSION, 
+                    'pickler': getattr( self.pickler, '__name__', None ), 
+                    'raw_size': stats['raw_size'], 'chunks': chunks}
+        self._writeAtomic( manifestPath, json.dumps( manifest ).encode('utf-8') )
+        return stats
+    
+    def load( self, name ):
+        """
+        Return the object stored as snapshot name.
+        """
+        manifest = self._readManifest( name )
+        pickler = self.pickler
+        if manifest['pickler'] is not None:
+            pickler = _loadPickler( manifest['pickler'] )
+        reader = _SnapshotReader( [ self._chunkPath( digest ) for digest, size in manifest['chunks'] ] )
+        if _picklerKind( pickler ) is _STREAM:
+            return pickler.load( io.BufferedReader( reader ), **self.pickler_args )
+        return pickler.loads( reader.readall(), **self.pickler_args )
+    
+    def __getitem__( self, name ):
+        return self.load( name )
+    
+    def __setitem__( self, name, pyObject ):
+        self.save( name, pyObject )
+        
+    def __delitem__( self, name ):
+        try:
+            os.remove( self._manifestPath( name ) )
+        except FileNotFoundError:
+            raise KeyError( name )
+    
+    def __contains__( self, name ):
+        try:
+            return os.path.exists( self._manifestPath( name ) )
+        except KeyError:
+            return False
+    
+    def __iter__( self ):
+        return iter( sorted( fileName[:-len('.json')] for fileName in os.listdir( self._snapshotDir ) 
+                             if fileName.endswith( '.json' ) ) )
+    
+    def __len__( self ):
+        return sum( 1 for name in self )
+    
+    def info( self, name ):
+        """
+        Return the serialized size, the number of chunks and the compressed 
+        size on disk of snapshot name.
+        """
+        manifest = self._readManifest( name )
+        return {'raw_size': manifest['raw_size'], 'chunks': len(manifest['chunks']), 
+                'stored_size': sum( os.path.getsize( self._chunkPath( digest ) ) 
+                                    for digest in {digest for digest, size in manifest['chunks']} )}
+    
+    def gc( self, grace=3600.0 ):
+        """
+        Delete the chunks that no snapshot references, returning the number 
+        of chunks and bytes freed.  Chunks written or reused within the last 
+        grace seconds are kept, so gc() may run while other processes save.
+        """
+        with self._lock:
+            cutoff = time.time() - grace
+            live = set()
+            for name in list(self):
+                try:
+                    live.update( digest for digest, size in self._readManifest( name )['chunks'] )
+                except KeyError: # deleted meanwhile
+                    pass
+            removed = 0
+            freed = 0
+            for prefix in os.listdir( self._chunkDir ):
+                prefixDir = os.path.join( self._chunkDir, prefix )
+                for digest in os.listdir( prefixDir ):
+                    if digest in live:
+                        continue
+                    chunkPath = os.path.join( prefixDir, digest )
+                    stat = os.stat( chunkPath )
+                    if stat.st_mtime >= cutoff:
+                        continue
+                    os.remove( chunkPath )
+                    removed += 1
+                    freed += stat.st_size
+            return {'removed_chunks': removed, 'freed_size': freed}
+
+
+####### DECODED OBJECT CACHE #######
+def _decodedSize( bloscBytes, pyObject ):
+    """
+    Estimate the memory held by a decoded object from the uncompressed size 
+    of its serialized form, or the size of its arrays for NumPy payloads.
+    """
+    info, payload = _splitInfo( bloscBytes )
+    if info is not None and info['raw_size'] is not None:
+        return info['raw_size']
+    try:
+        return _rawSize( bloscBytes )
+    except ValueError:
+        pass
+    if _isArrayTree( pyObject ):
+        arrays = []
+        _describeArrayTree( pyObject, arrays )
+        return sum( array.nbytes for array in arrays )
+    return len(bloscBytes)
+
+
+class LoadsCache(object):
+    """
+    Opt-in LRU cache of decoded objects for programs that load the same 
+    compressed blobs over and over.  Entries are keyed by a BLAKE2 digest of 
+    the compressed bytes, or by a caller supplied key, together with the 
+    pickler.  pickler_args are not part of the key, so they should be the 
+    same on every call for one cache.
+    
+      maxsize: the maximum number of cached objects.
+      maxbytes: the maximum estimated memory of the cached objects, taken as 
+        the uncompressed size of their serialized form.
+      copy: if False, every hit returns the same shared object, which callers 
+        must treat as immutable.  If True, a deep copy is returned instead.
+    """
+    def __init__( self, maxsize=1024, maxbytes=2**28, copy=False ):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.copy = copy
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def loads( self, bloscBytes, pickler=None, key=None, **pickler_args ):
+        """
+        As the module loads(), returning a cached object when the same 
+        bloscBytes (or key) has been loaded before.
+        """
+        if key is None:
+            import hashlib
+            key = hashlib.blake2b( bloscBytes, digest_size=16 ).digest()
+        # Without a pickler the one named in the header is used, and the 
+        # digest covers the header
+        cacheKey = (key, None if pickler is None else _resolvePickler( pickler ).__name__)
+        with self._lock:
+            entry = self._entries.get( cacheKey )
+            if entry is not None:
+                self._entries.move_to_end( cacheKey )
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            pyObject = loads( bloscBytes, pickler=pickler, **pickler_args )
+            nbytes = _decodedSize( bloscBytes, pyObject )
+            self._insert( cacheKey, pyObject, nbytes )
+        else:
+            pyObject = entry[0]
+        return copy.deepcopy( pyObject ) if self.copy else pyObject
+    
+    def _insert( self, cacheKey, pyObject, nbytes ):
+        if nbytes > self.maxbytes:
+            return
+        with self._lock:
+            old = self._entries.pop( cacheKey, None )
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[cacheKey] = (pyObject, nbytes)
+            self._nbytes += nbytes
+            while len(self._entries) > self.maxsize or self._nbytes > self.maxbytes:
+                evictedKey, (evicted, evictedBytes) = self._entries.popitem( last=False )
+                self._nbytes -= evictedBytes
+                self.evictions += 1
+    
+    def clear( self ):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+    
+    def stats( self ):
+        """
+        Return the cumulative hit, miss and eviction counts and the current 
+        number and estimated size of the cached objects.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 
+                    'size': len(self._entries), 'nbytes': self._nbytes}
+    
+    def __len__( self ):
+        return len(self._entries)
+
+
+####### LAZY SEQUENCES #######
+def _dumpsSequence( pyObject, blockLength, pickler, compressor, clevel, shuffle, 
+                    content_type=None, **pickler_args ):
+    """
+    Compress a list or tuple in blocks of blockLength elements on the 
+    dumps_many() thread pool, behind a table of the block lengths.
+    """
+    if type(pyObject) not in (list, tuple):
+        raise TypeError( "chunked_sequence requires a list or tuple, not {}".format( 
+                type(pyObject).__name__ ) )
+    if not 0 < blockLength < 2**32:
+        raise ValueError( "chunked_sequence must be a positive number of elements" )
+    blocks = dumps_many( ( pyObject[start:start+blockLength] 
+                           for start in range( 0, len(pyObject), blockLength ) ), 
+                         pickler=pickler, compressor=compressor, clevel=clevel, 
+                         shuffle=shuffle, **pickler_args )
+    
+    bloscStream = BytesIO()
+    if _selfDescribing:
+        # Every block records its own raw size in its header
+        rawSizes = [ _splitInfo( block )[0]['raw_size'] for block in blocks ]
+        bloscStream.write( _infoBlock( pickler, compressor, clevel, shuffle, 
+                None if None in rawSizes else sum( rawSizes ), content_type ) )
+    _writeFrameHeader( bloscStream, blockLength, _FLAG_SEQUENCE )
+    # Tuples come back as lists from picklers that do not keep them
+    bloscStream.write( _sequenceHeader.pack( len(pyObject), len(blocks), 
+            type(pyObject) is tuple and _keepsTuples( pickler ) ) )
+    bloscStream.write( struct.pack( '<{}Q'.format( len(blocks) ), *map( len, blocks ) ) )
+    for block in blocks:
+        bloscStream.write( block )
+    return bloscStream.getvalue()
+
+def _readSequenceTable( stream ):
+    length, nblocks, isTuple = _sequenceHeader.unpack( _readExact( stream, _sequenceHeader.size ) )
+    blockSizes = struct.unpack( '<{}Q'.format(nblocks), _readExact( stream, 8 * nblocks ) )
+    return length, blockSizes, bool(isTuple)
+
+def _loadSequence( stream, pickler, **pickler_args ):
+    """
+    Load every block of a chunked sequence and join them.
+    """
+    length, blockSizes, isTuple = _readSequenceTable( stream )
+    sequence = []
+    for blockSize in blockSizes:
+        sequence.extend( loads( _readExact( stream, blockSize ), pickler=pickler, **pickler_args ) )
+    return tuple(sequence) if isTuple else sequence
+
+
+class BloscSequence(Sequence):
+    """
+    Read-only sequence over data written by dumps() with chunked_sequence.  
+    Indexing and slicing decompress and deserialize only the blocks holding 
+    the requested elements, and the most recently used blocks are kept 
+    decoded.  Returned elements are shared with the cached blocks, so 
+    mutable ones should be treated as immutable.  See loads_lazy().
+    """
+    def __init__( self, bloscBytes, pickler=None, cache_blocks=8, **pickler_args ):
+        self.pickler = _resolvePickler( pickler )
+        self.pickler_args = pickler_args
+        self.cache_blocks = cache_blocks
+        info, self._view = _splitInfo( memoryview( bloscBytes ).cast('B') )
+        if pickler is None and info is not None and info['pickler']:
+            self.pickler = _loadPickler( info['pickler'] )
+        if not _isFramed( self._view ):
+            raise ValueError( "loads_lazy() requires data written with chunked_sequence" )
+        flags, self._blockLength = _parseFrameHeader( self._view[:_frameHeader.size] )
+        if not flags & _FLAG_SEQUENCE:
+            raise ValueError( "loads_lazy() requires data written with chunked_sequence" )
+        stream = _BufferStream( self._view )
+        stream.read( _frameHeader.size )
+        self._length, blockSizes, self._isTuple = _readSequenceTable( stream )
+        dataStart = _frameHeader.size + _sequenceHeader.size + 8 * len(blockSizes)
+        self._offsets = list( accumulate( chain( (dataStart,), blockSizes ) ) )
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def __len__( self ):
+        return self._length
+    
+    def _block( self, blockIndex ):
+        with self._lock:
+            block = self._blocks.get( blockIndex )
+            if block is not None:
+                self._blocks.move_to_end( blockIndex )
+                return block
+        start, end = self._offsets[blockIndex], self._offsets[blockIndex+1]
+        block = loads( self._view[start:end], pickler=self.pickler, **self.pickler_args )
+        with self._lock:
+            self._blocks[blockIndex] = block
+            while len(self._blocks) > max( self.cache_blocks, 1 ):
+                self._blocks.popitem( last=False )
+        return block
+    
+    def __getitem__( self, index ):
+        if isinstance( index, slice ):
+            indices = range( self._length )[index]
+            if indices.step == 1:
+                elements = []
+                for blockIndex in range( indices.start // self._blockLength, 
+                        (indices.stop - 1) // self._blockLength + 1 if indices else 0 ):
+                    blockStart = blockIndex * self._blockLength
+                    elements.extend( self._block( blockIndex )[
+                            max( indices.start - blockStart, 0 ):indices.stop - blockStart] )
+            else:
+                elements = [ self[I] for I in indices ]
+            return tuple(elements) if self._isTuple else elements
+        index = operator.index( index )
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError( "BloscSequence index out of range" )
+        return self._block( index // self._blockLength )[index % self._blockLength]
+    
+    def __iter__( self ):
+        for blockIndex in range( len(self._offsets) - 1 ):
+            yield from self._block( blockIndex )
+    
+    def __repr__( self ):
+        return "<BloscSequence of {} elements in {} blocks>".format( 
+                self._length, len(self._offsets) - 1 )
+
+
+def loads_lazy( bloscBytes, pickler=None, cache_blocks=8, **pickler_args ):
+    """
+    Return a read-only BloscSequence over bloscBytes, as written by dumps() 
+    with chunked_sequence, that only decompresses and deserializes the 
+    blocks holding the elements that are accessed.  bloscBytes may be any 
+    buffer, e.g. a memory-mapped file, and must outlive the sequence.
+    
+      pickler: a module or a registered name (see available_picklers()), 
+        { 'pickle','marshal','json','ujson','rapidjson','orjson','msgpack' }
+      cache_blocks: the number of decoded blocks kept in an LRU cache.
+      **pickler_args: are keyword arguments that will be passed to the called 
+        'pickle'-style module, so refer to the documentation for those modules 
+        for their particular keywords.
+    """
+    return BloscSequence( bloscBytes, pickler=pickler, cache_blocks=cache_blocks, 
+                          **pickler_args )
+
+
+####### COMPRESSED FILES #######
+class BloscFile(io.RawIOBase):
+    """
+    Raw file object over a blosc chunked file, in the framed format written 
+    by dump(), so that any reader or writer of plain files (pickle, numpy, 
+    tarfile, ...) can work on compressed data directly.  Usually created 
+    through bloscpickle.open(), which adds buffering.
+    
+    In read mode an index of the chunk offsets is built on opening from the 
+    chunk headers alone, and seek() is free: read() only decompresses the 
+    chunks it touches.  The last chunk read is kept decompressed for the 
+    small reads of buffered and line-oriented readers.  Write and append 
+    modes are sequential; tell() works but seek() only to the current 
+    position.  Appending to a file written by dump() brings the raw size in 
+    its header up to date on close(), unless file is an object that cannot 
+    be written in place (opened with 'a'), whose header keeps the old size.
+    
+      file: a path, or a binary file object opened with a matching mode 
+        (which is not closed with the BloscFile).
+      mode: { 'rb', 'wb', 'xb', 'ab' }, the 'b' being optional.
+      compressor, clevel, shuffle, chunksize: as for dump(), when writing.
+    """
+    def __init__( self, file, mode='rb', compressor=None, clevel=None, shuffle=None, 
+                  chunksize=None ):
+        super().__init__()
+        mode = mode.replace( 'b', '' )
+        if mode not in ('r', 'w', 'x', 'a'):
+            raise ValueError( "Invalid mode for BloscFile: {!r}".format(mode) )
+        self.mode = mode + 'b'
+        if isinstance( file, (str, bytes, os.PathLike) ):
+            self.name = file
+            self._fh = io.open( file, {'r': 'rb', 'w': 'wb', 'x': 'xb', 'a': 'a+b'}[mode] )
+            self._closeFile = True
+        else:
+            self.name = getattr( file, 'name', None )
+            self._fh = file
+            self._closeFile = False
+        self._pos = 0
+        self._writer = None
+        self._infoAt = None
+        self._chunkIndex = -1
+        self._chunk = b''
+        try:
+            if mode == 'a' and self._fh.seek( 0, io.SEEK_END ) == 0:
+                mode = 'w' # appending to an empty file
+            if mode in ('r', 'a'):
+                self._fh.seek( 0 )
+                self._readIndex()
+            if mode == 'a':
+                # Drop the terminator and continue the chunk sequence
+                self._fh.seek( self._end )
+                self._fh.truncate()
+                self._pos = self._starts[-1]
+            elif mode in ('w', 'x'):
+                if chunksize is None: chunksize = _defaultChunksize
+                _writeFrameHeader( self._fh, chunksize )
+                self._chunksize = chunksize
+            if mode != 'r':
+                self._writer = _BloscChunkWriter( self._fh, self._chunksize, 
+                        _defaultCompressor if compressor is None else compressor, 
+                        _defaultCLevel if clevel is None else clevel, 
+                        _defaultShuffle if shuffle is None else shuffle )
+        except BaseException:
+            if self._closeFile:
+                self._fh.close()
+            raise
+    
+    def _readIndex( self ):
+        """
+        Walk the chunk headers, recording the file offset and compressed 
+        length of every chunk and the uncompressed offset it starts at.
+        """
+        infoAt = self._fh.tell()
+        header = self._fh.read( _frameHeader.size )
+        if _isDescribed( header ):
+            info, header = _readInfo( self._fh, header )
+            self._infoAt = infoAt
+        if not _isFramed( header ):
+            raise ValueError( "{} is not a framed bloscpickle file".format(self.name) )
+        flags, self._chunksize = _parseFrameHeader( header )
+        if flags & _FLAGS_MULTIPART:
+            raise ValueError( "BloscFile requires a file holding a single serialized byte stream" )
+        self._offsets = []
+        self._lengths = []
+        self._starts = [0]
+        offset = self._fh.tell()
+        while True:
+            clen, = _chunkHeader.unpack( _readExact( self._fh, _chunkHeader.size ) )
+            if clen == 0:
+                break
+            offset += _chunkHeader.size
+            rawsize = _bloscSizes( _readExact( self._fh, _bloscHeader.size ) )[0]
+            self._offsets.append( offset )
+            self._lengths.append( clen )
+            self._starts.append( self._starts[-1] + rawsize )
+            offset += clen
+            self._fh.seek( offset )
+        self._end = offset
+    
+    def readable( self ):
+        return self._writer is None
+    
+    def writable( self ):
+        return self._writer is not None
+    
+    def seekable( self ):
+        return self._writer is None
+    
+    def tell( self ):
+        if self.closed:
+            raise ValueError( "I/O operation on closed file" )
+        return self._pos
+    
+    def seek( self, offset, whence=io.SEEK_SET ):
+        if self.closed:
+            raise ValueError( "I/O operation on closed file" )
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            if self._writer is not None:
+                raise io.UnsupportedOperation( "BloscFile can only seek when reading" )
+            offset += self._starts[-1]
+        elif whence != io.SEEK_SET:
+            raise ValueError( "Invalid whence: {}".format(whence) )
+        if offset < 0:
+            raise ValueError( "Negative seek position {}".format(offset) )
+        if self._writer is not None and offset != self._pos:
+            raise io.UnsupportedOperation( "BloscFile can only seek when reading" )
+        self._pos = offset
+        return offset
+    
+    def _readChunk( self, index, view=None ):
+        self._fh.seek( self._offsets[index] )
+        compressed = _readExact( self._fh, self._lengths[index] )
+        if view is not None:
+            blosc.decompress_ptr( compressed, _bufferAddress( view ) )
+        else:
+            self._chunk = blosc.decompress( compressed )
+            self._chunkIndex = index
+    
+    def readinto( self, buffer ):
+        if not self.readable():
+            raise io.UnsupportedOperation( "BloscFile not open for reading" )
+        view = memoryview(buffer).cast('B')
+        starts = self._starts
+        if len(view) == 0 or self._pos >= starts[-1]:
+            return 0
+        index = bisect_right( starts, self._pos ) - 1
+        skip = self._pos - starts[index]
+        chunkLength = starts[index+1] - starts[index]
+        if index != self._chunkIndex and skip == 0 and len(view) >= chunkLength:
+            # Whole chunks are decompressed straight into the caller's buffer
+            self._readChunk( index, view )
+            nbytes = chunkLength
+        else:
+            if index != self._chunkIndex:
+                self._readChunk( index )
+            nbytes = min( len(view), chunkLength - skip )
+            view[:nbytes] = self._chunk[skip:skip+nbytes]
+        self._pos += nbytes
+        return nbytes
+    
+    def write( self, data ):
+        if not self.writable():
+            raise io.UnsupportedOperation( "BloscFile not open for writing" )
+        nbytes = self._writer.write( data )
+        self._pos += nbytes
+        return nbytes
+    
+    def _updateRawSize( self ):
+        """
+        Record the new total in the header of a file appended to.  Paths are 
+        opened with 'a', where every write goes to the end, so the header is 
+        patched through a second handle.
+        """
+        if self._infoAt is None:
+            return
+        if self._closeFile:
+            self._fh.flush()
+            with io.open( self.name, 'r+b' ) as fh:
+                _recordRawSize( fh, self._infoAt, self._pos )
+        elif _seekablePosition( self._fh ) is not None:
+            _recordRawSize( self._fh, self._infoAt, self._pos )
+    
+    def close( self ):
+        if self.closed:
+            return
+        try:
+            if self._writer is not None:
+                self._writer.close()
+                self._updateRawSize()
+        finally:
+            self._chunk = b''
+            if self._closeFile:
+                self._fh.close()
+            super().close()
+
+
+def open( file, mode='rb', compressor=None, clevel=None, shuffle=None, chunksize=None, 
+          buffering=-1, encoding=None, errors=None, newline=None ):
+    """
+    Open a blosc compressed file and return a buffered file object, like the 
+    built-in open(): an io.BufferedReader or io.BufferedWriter, or an 
+    io.TextIOWrapper in text mode.  Reads are random access (see BloscFile).
+    
+        with bloscpickle.open( 'model.bpk', 'wb' ) as fh:
+            pickle.dump( model, fh )
+        with bloscpickle.open( 'model.bpk' ) as fh:
+            model = pickle.load( fh )
+    
+    Files written this way can be read by load() and vice versa, except for 
+    dump()s of NumPy arrays or with out_of_band=True.
+    
+      mode: { 'r', 'w', 'x', 'a' } with 'b' (the default) or 't'.
+      compressor, clevel, shuffle, chunksize: as for dump(), when writing.
+      buffering: the buffer size, or 0 for the unbuffered BloscFile itself 
+        (binary mode only).
+      encoding, errors, newline: as for open(), in text mode.
+    """
+    text = 't' in mode
+    if text and 'b' in mode:
+        raise ValueError( "can't have text and binary mode at once" )
+    rawMode = mode.replace( 't', '' ).replace( 'b', '' )
+    raw = BloscFile( file, rawMode, compressor=compressor, clevel=clevel, 
+                     shuffle=shuffle, chunksize=chunksize )
+    if buffering == 0:
+        if text:
+            raw.close()
+            raise ValueError( "can't have unbuffered text I/O" )
+        return raw
+    if buffering < 0:
+        buffering = io.DEFAULT_BUFFER_SIZE
+    if raw.readable():
+        buffered = io.BufferedReader( raw, buffering )
+    else:
+        buffered = io.BufferedWriter( raw, buffering )
+    if text:
+        return io.TextIOWrapper( buffered, encoding, errors, newline )
+    return buffered
+
+
+####### ASYNCIO #######
+async def _runInExecutor( executor, task ):
+    if executor is None:
+        executor = _getExecutor()
+    import asyncio
+    return await asyncio.get_running_loop().run_in_executor( executor, task )
+
+async def _writeAndDrain( writer, data ):
+    writer.write( data )
+    if hasattr( writer, 'drain' ):
+        await writer.drain()
+
+class _LoopWriter(io.RawIOBase):
+    """
+    Write-only stream for a dump() running in an executor thread.  Writes are 
+    gathered until they reach a chunk header's worth of payload, then handed 
+    to writer on the event loop, and the thread waits for the writer to 
+    drain, so no more than about one chunk is held in memory at a time.
+    """
+    _minSend = 2**16
+    
+    def __init__( self, writer, loop ):
+        self._writer = writer
+        self._loop = loop
+        self._pending = []
+        self._pendingSize = 0
+        self.cancelled = False
+        
+    def writable( self ):
+        return True
+    
+    def write( self, data ):
+        if self.cancelled:
+            raise OSError( "adump() was cancelled" )
+        # The transport may hold on to what it is given, and the caller may 
+        # reuse data once write() returns
+        data = bytes(data)
+        self._pending.append( data )
+        self._pendingSize += len(data)
+        if self._pendingSize >= self._minSend:
+            self.flush()
+        return len(data)
+    
+    def flush( self ):
+        if not self._pending or self.cancelled:
+            return
+        data = b''.join( self._pending )
+        self._pending = []
+        self._pendingSize = 0
+        import asyncio
+        asyncio.run_coroutine_threadsafe( _writeAndDrain( self._writer, data ), self._loop ).result()
+
+async def _readMessage( reader ):
+    """
+    Read one complete message written by dump()/dumps() from an asyncio 
+    StreamReader, walking its headers so that nothing past its end is 
+    consumed.  Returns the compressed bytes.
+    """
+    parts = [ await reader.readexactly( _frameHeader.size ) ]
+    if _isDescribed( parts[0] ):
+        parts.append( await reader.readexactly( _infoHeader.size - _frameHeader.size ) )
+        for I in range( 3 ):
+            length = await reader.readexactly( 1 )
+            parts += [length, await reader.readexactly( length[0] )]
+        parts.append( await reader.readexactly( _frameHeader.size ) )
+    if not _isFramed( parts[-1] ):
+        parts.append( await reader.readexactly( _bloscHeader.size - _frameHeader.size ) )
+        cbytes = _bloscSizes( b''.join(parts[-2:]) )[1]
+        parts.append( await reader.readexactly( cbytes - _bloscHeader.size ) )
+        return b''.join( parts )
+    
+    async def readChunks():
+        while True:
+            header = await reader.readexactly( _chunkHeader.size )
+            parts.append( header )
+            clen, = _chunkHeader.unpack( header )
+            if clen == 0:
+                return
+            parts.append( await reader.readexactly( clen ) )
+    
+    flags, chunksize = _parseFrameHeader( parts[-1] )
+    if flags & _FLAG_NUMPY:
+        header = await reader.readexactly( _countHeader.size )
+        metadata = await reader.readexactly( _countHeader.unpack( header )[0] )
+        parts += [header, metadata]
+        for I in range( len( json.loads( metadata.decode('utf-8') )['arrays'] ) ):
+            await readChunks()
+    elif flags & _FLAG_TYPED:
+        header = await reader.readexactly( _countHeader.size )
+        metadata = await reader.readexactly( _countHeader.unpack( header )[0] )
+        parts += [header, metadata]
+        for I in range( len( json.loads( metadata.decode('utf-8') )['buffers'] ) ):
+            await readChunks()
+        await readChunks()
+    elif flags & _FLAG_SEQUENCE:
+        header = await reader.readexactly( _sequenceHeader.size )
+        length, nblocks, isTuple = _sequenceHeader.unpack( header )
+        table = await reader.readexactly( 8 * nblocks )
+        parts += [header, table, await reader.readexactly( 
+                sum( struct.unpack( '<{}Q'.format(nblocks), table ) ) )]
+    elif flags & _FLAG_OUT_OF_BAND:
+        header = await reader.readexactly( _countHeader.size )
+        parts.append( header )
+        for I in range( _countHeader.unpack( header )[0] ):
+            parts.append( await reader.readexactly( _bufferHeader.size ) )
+            await readChunks()
+        await readChunks()
+    else:
+        await readChunks()
+    return b''.join( parts )
+
+
+async def adumps( pyObject, pickler=None, compressor=None, clevel=None, 
+                  shuffle=None, out_of_band=False, buffer_shuffle=None, 
+                  executor=None, **pickler_args ):
+    """
+    Coroutine version of dumps().  The object is serialized on the event loop 
+    thread, so it cannot be changed by other tasks half-way through, while 
+    the compression runs in executor (by default the dumps_many() thread 
+    pool).  NumPy arrays are compressed in place and must not be modified 
+    until the coroutine returns.
+    """
+    pickler = _resolvePickler( pickler )
+    if compressor is None: compressor = _defaultCompressor
+    if clevel is None: clevel = _defaultCLevel
+    if shuffle is None: shuffle = _defaultShuffle
+    
+    if out_of_band or _isArrayTree( pyObject ) or (_typedMinLength is not None and 
+                                                   _hasTypedCandidate( pyObject, _typedMinLength )):
+        return await _runInExecutor( executor, partial( dumps, pyObject, pickler=pickler, 
+                compressor=compressor, clevel=clevel, shuffle=shuffle, out_of_band=out_of_band, 
+                buffer_shuffle=buffer_shuffle, **pickler_args ) )
+    serialized = _serialize( pyObject, pickler, **pickler_args )
+    return await _runInExecutor( executor, partial( _compressSerialized, serialized, 
+            _autoKey(pyObject, pickler), compressor, clevel, shuffle, pickler ) )
+
+
+async def adump( pyObject, writer, pickler=None, compressor=None, clevel=None, 
+                 shuffle=None, chunksize=None, out_of_band=False, buffer_shuffle=None, 
+                 executor=None, **pickler_args ):
+    """
+    Coroutine version of dump() for an asyncio StreamWriter (or any object 
+    with write() and an optional drain() coroutine).  The framed format is 
+    the same as dump() writes; every chunk is compressed in executor and the 
+    writer is drained after each one, so a large payload does not stall 
+    other tasks on the event loop.  Arrays, typed and out-of-band payloads 
+    are dumped in executor, which waits for each chunk to drain before it 
+    compresses the next; their headers then carry no raw size, as for 
+    dump() to any unseekable stream.
+    """
+    pickler = _resolvePickler( pickler )
+    if compressor is None: compressor = _defaultCompressor
+    if clevel is None: clevel = _defaultCLevel
+    if shuffle is None: shuffle = _defaultShuffle
+    if chunksize is None: chunksize = _defaultChunksize
+    
+    if out_of_band or _isArrayTree( pyObject ) or (_typedMinLength is not None and 
+                                                   _hasTypedCandidate( pyObject, _typedMinLength )):
+        import asyncio
+        bloscStream = _LoopWriter( writer, asyncio.get_running_loop() )
+        
+        def dumpAndFlush():
+            dump( pyObject, bloscStream, pickler=pickler, compressor=compressor, clevel=clevel, 
+                  shuffle=shuffle, chunksize=chunksize, out_of_band=out_of_band, 
+                  buffer_shuffle=buffer_shuffle, **pickler_args )
+            bloscStream.flush()
+        try:
+            await _runInExecutor( executor, dumpAndFlush )
+        finally:
+            # A cancelled call leaves the thread running; stop it writing
+            bloscStream.cancelled = True
+        return
+    
+    with memoryview( _serialize( pyObject, pickler, **pickler_args ) ) as view:
+        if compressor == _AUTO:
+            compressor, clevel, shuffle = await _runInExecutor( executor, 
+                    partial( _autoSettings, _autoKey(pyObject, pickler), view[:chunksize] ) )
+        header = BytesIO()
+        if _selfDescribing:
+            header.write( _infoBlock( pickler, compressor, clevel, shuffle, len(view) ) )
+        _writeFrameHeader( header, chunksize )
+        await _writeAndDrain( writer, header.getvalue() )
+        for offset in range( 0, len(view), chunksize ):
+            compressed = await _runInExecutor( executor, partial( blosc.compress, 
+                    view[offset:offset+chunksize], typesize=1, clevel=clevel, 
+                    shuffle=shuffle, cname=compressor ) )
+            await _writeAndDrain( writer, _chunkHeader.pack( len(compressed) ) + compressed )
+        await _writeAndDrain( writer, _chunkHeader.pack( 0 ) )
+
+
+async def aloads( bloscBytes, pickler=None, executor=None, **pickler_args ):
+    """
+    Coroutine version of loads().  Decompression and deserialization run in 
+    executor (by default the dumps_many() thread pool).
+    """
+    return await _runInExecutor( executor, partial( loads, bloscBytes, 
+            pickler=pickler, **pickler_args ) )
+
+
+async def aload( reader, pickler=None, executor=None, **pickler_args ):
+    """
+    Coroutine version of load() for an asyncio StreamReader.  Exactly one 
+    message written by dump(), adump() or dumps() is read from reader, so 
+    several messages may follow each other on the same stream.
+    """
+    return await aloads( await _readMessage( reader ), pickler=pickler, 
+                         executor=executor, **pickler_args )
+
+
+####### SOCKET CHANNELS #######
+# A channel message is a header followed by its payload: the serialized bytes 
+# as they are, or a run of blosc buffers of at most chunksize bytes each.  A 
+# batch is a list of objects serialized as one payload.
+_channelHeader = struct.Struct( '<B7xQQ' ) # flags, raw size, payload size
+_CHANNEL_COMPRESSED = 1
+_CHANNEL_BATCH = 2
+_channelMinSize = 2**10      # smaller payloads are always sent raw
+_channelMeasureSize = 2**16  # smaller payloads do not update the throughput estimates
+_channelProbeEvery = 16      # measured messages sent raw between probes of clevel 1
+_channelSmoothing = 0.25     # weight of the newest measurement in the running averages
+_iovMax = 1024
+
+def _smooth( average, value ):
+    return value if average is None else average + _channelSmoothing * (value - average)
+
+
+class BloscChannel(object):
+    """
+    Sends and receives objects over a connected socket or a pipe, framing 
+    each one with its length so that both ends need nothing else.
+    
+    With adaptive=True the channel times the link and blosc on every large 
+    message and picks the clevel that minimises compression time plus 
+    transmission time, stepping one level at a time: down, and finally to 
+    sending raw bytes, while compression is the bottleneck, and up while the 
+    link is.  With compression off, one message in every _channelProbeEvery 
+    is compressed at clevel 1 to see if the link has slowed down.  The 
+    decision is the sender's alone; receivers accept any mix of settings.
+    
+      transport: a connected socket (anything with sendall() and recv_into()), 
+        or a binary file object such as os.fdopen() of a pipe end (anything 
+        with write() and readinto()).  The parts of a message are sent with 
+        one sendmsg() where the socket supports it, and with one sendall() 
+        each where it does not, as on Windows and for ssl sockets.
+      pickler: a module or a registered name (see available_picklers()).  
+        Both ends must use the same one.
+      compressor, shuffle: blosc settings, defaulting to the module ones.  
+        As the channel picks its own clevel, compressor='auto' starts from 
+        the fastest of the automatic candidates instead.
+      clevel: the starting clevel, or the fixed one with adaptive=False. 
+        0 sends raw bytes.
+      max_clevel: the highest clevel adaptive mode will step up to.
+      bandwidth: link throughput in MB/s, for links whose speed is known.  
+        None measures it from the time sends block for.
+      chunksize: raw bytes per blosc buffer.
+      **pickler_args: passed to the 'pickle'-style module on every call.
+    
+    Sends and receives are locked separately, so one thread may send while 
+    another receives.  Only the sender's compression time is measured; 
+    decompression is usually several times faster.
+    """
+    def __init__( self, transport, pickler=None, compressor=None, clevel=None, 
+                  shuffle=None, adaptive=True, max_clevel=9, bandwidth=None, 
+                  chunksize=None, **pickler_args ):
+        self.transport = transport
+        self.pickler = _resolvePickler( pickler )
+        self.compressor = _defaultCompressor if compressor is None else compressor
+        self.clevel = _defaultCLevel if clevel is None else clevel
+        self.shuffle = _defaultShuffle if shuffle is None else shuffle
+        if self.compressor == _AUTO:
+            self.compressor, self.clevel = _autoCandidates[0]
+        self.adaptive = adaptive
+        self.max_clevel = max_clevel
+        self.chunksize = _defaultChunksize if chunksize is None else chunksize
+        self.pickler_args = pickler_args
+        
+        if hasattr( transport, 'sendall' ):
+            self._sendmsg = getattr( transport, 'sendmsg', None )
+            self._sendall = transport.sendall
+            self._write = None
+            self._readinto = transport.recv_into
+        else:
+            self._sendmsg = None
+            self._sendall = None
+            self._write = transport.write
+            self._readinto = transport.readinto
+        self._sendLock = threading.Lock()
+        self._recvLock = threading.Lock()
+        self._payload = _ScratchBuffer()
+        self._serialized = _ScratchBuffer()
+        self._pending = deque()
+        
+        # Running averages in bytes per second, and of the compression ratio 
+        # per clevel
+        self._linkSpeed = None if bandwidth is None else bandwidth * 2**20
+        self._fixedLink = bandwidth is not None
+        self._codecSpeed = {}
+        self._ratio = {}
+        self._sinceProbe = 0
+        
+    @property
+    def link_speed( self ):
+        """
+        The measured (or given) link throughput in MB/s, None until a large 
+        message has been sent.
+        """
+        return None if self._linkSpeed is None else self._linkSpeed / 2**20
+    
+    def send( self, pyObject ):
+        """
+        Serialize pyObject and send it as one message.
+        """
+        self._sendSerialized( _serialize( pyObject, self.pickler, **self.pickler_args ), 0 )
+        
+    def send_many( self, pyObjects ):
+        """
+        Send pyObjects as a single message, so that many small objects share 
+        one header, one system call and one compression context.  The 
+        receiver gets them back one at a time from recv(), or all together 
+        from recv_many().
+        """
+        self._sendSerialized( _serialize( list(pyObjects), self.pickler, **self.pickler_args ), 
+                              _CHANNEL_BATCH )
+    
+    def recv( self ):
+        """
+        Receive the next object.  Raises EOFError if the other end closed the 
+        connection.
+        """
+        with self._recvLock:
+            if self._pending:
+                return self._pending.popleft()
+            flags, pyObject = self._recvObject()
+            if flags & _CHANNEL_BATCH:
+                self._pending.extend( pyObject )
+                return self._pending.popleft()
+            return pyObject
+    
+    def recv_many( self ):
+        """
+        Receive the objects of the next message as a list: a whole batch sent 
+        by send_many(), the remainder of one that recv() started on, or a 
+        single object sent by send().
+        """
+        with self._recvLock:
+            if self._pending:
+                pyObjects = list( self._pending )
+                self._pending.clear()
+                return pyObjects
+            flags, pyObject = self._recvObject()
+            return pyObject if flags & _CHANNEL_BATCH else [pyObject]
+    
+    def recv_into( self, buffer ):
+        """
+        Receive the next message and write its serialized bytes into buffer, 
+        a writable bytearray, mmap or other contiguous buffer, and return 
+        the number of bytes written, as loads_into() does.  Raw messages are 
+        received straight into buffer, compressed ones are decompressed into 
+        it.  A batch arrives as its serialized list.
+        
+        Raises ValueError if buffer is too small, after the message has been 
+        read past, or if recv() has objects of a batch still to hand out.
+        """
+        with self._recvLock:
+            if self._pending:
+                raise ValueError( "recv_into() called with {} objects of a batch still pending".format( 
+                        len(self._pending) ) )
+            flags, rawSize, payloadSize = self._recvHeader()
+            view = memoryview(buffer).cast('B')
+            if rawSize > len(view):
+                self._recvPayload( payloadSize ).release()
+                raise ValueError( "Buffer of {} bytes is too small for the decompressed data".format(len(view)) )
+            if flags & _CHANNEL_COMPRESSED:
+                with self._recvPayload( payloadSize ) as payload:
+                    self._decompress( payload, view )
+            else:
+                self._recvExactly( view[:rawSize] )
+            return rawSize
+    
+    def close( self ):
+        self.transport.close()
+        
+    def __enter__( self ):
+        return self
+    
+    def __exit__( self, *exc ):
+        self.close()
+        
+    def _sendSerialized( self, serialized, flags ):
+        with memoryview( serialized ) as view, self._sendLock:
+            rawSize = len(view)
+            clevel = self._nextLevel() if rawSize >= _channelMinSize else 0
+            if clevel == 0:
+                parts = [view]
+            else:
+                flags |= _CHANNEL_COMPRESSED
+                t0 = perf_counter()
+                parts = [ blosc.compress( view[offset:offset+self.chunksize], typesize=1, 
+                                          clevel=clevel, shuffle=self.shuffle, cname=self.compressor ) 
+                          for offset in range( 0, rawSize, self.chunksize ) ]
+                codecTime = perf_counter() - t0
+            payloadSize = sum( map( len, parts ) )
+            t0 = perf_counter()
+            self._sendParts( [_channelHeader.pack( flags, rawSize, payloadSize )] + parts )
+            sendTime = perf_counter() - t0
+            
+            if not self.adaptive or rawSize < _channelMeasureSize:
+                return
+            if not self._fixedLink:
+                self._linkSpeed = _smooth( self._linkSpeed, payloadSize / max( sendTime, 1e-9 ) )
+            if clevel > 0:
+                self._codecSpeed[clevel] = _smooth( self._codecSpeed.get( clevel ), 
+                                                    rawSize / max( codecTime, 1e-9 ) )
+                self._ratio[clevel] = _smooth( self._ratio.get( clevel ), rawSize / max( payloadSize, 1 ) )
+            self._adapt( clevel )
+    
+    def _nextLevel( self ):
+        """
+        The clevel for the next message, which is a probe at clevel 1 every 
+        so often while compression is off.
+        """
+        if self.adaptive and self.clevel == 0 and self._sinceProbe >= _channelProbeEvery:
+            self._sinceProbe = 0
+            return 1
+        return self.clevel
+    
+    def _cost( self, clevel ):
+        """
+        Estimated seconds per raw byte to compress and send at clevel, None 
+        if it has not been measured yet.
+        """
+        if clevel == 0:
+            return 1.0 / self._linkSpeed
+        if clevel not in self._codecSpeed:
+            return None
+        return 1.0 / self._codecSpeed[clevel] + 1.0 / (self._ratio[clevel] * self._linkSpeed)
+        
+    def _adapt( self, clevel ):
+        """
+        Step self.clevel towards the cheaper neighbour of clevel, the level 
+        the last message was sent at.
+        """
+        if clevel == 0:
+            self._sinceProbe += 1
+            return
+        cost, lower, upper = self._cost( clevel ), self._cost( clevel - 1 ), None
+        if clevel < self.max_clevel:
+            upper = self._cost( clevel + 1 )
+        if self._codecSpeed[clevel] < self._ratio[clevel] * self._linkSpeed:
+            # Compression is the bottleneck
+            if lower is None or lower < cost:
+                clevel -= 1
+        elif clevel < self.max_clevel and (upper is None or upper < cost):
+            clevel += 1
+        elif lower is not None and lower < cost:
+            clevel -= 1
+        self.clevel = clevel
+    
+    def _sendParts( self, parts ):
+        views = [ memoryview(part).cast('B') for part in parts ]
+        if self._sendall is not None and self._sendmsg is None:
+            for view in views:
+                self._sendall( view )
+            return
+        if self._sendmsg is None:
+            for view in views:
+                while len(view):
+                    # Raw file objects may write less than they are given
+                    view = view[self._write( view ):]
+            if hasattr( self.transport, 'flush' ):
+                self.transport.flush()
+            return
+        while views:
+            try:
+                sent = self._sendmsg( views[:_iovMax] )
+            except NotImplementedError:
+                # ssl.SSLSocket has a sendmsg() that always raises this
+                self._sendmsg = None
+                return self._sendParts( views )
+            while views and sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            if views:
+                views[0] = views[0][sent:]
+    
+    def _recvExactly( self, view ):
+        offset = 0
+        while offset < len(view):
+            nbytes = self._readinto( view[offset:] )
+            if not nbytes:
+                raise EOFError( "BloscChannel closed with {} bytes of a message outstanding".format( 
+                        len(view) - offset ) )
+            offset += nbytes
+            
+    def _recvHeader( self ):
+        header = bytearray( _channelHeader.size )
+        with memoryview( header ) as view:
+            offset = self._readinto( view )
+            if not offset:
+                raise EOFError( "BloscChannel closed" )
+            self._recvExactly( view[offset:] )
+        return _channelHeader.unpack( header )
+    
+    def _recvPayload( self, payloadSize ):
+        self._payload.reset()
+        self._payload.resize( payloadSize )
+        view = self._payload.view()
+        self._recvExactly( view )
+        return view
+    
+    def _decompress( self, payload, view ):
+        """
+        Decompress the run of blosc buffers in payload into view.
+        """
+        offset = position = 0
+        while offset < len(payload):
+            nbytes, cbytes = _bloscSizes( payload[offset:] )
+            if nbytes > 0:
+                blosc.decompress_ptr( payload[offset:offset+cbytes], 
+                                      _bufferAddress( view[position:] ) )
+            offset += cbytes
+            position += nbytes
+    
+    def _recvObject( self ):
+        flags, rawSize, payloadSize = self._recvHeader()
+        self._serialized.reset()
+        self._serialized.resize( rawSize )
+        with self._serialized.view() as view:
+            if flags & _CHANNEL_COMPRESSED:
+                with self._recvPayload( payloadSize ) as payload:
+                    self._decompress( payload, view )
+            else:
+                self._recvExactly( view )
+            if _picklerKind( self.pickler ) is _TEXT:
+                # The JSON decoders do not accept memoryviews
+                return flags, self.pickler.loads( bytes(view), **self.pickler_args )
+            return flags, self.pickler.loads( view, **self.pickler_args )
+
+
+####### MULTIPROCESSING #######
+def _loadsCompressedPickle( bloscBytes ):
+    return pickle.loads( blosc.decompress( bloscBytes ) )
+
+class _CompressedPickle(object):
+    """
+    Wrapper for a blosc compressed pickle.  It reduces to a call that 
+    decompresses and unpickles the original object, so the receiving process 
+    only needs a standard unpickler and bloscpickle on its path.
+    """
+    __slots__ = ('bloscBytes',)
+    def __init__( self, bloscBytes ):
+        self.bloscBytes = bloscBytes
+        
+    def __reduce__( self ):
+        return _loadsCompressedPickle, (self.bloscBytes,)
+
+
+_forkingPickler = None
+def _getForkingPickler():
+    """
+    Return BloscForkingPickler, defining it on first use.  Importing 
+    multiprocessing.reduction takes longer than the rest of this module, so 
+    it is left until multiprocessing is actually wanted.
+    """
+    global _forkingPickler
+    if _forkingPickler is not None:
+        return _forkingPickler
+    from multiprocessing.reduction import ForkingPickler
+    
+    class BloscForkingPickler(ForkingPickler):
+        """
+        multiprocessing ForkingPickler that blosc compresses pickles of at least 
+        threshold bytes.  Smaller or incompressible pickles are sent as they are.  
+        Installed for Queue, SimpleQueue, Pipe and Pool by install_multiprocessing().
+        """
+        threshold = 2**16
+        compressor = None
+        clevel = None
+        shuffle = None
+        
+        @classmethod
+        def dumps( cls, obj, protocol=None ):
+            buf = super().dumps( obj, protocol )
+            if len(buf) < cls.threshold:
+                return buf
+            compressor = _defaultCompressor if cls.compressor is None else cls.compressor
+            clevel = _defaultCLevel if cls.clevel is None else cls.clevel
+            shuffle = _defaultShuffle if cls.shuffle is None else cls.shuffle
+            if compressor == _AUTO:
+                compressor, clevel, shuffle = _autoSettings( _autoKey(obj, ForkingPickler), buf )
+            bloscBytes = blosc.compress( buf, typesize=1, clevel=clevel, 
+                                         shuffle=shuffle, cname=compressor )
+            if len(bloscBytes) >= len(buf):
+                return buf
+            return super().dumps( _CompressedPickle( bloscBytes ), protocol )
+    
+    # Named as a module attribute, so that the class pickles by reference
+    BloscForkingPickler.__module__ = __name__
+    BloscForkingPickler.__qualname__ = 'BloscForkingPickler'
+    _forkingPickler = BloscForkingPickler
+    return _forkingPickler
+
+def __getattr__( name ):
+    # BloscForkingPickler is built on first access, see _getForkingPickler()
+    if name == 'BloscForkingPickler':
+        return _getForkingPickler()
+    raise AttributeError( "module {!r} has no attribute {!r}".format(__name__, name) )
+
+
+def install_multiprocessing( threshold=2**16, compressor=None, clevel=None, shuffle=None ):
+    """
+    Make multiprocessing Queue, SimpleQueue, Pipe connections and Pool send 
+    blosc compressed pickles for payloads of threshold bytes or more.
+    
+    Receiving processes decode the payloads with the standard unpickler, so 
+    only the sending side needs this installed.  Child processes started 
+    with 'fork' inherit it; for 'spawn' or 'forkserver' children that send 
+    large results, call it from the Pool initializer.
+    
+      compressor, clevel, shuffle: default to the module settings.
+    """
+    BloscForkingPickler = _getForkingPickler()
+    BloscForkingPickler.threshold = threshold
+    BloscForkingPickler.compressor = compressor
+    BloscForkingPickler.clevel = clevel
+    BloscForkingPickler.shuffle = shuffle
+    import multiprocessing.connection, multiprocessing.queues
+    multiprocessing.connection._ForkingPickler = BloscForkingPickler
+    multiprocessing.queues._ForkingPickler = BloscForkingPickler
+
+
+def uninstall_multiprocessing():
+    """
+    Restore the standard multiprocessing ForkingPickler.
+    """
+    from multiprocessing.reduction import ForkingPickler
+    import multiprocessing.connection, multiprocessing.queues
+    multiprocessing.connection._ForkingPickler = ForkingPickler
+    multiprocessing.queues._ForkingPickler = ForkingPickler
+
+
+####### COMMAND LINE #######
+_shuffleNames = { blosc.NOSHUFFLE: 'noshuffle', blosc.SHUFFLE: 'shuffle', 
+                  blosc.BITSHUFFLE: 'bitshuffle' }
+_inspectPrefix = 2**10       # covers the longest header plus the frame or blosc header after it
+
+def _walkFiles( paths, pattern ):
+    """
+    Yield (path, root) for every file named in paths or found under the 
+    directories among them whose name matches pattern, in sorted order.
+    """
+    import fnmatch
+    for root in paths:
+        if not os.path.isdir( root ):
+            yield root, os.path.dirname( root ) or os.curdir
+            continue
+        for dirPath, dirNames, fileNames in os.walk( root ):
+            dirNames.sort()
+            for fileName in sorted( fileNames ):
+                if fnmatch.fnmatch( fileName, pattern ):
+                    yield os.path.join( dirPath, fileName ), root
+
+def _runParallel( function, tasks, jobs ):
+    """
+    Yield function(task) for every task, computed by jobs processes and in 
+    the order they finish.  At most 4 * jobs tasks are queued at a time, so 
+    a tree of millions of files is not submitted all at once.
+    """
+    if jobs <= 1:
+        yield from map( function, tasks )
+        return
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    with ProcessPoolExecutor( jobs ) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add( executor.submit( function, task ) )
+            if len(pending) >= 4 * jobs:
+                done, pending = wait( pending, return_when=FIRST_COMPLETED )
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait( pending, return_when=FIRST_COMPLETED )
+            for future in done:
+                yield future.result()
+
+@contextmanager
+def _atomicOutput( path, modeFrom=None ):
+    """
+    Open a temporary file beside path for writing and move it over path once 
+    it is complete and synced, so that readers see either the old file or 
+    the whole new one, even if the process dies half-way through.
+    """
+    directory = os.path.dirname( path )
+    if directory:
+        os.makedirs( directory, exist_ok=True )
+    tmpPath = '{}.{}.tmp'.format( path, os.getpid() )
+    try:
+        with io.open( tmpPath, 'wb' ) as fh:
+            yield fh
+            fh.flush()
+            os.fsync( fh.fileno() )
+        if modeFrom is not None:
+            import shutil
+            shutil.copymode( modeFrom, tmpPath )
+        os.replace( tmpPath, path )
+    except BaseException:
+        if os.path.exists( tmpPath ):
+            os.remove( tmpPath )
+        raise
+
+def _readHeaders( fh ):
+    """
+    Read the headers at the start of an open bloscpickle file, returning 
+    the parsed self-describing header (an empty dict if there is none), 
+    the frame flags and chunksize (None for a single blosc buffer) and the 
+    bytes read past the self-describing header.
+    """
+    header = fh.read( _frameHeader.size )
+    info = {}
+    if _isDescribed( header ):
+        info, header = _readInfo( fh, header )
+    if not _isFramed( header ):
+        # Anything at all parses as a blosc header, but only a real one runs 
+        # to the end of the file
+        remaining = os.fstat( fh.fileno() ).st_size - fh.tell() + len(header)
+        header += fh.read( _bloscHeader.size - len(header) )
+        _checkBlosc( header, remaining )
+        return info, None, None, header
+    flags, chunksize = _parseFrameHeader( header )
+    return info, flags, chunksize, header
+
+def _serializedReader( fh, flags, chunksize, header ):
+    """
+    Return a reader over the serialized bytes of a file holding a single 
+    serialized byte stream, positioned after its headers.
+    """
+    if flags is None:
+        return BytesIO( blosc.decompress( _readLegacy( fh, header ) ) )
+    return _openFrameReader( fh, chunksize )
+
+def _failure( path, err ):
+    return {'path': path, 'error': '{}: {}'.format( type(err).__name__, err ), 
+            'in_size': 0, 'out_size': 0, 'raw_size': 0}
+
+def _inspectFile( task ):
+    path, dest, options = task
+    try:
+        with io.open( path, 'rb' ) as fh:
+            result = _inspect( fh.read( _inspectPrefix ), os.fstat( fh.fileno() ).st_size )
+        result.update( path=path, error=None, in_size=result['compressed_size'], out_size=0 )
+        return result
+    except Exception as err:
+        return _failure( path, err )
+
+def _recodeFile( task ):
+    """
+    Rewrite one file with new compression settings and, for convert, a new 
+    pickler.  Framed files holding a single serialized byte stream are
+    recompressed chunk by chunk without being deserialized, in memory
+    bounded by the chunksize, and single blosc buffers, as written by
+    dumps(), are recompressed as one buffer; the other layouts, and every
+    file being converted, are loaded and written again in the same layout.
+    Settings left as None in options keep the file's own, including the
+    elements per block of a chunked sequence.
+    """
+    path, dest, options = task
+    try:
+        inSize = os.path.getsize( path )
+        with io.open( path, 'rb' ) as fh:
+            info, flags, frameChunksize, header = _readHeaders( fh )
+            # The chunksize field of a sequence holds its elements per block
+            blockLength = frameChunksize if (flags or 0) & _FLAG_SEQUENCE else None
+            compressor = options['compressor'] or info.get( 'compressor' ) or _defaultCompressor
+            clevel, shuffle, chunksize = [ next( value for value in candidates if value is not None ) 
+                    for candidates in ( (options['clevel'], info.get( 'clevel' ), _defaultCLevel), 
+                                        (options['shuffle'], info.get( 'shuffle' ), _defaultShuffle), 
+                                        (options['chunksize'], 
+                                         None if blockLength else frameChunksize, _defaultChunksize) ) ]
+            sourcePickler = info.get( 'pickler' ) or options['source_pickler']
+            
+            with _atomicOutput( dest, path ) as out:
+                if flags is None:
+                    # A single blosc buffer is written as one again, as by dumps()
+                    if options['pickler'] is None:
+                        pickler = sourcePickler
+                        serialized = blosc.decompress( _readLegacy( fh, header ) )
+                        autoKey = _autoKey( serialized, pickler )
+                    else:
+                        fh.seek( 0 )
+                        pyObject = load( fh, pickler=sourcePickler )
+                        pickler = _resolvePickler( options['pickler'] )
+                        serialized = _serialize( pyObject, pickler )
+                        autoKey = _autoKey( pyObject, pickler )
+                    out.write( _compressSerialized( serialized, autoKey, compressor, clevel, shuffle, 
+                                                    pickler, info.get( 'content_type' ) ) )
+                    rawSize = len( memoryview( serialized ).cast('B') )
+                elif options['pickler'] is None and not flags & _FLAGS_MULTIPART:
+                    reader = _openFrameReader( fh, chunksize )
+                    rawSize = info.get( 'raw_size' )
+                    if _selfDescribing:
+                        out.write( _infoBlock( sourcePickler or '', compressor, clevel, shuffle, 
+                                               rawSize, info.get( 'content_type' ) ) )
+                    _writeFrameHeader( out, chunksize )
+                    writer = _BloscChunkWriter( out, chunksize, compressor, clevel, shuffle )
+                    rawSize = 0
+                    for data in iter( partial( reader.read, chunksize ), b'' ):
+                        rawSize += writer.write( data )
+                    writer.close()
+                    _recordRawSize( out, 0 if _selfDescribing else None, rawSize )
+                else:
+                    fh.seek( 0 )
+                    pyObject = load( fh, pickler=sourcePickler )
+                    settings = dict( pickler=options['pickler'] or sourcePickler, compressor=compressor, 
+                                     clevel=clevel, shuffle=shuffle, content_type=info.get( 'content_type' ) )
+                    if blockLength:
+                        # Sequence blocks are only written by dumps()
+                        out.write( dumps( pyObject, chunked_sequence=blockLength, **settings ) )
+                    else:
+                        # Typed storage is off by default, so files that used it turn it on
+                        typedMinLength = None
+                        if flags & _FLAG_TYPED:
+                            typedMinLength = _typedMinLength or _defaultTypedMinLength
+                        dump( pyObject, out, chunksize=chunksize, out_of_band=bool( 
+                              options['pickler'] is None and flags & _FLAG_OUT_OF_BAND ), 
+                              typed_min_length=typedMinLength, **settings )
+                    rawSize = info.get( 'raw_size' ) or 0
+        return {'path': path, 'dest': dest, 'error': None, 'in_size': inSize, 
+                'out_size': os.path.getsize( dest ), 'raw_size': rawSize}
+    except Exception as err:
+        return _failure( path, err )
+
+def _benchFile( task ):
+    """
+    Time every candidate (cname, clevel, shuffle) on up to options['sample'] 
+    serialized bytes from the start of one file.
+    """
+    path, dest, options = task
+    try:
+        inSize = os.path.getsize( path )
+        with io.open( path, 'rb' ) as fh:
+            info, flags, chunksize, header = _readHeaders( fh )
+            if not (flags or 0) & _FLAGS_MULTIPART:
+                sample = _serializedReader( fh, flags, chunksize, header ).read( options['sample'] )
+            else:
+                fh.seek( 0 )
+                pickler = _dispatchPickler( info or None, options['source_pickler'] )
+                sample = _serialize( load( fh, pickler=pickler ), pickler )[:options['sample']]
+        timings = []
+        with memoryview( sample ) as view:
+            pieces = [ view[offset:offset+options['chunksize']] 
+                       for offset in range( 0, len(view), options['chunksize'] ) ]
+            for cname, clevel, shuffle in options['candidates']:
+                t0 = perf_counter()
+                compressed = [ blosc.compress( piece, typesize=1, clevel=clevel, shuffle=shuffle, 
+                                               cname=cname ) for piece in pieces ]
+                t1 = perf_counter()
+                for piece in compressed:
+                    blosc.decompress( piece )
+                timings.append( (sum( map( len, compressed ) ), t1 - t0, perf_counter() - t1) )
+            del pieces
+        return {'path': path, 'error': None, 'in_size': inSize, 'out_size': 0, 
+                'raw_size': len(sample), 'timings': timings}
+    except Exception as err:
+        return _failure( path, err )
+
+def _formatSize( nbytes ):
+    if nbytes < 2**20:
+        return '{:.1f} kB'.format( nbytes / 2**10 )
+    return '{:.2f} MB'.format( nbytes / 2**20 )
+
+def main( argv=None ):
+    """
+    Entry point of 'python -m bloscpickle'.  Returns the exit status, which 
+    is 1 if any file could not be processed.
+    
+      inspect: print the headers of every file.
+      recompress: rewrite every file with new blosc settings.
+      convert: rewrite every file with another pickler.
+      bench: time candidate blosc settings on samples of the files.
+      
+    Directories are walked for files matching --pattern, which are handed out 
+    to --jobs processes.  Files are replaced atomically, or written under 
+    --output with the same relative paths.  Settings that are not given 
+    keep the ones in each file's header.
+    """
+    import argparse
+    parser = argparse.ArgumentParser( prog='python -m bloscpickle', 
+            description="Inspect, recompress, convert and benchmark bloscpickle files" )
+    commands = parser.add_subparsers( dest='command' )
+    commands.required = True
+    
+    def addCommand( name, help ):
+        command = commands.add_parser( name, help=help )
+        command.add_argument( 'paths', nargs='+', help="files, or directories to walk" )
+        command.add_argument( '--pattern', default='*', help="file name pattern in directories" )
+        command.add_argument( '-j', '--jobs', type=int, default=os.cpu_count() or 1 )
+        command.add_argument( '-q', '--quiet', action='store_true', help="print the summary only" )
+        return command
+    
+    def addSettings( command ):
+        command.add_argument( '--compressor', choices=list(blosc.cnames) + [_AUTO] )
+        command.add_argument( '--clevel', type=int, choices=range(10) )
+        command.add_argument( '--shuffle', choices=sorted( _shuffleNames.values() ) )
+        command.add_argument( '--chunksize', type=int, 
+                              help="uncompressed bytes per blosc chunk; chunked sequences keep their blocks" )
+        command.add_argument( '--output', help="directory for the results instead of replacing the files" )
+        command.add_argument( '--from-pickler', choices=available_picklers(), 
+                              help="pickler of files written without a self-describing header" )
+    
+    inspectCommand = addCommand( 'inspect', "print the headers of bloscpickle files" )
+    inspectCommand.add_argument( '--json', action='store_true', help="one JSON object per file" )
+    addSettings( addCommand( 'recompress', "rewrite files with new blosc settings" ) )
+    convert = addCommand( 'convert', "rewrite files with another pickler" )
+    convert.add_argument( '--pickler', required=True, choices=available_picklers() )
+    addSettings( convert )
+    bench = addCommand( 'bench', "time blosc settings on samples of the files" )
+    bench.add_argument( '--codecs', nargs='+', default=['blosclz', 'lz4', 'zstd'], choices=blosc.cnames )
+    bench.add_argument( '--clevels', nargs='+', type=int, default=[1, 5, 9] )
+    bench.add_argument( '--shuffles', nargs='+', default=['noshuffle'], choices=sorted( _shuffleNames.values() ) )
+    bench.add_argument( '--sample', type=int, default=16, help="MB of serialized bytes read per file" )
+    bench.add_argument( '--chunksize', type=int, default=_defaultChunksize )
+    bench.add_argument( '--from-pickler', choices=available_picklers(), 
+                        help="pickler of files written without a self-describing header" )
+    args = parser.parse_args( argv )
+    
+    shuffles = { name: value for value, name in _shuffleNames.items() }
+    options = {'source_pickler': getattr( args, 'from_pickler', None ), 
+               'pickler': getattr( args, 'pickler', None )}
+    if args.command == 'bench':
+        options.update( sample=args.sample * 2**20, chunksize=args.chunksize, candidates=[ 
+                (cname, clevel, shuffles[shuffle]) for cname in args.codecs 
+                for clevel in args.clevels for shuffle in args.shuffles ] )
+        function = _benchFile
+    elif args.command == 'inspect':
+        function = _inspectFile
+    else:
+        options.update( compressor=args.compressor, clevel=args.clevel, chunksize=args.chunksize, 
+                        shuffle=None if args.shuffle is None else shuffles[args.shuffle] )
+        function = _recodeFile
+    output = getattr( args, 'output', None )
+    tasks = ( (path, path if output is None else os.path.join( output, os.path.relpath( path, root ) ), 
+               options) for path, root in _walkFiles( args.paths, args.pattern ) )
+    
+    t0 = perf_counter()
+    nfiles = nfailed = inSize = outSize = rawSize = 0
+    benchTotals = None
+    for result in _runParallel( function, tasks, args.jobs ):
+        nfiles += 1
+        if result['error'] is not None:
+            nfailed += 1
+            print( "{}: {}".format( result['path'], result['error'] ), file=sys.stderr )
+            continue
+        inSize += result['in_size']
+        outSize += result['out_size']
+        rawSize += result['raw_size'] or 0
+        if args.command == 'bench':
+            timings = result['timings']
+            benchTotals = timings if benchTotals is None else [ tuple( map( sum, zip( total, timing ) ) ) 
+                    for total, timing in zip( benchTotals, timings ) ]
+        elif args.quiet:
+            continue
+        elif args.command == 'inspect':
+            if args.json:
+                print( json.dumps( {key: value for key, value in result.items() 
+                                    if key not in ('error', 'in_size', 'out_size')} ) )
+            else:
+                print( "{path}: {format} {pickler} {compressor}/{clevel}/{shuffle}, {raw} raw, {size}".format( 
+                        raw='?' if result['raw_size'] is None else _formatSize( result['raw_size'] ), 
+                        size=_formatSize( result['compressed_size'] ), 
+                        **dict( result, shuffle=_shuffleNames.get( result['shuffle'] ) ) ) )
+        else:
+            print( "{} -> {}: {} -> {}".format( result['path'], result['dest'], 
+                    _formatSize( result['in_size'] ), _formatSize( result['out_size'] ) ) )
+    elapsed = perf_counter() - t0
+    
+    if benchTotals is not None:
+        for (cname, clevel, shuffle), (csize, ctime, dtime) in zip( options['candidates'], benchTotals ):
+            print( "{}/{}/{}:: ratio {:.2f}, compress {:.1f} MB/s, decompress {:.1f} MB/s".format( 
+                    cname, clevel, _shuffleNames[shuffle], rawSize / max( csize, 1 ), 
+                    rawSize / 2**20 / max( ctime, 1e-9 ), rawSize / 2**20 / max( dtime, 1e-9 ) ) )
+    summary = "{} files, {} failed, in {:.2f} s: {} read at {:.1f} MB/s".format( 
+            nfiles, nfailed, elapsed, _formatSize( inSize ), inSize / 2**20 / max( elapsed, 1e-9 ) )
+    if args.command in ('recompress', 'convert'):
+        summary += ", {} written ({:+.1f}%)".format( _formatSize( outSize ), 
+                                                     100.0 * (outSize - inSize) / max( inSize, 1 ) )
+    print( summary )
+    return 1 if nfailed else 0
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -1,350 +1,593 @@
-# coding=UTF-8
-"""
-Created on Wed Dec 28 11:47:37 2016
-
-@author: Robert A. McLeod
-"""
-
-import bloscpickle
-import json
-import ujson
-import rapidjson
-import pickle
-import marshal 
-import msgpack
-
-import os, os.path
-import uuid
-from time import time
-MB = 2**20
-
-from itertools import count; COUNTER = count()
-import matplotlib.pyplot as plt
-import numpy as np
-
-####### MODULE TESTS #######
-#from memory_profiler import profile
-#@profile
-def testUUID():
-    """
-    UUIDs are more or less random ascii codes, so they represent a difficult 
-    target for data compression.
-    """
-    write = {}
-    read = {}
-    sizes = {}
-    testDict = {}
-    testDict['name'] = "Foo"
-    testDict['id'] = next(COUNTER)
-    testDict['uuCount'] = 2**18
-    testDict['uuids'] = [str(uuid.uuid4()) for I in range( testDict['uuCount'] )]
-
-    def execTest( testDict, pickler, useBlosc=False, 
-                 compressor='zstd', clevel=1, shuffle=0, **pickler_kwargs ):
-        
-        if useBlosc:
-            picklerName = 'blosc_{}{}_'.format(compressor,clevel) + pickler.__name__
-            filename = "testfile." + picklerName
-            
-            with open( filename, 'wb' ) as stream:
-                t0 = time()
-                bloscpickle.dump(testDict, stream, pickler= pickler, 
-                                 compressor=compressor, clevel=clevel, shuffle=shuffle, **pickler_kwargs )
-                write[picklerName] = time() - t0
-            with open( filename, 'rb' ) as stream:
-                t1 = time()
-                outDict = bloscpickle.load( stream, pickler=pickler )
-                read[picklerName] = time() - t1
-            if pickler is msgpack:
-                print( "WARNING: {} failed in/out assert test".format(picklerName) )
-            else:
-                assert( testDict == outDict )
-        else:
-            picklerName = pickler.__name__
-            filename = "testfile." + picklerName
-            
-            if pickler in (pickle,marshal,msgpack):
-                with open( filename, 'wb' ) as stream:
-                    t0 = time()
-                    pickler.dump( testDict, stream, **pickler_kwargs )
-                    write[picklerName] = time() - t0  
-                
-                with open( filename, 'rb' ) as stream:
-                    t1 = time()
-                    outDict = pickler.load( stream )
-                    read[picklerName] = time() - t1
-                try:
-                    assert( testDict == outDict )
-                except:
-                    print( "WARNING: {} failed in/out assert test".format(picklerName) )
-            else:
-                with open( filename, 'w' ) as stream:
-                    t0 = time()
-                    pickler.dump( testDict, stream, **pickler_kwargs )
-                    write[picklerName] = time() - t0  
-                
-                with open( filename, 'r' ) as stream:
-                    t1 = time()
-                    outDict = pickler.load( stream )
-                    read[picklerName] = time() - t1
-                try:
-                    assert( testDict == outDict )
-                except:
-                    print( "WARNING: {} failed in/out assert test".format(picklerName) )
-        
-        sizes[picklerName] = os.path.getsize( filename ) / MB
-        os.remove( filename )
-        print( "{}:: write {:.2e} s, read {:.2e} s, size: {:.3f} MB"\
-              .format( picklerName, write[picklerName], read[picklerName], sizes[picklerName] ) )
-        return write[picklerName], sizes[picklerName]
-    
-    
-    execTest( testDict, pickle )
-    execTest( testDict, pickle, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, pickle, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    execTest( testDict, marshal )
-    execTest( testDict, marshal, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, marshal, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    execTest( testDict, json, ensure_ascii=False )
-    execTest( testDict, json, useBlosc=True, compressor='zstd', clevel=1, ensure_ascii=False )
-    execTest( testDict, json, useBlosc=True, compressor='lz4', clevel=9, ensure_ascii=False )
-    
-    execTest( testDict, rapidjson )
-    execTest( testDict, rapidjson, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, rapidjson, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    execTest( testDict, ujson, ensure_ascii=False )
-    execTest( testDict, ujson, useBlosc=True, compressor='zstd', clevel=1, ensure_ascii=False )
-    execTest( testDict, ujson, useBlosc=True, compressor='lz4', clevel=9, ensure_ascii=False )
-    
-    execTest( testDict, msgpack, use_bin_type=False )
-    execTest( testDict, msgpack, useBlosc=True, compressor='zstd', clevel=1, use_bin_type=False )
-    execTest( testDict, msgpack, useBlosc=True, compressor='lz4', clevel=9, use_bin_type=False )
-    
-    uncompressed_writes = [write['pickle'], write['marshal'], write['json'], 
-                          write['rapidjson'], write['ujson'], write['msgpack'] ]
-    zstd_writes =  [write['blosc_zstd1_pickle'],write['blosc_zstd1_marshal'], write['blosc_zstd1_json'],
-                    write['blosc_zstd1_rapidjson'], write['blosc_zstd1_ujson'], write['blosc_zstd1_msgpack'] ]
-    lz4_writes =  [write['blosc_lz49_pickle'],write['blosc_lz49_marshal'], write['blosc_lz49_json'],
-                    write['blosc_zstd1_rapidjson'], write['blosc_lz49_ujson'], write['blosc_lz49_msgpack'] ]
-
-
-    indices = np.arange(6)
-    bwidth = 0.25
-    fig, ax = plt.subplots( figsize=(10,8) )
-    bars_uncomp = ax.bar( indices, uncompressed_writes, bwidth, color='steelblue'  )
-    bars_zstd = ax.bar( indices+bwidth, zstd_writes, bwidth, color='orange'  )
-    bars_lz4 = ax.bar( indices+2*bwidth, lz4_writes, bwidth, color='purple'  )
-    ax.set_ylabel( "Serialization write to disk time (s)" )
-    ax.set_xticks( indices + 0.33 )
-    ax.set_xticklabels( ('pickle','marshal','json','rapidjson','ujson','msgpack') ) 
-    ax.legend( (bars_uncomp,bars_zstd,bars_lz4), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_uuid_writerate.png"  )
-    
-    uncompressed_reads = [read['pickle'], read['marshal'], read['json'], 
-                          read['rapidjson'], read['ujson'], read['msgpack'] ]
-    zstd_reads =  [read['blosc_zstd1_pickle'],read['blosc_zstd1_marshal'], read['blosc_zstd1_json'],
-                   read['blosc_zstd1_rapidjson'], read['blosc_zstd1_ujson'], read['blosc_zstd1_msgpack'] ]
-    lz4_reads =  [read['blosc_lz49_pickle'],read['blosc_lz49_marshal'], read['blosc_lz49_json'],
-                  read['blosc_lz49_rapidjson'], read['blosc_lz49_ujson'], read['blosc_lz49_msgpack'] ]
-
-    fig, ax = plt.subplots( figsize=(10,8) )
-    bars_uncomp = ax.bar( indices, uncompressed_reads, bwidth, color='steelblue'  )
-    bars_zstd = ax.bar( indices+bwidth, zstd_reads, bwidth, color='orange'  )
-    bars_lz4 = ax.bar( indices+2*bwidth, lz4_reads, bwidth, color='purple'  )
-    ax.set_ylabel( "Serialization read from disk time (s)" )
-    #ax.set_title( "German dictionary with 326980 words" )
-    ax.set_xticks( indices + 0.33 )
-    ax.set_xticklabels( ('pickle','marshal','json', 'rapidjson', 'ujson','msgpack') ) 
-    ax.legend( (bars_uncomp,bars_zstd,bars_lz4), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_uuid_readrate.png"  )
-    
-    
-    
-    uncompressed_sizes = [sizes['pickle'], sizes['marshal'], sizes['json'], 
-                          sizes['rapidjson'], sizes['ujson'], sizes['msgpack'] ]
-    zstd_sizes =  [sizes['blosc_zstd1_pickle'],sizes['blosc_zstd1_marshal'], sizes['blosc_zstd1_json'],
-                    sizes['blosc_zstd1_rapidjson'], sizes['blosc_zstd1_ujson'], sizes['blosc_zstd1_msgpack'] ]
-    lz4_sizes =  [sizes['blosc_lz49_pickle'],sizes['blosc_lz49_marshal'], sizes['blosc_lz49_json'],
-                    sizes['blosc_lz49_rapidjson'], sizes['blosc_lz49_ujson'], sizes['blosc_lz49_msgpack'] ]
-
-    fig2, ax2 = plt.subplots( figsize=(10,8) )
-    bars_uncomp2 = ax2.bar( indices, uncompressed_sizes, bwidth, color='steelblue'  )
-    bars_zstd2 = ax2.bar( indices+bwidth, zstd_sizes, bwidth, color='orange'  )
-    bars_lz42 = ax2.bar( indices+2*bwidth, lz4_sizes, bwidth, color='purple'  )
-    ax2.set_ylabel( "Disk usage (MB)" )
-    ax2.set_xticks( indices + 0.33 )
-    ax2.set_xticklabels( ('pickle','marshal','json','rapidjson','ujson','msgpack') ) 
-    ax2.legend( (bars_uncomp2,bars_zstd2,bars_lz42), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_uuid_disksize.png"  )
-    
-def testJSON():
-    """
-    Compressing structured text dictionaries is a test case where we expect 
-    compression to have a big impact.
-    
-    This requires a 'sample.json' file which is not included in the distribution.
-    I recommend the following tool for generating sample JSON data:
-        
-        http://www.json-generator.com/
-        
-    It can be trivally modified to generate 10'000 entries.
-    """
-    write = {}
-    read = {}
-    sizes = {}
-    with open( "sample.json", 'r' ) as jh:
-        testDict = ujson.load( jh )
-        
-    def execTest( testDict, pickler, useBlosc=False, 
-                 compressor='zstd', clevel=1, shuffle=0, **pickler_kwargs ):
-        
-        if useBlosc:
-            picklerName = 'blosc_{}{}_'.format(compressor,clevel) + pickler.__name__
-            filename = "testfile." + picklerName
-            
-            with open( filename, 'wb' ) as stream:
-                t0 = time()
-                bloscpickle.dump(testDict, stream, pickler= pickler, 
-                                 compressor=compressor, clevel=clevel, shuffle=shuffle, **pickler_kwargs )
-                write[picklerName] = time() - t0
-            with open( filename, 'rb' ) as stream:
-                t1 = time()
-                outDict = bloscpickle.load( stream, pickler=pickler )
-                read[picklerName] = time() - t1
-            try:
-                assert( testDict == outDict )
-            except AssertionError:
-                print( "WARNING: {} failed in/out assert test".format(picklerName) )
-        else:
-            picklerName = pickler.__name__
-            filename = "testfile." + picklerName
-            
-            if pickler in (pickle,marshal,msgpack):
-                with open( filename, 'wb' ) as stream:
-                    t0 = time()
-                    pickler.dump( testDict, stream, **pickler_kwargs )
-                    write[picklerName] = time() - t0  
-                
-                with open( filename, 'rb' ) as stream:
-                    t1 = time()
-                    outDict = pickler.load( stream )
-                    read[picklerName] = time() - t1
-                try:
-                    assert( testDict == outDict )
-                except AssertionError:
-                    print( "WARNING: {} failed in/out assert test".format(picklerName) )
-            else:
-                with open( filename, 'w' ) as stream:
-                    t0 = time()
-                    pickler.dump( testDict, stream, **pickler_kwargs )
-                    write[picklerName] = time() - t0  
-                
-                with open( filename, 'r' ) as stream:
-                    t1 = time()
-                    outDict = pickler.load( stream )
-                    read[picklerName] = time() - t1
-                try:
-                    assert( testDict == outDict )
-                except AssertionError:
-                    print( "WARNING: {} failed in/out assert test".format(picklerName) )
-        
-        sizes[picklerName] = os.path.getsize( filename ) / MB
-        os.remove( filename )
-        print( "{}:: write {:.2e} s, read {:.2e} s, size: {:.3f} MB"\
-              .format( picklerName, write[picklerName], read[picklerName], sizes[picklerName] ) )
-        return outDict
-    
-    
-    execTest( testDict, pickle )
-    execTest( testDict, pickle, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, pickle, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    execTest( testDict, marshal )
-    execTest( testDict, marshal, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, marshal, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    execTest( testDict, json, ensure_ascii=False )
-    execTest( testDict, json, useBlosc=True, compressor='zstd', clevel=1, ensure_ascii=False )
-    execTest( testDict, json, useBlosc=True, compressor='lz4', clevel=9, ensure_ascii=False )
-    
-    execTest( testDict, rapidjson )
-    execTest( testDict, rapidjson, useBlosc=True, compressor='zstd', clevel=1 )
-    execTest( testDict, rapidjson, useBlosc=True, compressor='lz4', clevel=9 )
-    
-    # Testing here to try and find what broke on read/write for UltraJSON.
-    # Probably floating point precision
-    outDict = execTest( testDict, ujson, encode_html_chars=True )
-    execTest( testDict, ujson, useBlosc=True, compressor='zstd', clevel=1, encode_html_chars=True )
-    execTest( testDict, ujson, useBlosc=True, compressor='lz4', clevel=9, encode_html_chars=True )
-    
-    execTest( testDict, msgpack, use_bin_type=False )
-    execTest( testDict, msgpack, useBlosc=True, compressor='zstd', clevel=1, use_bin_type=False )
-    execTest( testDict, msgpack, useBlosc=True, compressor='lz4', clevel=9, use_bin_type=False )
-    
-    uncompressed_writes = [write['pickle'], write['marshal'], write['json'], 
-                          write['rapidjson'], write['ujson'], write['msgpack'] ]
-    zstd_writes =  [write['blosc_zstd1_pickle'],write['blosc_zstd1_marshal'], write['blosc_zstd1_json'],
-                    write['blosc_zstd1_rapidjson'], write['blosc_zstd1_ujson'], write['blosc_zstd1_msgpack'] ]
-    lz4_writes =  [write['blosc_lz49_pickle'],write['blosc_lz49_marshal'], write['blosc_lz49_json'],
-                    write['blosc_zstd1_rapidjson'], write['blosc_lz49_ujson'], write['blosc_lz49_msgpack'] ]
-
-
-    indices = np.arange(6)
-    bwidth = 0.25
-    fig, ax = plt.subplots( figsize=(10,8) )
-    bars_uncomp = ax.bar( indices, uncompressed_writes, bwidth, color='steelblue'  )
-    bars_zstd = ax.bar( indices+bwidth, zstd_writes, bwidth, color='orange'  )
-    bars_lz4 = ax.bar( indices+2*bwidth, lz4_writes, bwidth, color='purple'  )
-    ax.set_ylabel( "Serialization write to disk time (s)" )
-    ax.set_xticks( indices + 0.33 )
-    ax.set_xticklabels( ('pickle','marshal','json', 'rapidjson', 'ujson','msgpack') ) 
-    ax.legend( (bars_uncomp,bars_zstd,bars_lz4), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_jsongen_writerate.png"  )
-    
-    uncompressed_reads = [read['pickle'], read['marshal'], read['json'], 
-                          read['rapidjson'], read['ujson'], read['msgpack'] ]
-    zstd_reads =  [read['blosc_zstd1_pickle'],read['blosc_zstd1_marshal'], read['blosc_zstd1_json'],
-                   read['blosc_zstd1_rapidjson'], read['blosc_zstd1_ujson'], read['blosc_zstd1_msgpack'] ]
-    lz4_reads =  [read['blosc_lz49_pickle'],read['blosc_lz49_marshal'], read['blosc_lz49_json'],
-                  read['blosc_lz49_rapidjson'], read['blosc_lz49_ujson'], read['blosc_lz49_msgpack'] ]
-
-    fig, ax = plt.subplots( figsize=(10,8) )
-    bars_uncomp = ax.bar( indices, uncompressed_reads, bwidth, color='steelblue'  )
-    bars_zstd = ax.bar( indices+bwidth, zstd_reads, bwidth, color='orange'  )
-    bars_lz4 = ax.bar( indices+2*bwidth, lz4_reads, bwidth, color='purple'  )
-    ax.set_ylabel( "Serialization read from disk time (s)" )
-    #ax.set_title( "German dictionary with 326980 words" )
-    ax.set_xticks( indices + 0.33 )
-    ax.set_xticklabels( ('pickle','marshal','json', 'rapidjson', 'ujson','msgpack') ) 
-    ax.legend( (bars_uncomp,bars_zstd,bars_lz4), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_jsongen_readrate.png"  )
-    
-    
-    
-    uncompressed_sizes = [sizes['pickle'], sizes['marshal'], sizes['json'], 
-                          sizes['rapidjson'], sizes['ujson'], sizes['msgpack'] ]
-    zstd_sizes =  [sizes['blosc_zstd1_pickle'],sizes['blosc_zstd1_marshal'], sizes['blosc_zstd1_json'],
-                    sizes['blosc_zstd1_rapidjson'], sizes['blosc_zstd1_ujson'], sizes['blosc_zstd1_msgpack'] ]
-    lz4_sizes =  [sizes['blosc_lz49_pickle'],sizes['blosc_lz49_marshal'], sizes['blosc_lz49_json'],
-                    sizes['blosc_lz49_rapidjson'], sizes['blosc_lz49_ujson'], sizes['blosc_lz49_msgpack'] ]
-
-    fig2, ax2 = plt.subplots( figsize=(10,8) )
-    bars_uncomp2 = ax2.bar( indices, uncompressed_sizes, bwidth, color='steelblue'  )
-    bars_zstd2 = ax2.bar( indices+bwidth, zstd_sizes, bwidth, color='orange'  )
-    bars_lz42 = ax2.bar( indices+2*bwidth, lz4_sizes, bwidth, color='purple'  )
-    ax2.set_ylabel( "Disk usage (MB)" )
-    ax2.set_xticks( indices + 0.33 )
-    ax2.set_xticklabels( ('pickle','marshal','json','rapidjson','ujson','msgpack') ) 
-    ax2.legend( (bars_uncomp2,bars_zstd2,bars_lz42), ('uncompressed', 'zstd','lz4'), loc='best' )
-    plt.savefig( "bloscpickle_jsongen_disksize.png"  )
-    pass
-    
-if __name__ == "__main__":
-
-    testUUID()
-    testJSON()
-    
-        
+# coding=UTF-8
+"""
+Created on Wed Dec 28 11:47:37 2016
+
+@author: Robert A. McLeod
+
+Benchmark harness for bloscpickle.  Every dataset is generated from a fixed
+seed, so runs on different machines or revisions measure the same bytes.
+
+    python test.py run [--output results.json] [--quick] [--repeat 5] ...
+    python test.py compare baseline.json results.json [--threshold 0.10]
+    python test.py multiprocessing
+    python test.py cache
+    python test.py pipeline [--scale 16]
+    python test.py snapshots [--scale 16] [--changes 10]
+    python test.py import [--repeat 20]
+    python test.py json [--scale 4]
+    python test.py typed [--datasets records uuids] [--scale 4]
+    python test.py lazy [--scale 16] [--peeks 10]
+    python test.py channel [--datasets arrays records] [--messages 32]
+
+'run' times bloscpickle.dumps() and loads() for every combination of
+dataset, pickler, codec, clevel, shuffle and nthreads given on the command
+line, after a warm-up call, and writes the median timings as JSON.
+'compare' flags the combinations whose throughput or compression ratio got
+worse between two such files by more than the threshold.
+"""
+
+import bloscpickle
+import pickle
+
+import io
+import os, os.path
+import sys
+import json
+import uuid
+import random
+import socket
+import threading
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+import multiprocessing
+from time import perf_counter, strftime
+MB = 2**20
+
+import blosc
+import numpy as np
+
+####### SYNTHETIC DATASETS #######
+def makeUUIDs( scale, seed ):
+    """
+    UUIDs are more or less random ascii codes, so they represent a difficult
+    target for data compression.
+    """
+    rng = random.Random( seed )
+    return [ str(uuid.UUID(int=rng.getrandbits(128), version=4)) for I in range( 2**15 * scale ) ]
+
+def makeRecords( scale, seed ):
+    """
+    Lists of JSON-like records that share their keys, the typical shape of
+    exported database rows and REST payloads.
+    """
+    rng = random.Random( seed )
+    words = [ 'alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel' ]
+    records = []
+    for I in range( 2**12 * scale ):
+        records.append( { 'id': I,
+                          'guid': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                          'isActive': rng.random() < 0.5,
+                          'balance': round( rng.uniform(0, 10000), 2 ),
+                          'name': ' '.join( rng.choice(words) for J in range(2) ),
+                          'tags': [ rng.choice(words) for J in range( rng.randint(1, 5) ) ],
+                          'location': { 'latitude': rng.uniform(-90, 90),
+                                        'longitude': rng.uniform(-180, 180) } } )
+    return records
+
+def makeArrays( scale, seed ):
+    """
+    Smooth float64 and int32 arrays, which compress well once shuffled.
+    """
+    rng = np.random.RandomState( seed )
+    return { 'signal': np.cumsum( rng.normal( size=2**16 * scale ) ),
+             'counts': rng.poisson( 20, size=2**16 * scale ).astype(np.int32),
+             'image': rng.randint( 0, 16, size=(2**6 * scale, 2**9) ).astype(np.uint16) }
+
+def makeMixed( scale, seed ):
+    """
+    Records with embedded NumPy arrays, which only 'pickle' can serialize.
+    """
+    rng = np.random.RandomState( seed )
+    return { 'records': makeRecords( max(scale // 2, 1), seed ),
+             'features': rng.normal( size=(2**8 * scale, 32) ),
+             'labels': rng.randint( 0, 10, size=2**10 * scale ).tolist() }
+
+DATASETS = { 'uuids': makeUUIDs, 'records': makeRecords,
+             'arrays': makeArrays, 'mixed': makeMixed }
+SHUFFLES = { 'noshuffle': blosc.NOSHUFFLE, 'shuffle': blosc.SHUFFLE,
+             'bitshuffle': blosc.BITSHUFFLE }
+
+
+####### TIMING #######
+def timeCall( func, repeat ):
+    """
+    Call func once to warm up, then repeat times, returning the median
+    wall time and the last result.
+    """
+    result = func()
+    times = []
+    for I in range( repeat ):
+        t0 = perf_counter()
+        result = func()
+        times.append( perf_counter() - t0 )
+    return statistics.median( times ), result
+
+def sameData( expected, actual ):
+    """
+    True if actual equals expected, comparing NumPy arrays element-wise, 
+    including those nested in dicts, lists and tuples.
+    """
+    if isinstance( expected, np.ndarray ):
+        return isinstance( actual, np.ndarray ) and expected.dtype == actual.dtype \
+                and np.array_equal( expected, actual )
+    if isinstance( expected, dict ):
+        return isinstance( actual, dict ) and expected.keys() == actual.keys() \
+                and all( sameData( expected[key], actual[key] ) for key in expected )
+    if isinstance( expected, (list, tuple) ):
+        return type(actual) is type(expected) and len(actual) == len(expected) \
+                and all( map( sameData, expected, actual ) )
+    return type(actual) is type(expected) and expected == actual
+
+def peakMemory( func ):
+    """
+    Peak Python heap allocation in MB during one call of func.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / MB
+    finally:
+        tracemalloc.stop()
+
+def benchCombination( data, pickler, codec, clevel, shuffle, repeat, memory=True ):
+    dumpTime, bloscBytes = timeCall( lambda: bloscpickle.dumps( data, pickler=pickler,
+            compressor=codec, clevel=clevel, shuffle=shuffle ), repeat )
+    loadTime, out = timeCall( lambda: bloscpickle.loads( bloscBytes, pickler=pickler ), repeat )
+    roundTrip = sameData( data, out )
+    # Only pickle promises an exact copy; JSON turns tuples into lists
+    assert roundTrip or pickler != 'pickle', "pickle failed in/out assert test"
+    rawSize = bloscpickle.inspect( bloscBytes )['raw_size']
+    if rawSize is None:
+        # Only written without a self-describing header; count it as stored
+        rawSize = len(bloscBytes)
+    rawSize /= MB
+    result = { 'raw_MB': rawSize, 'round_trip': roundTrip,
+               'compressed_MB': len(bloscBytes) / MB,
+               'ratio': rawSize * MB / len(bloscBytes),
+               'dump_s': dumpTime, 'load_s': loadTime,
+               'dump_MBps': rawSize / dumpTime, 'load_MBps': rawSize / loadTime }
+    if memory:
+        result['peak_MB'] = peakMemory( lambda: bloscpickle.loads( bloscpickle.dumps( data,
+                pickler=pickler, compressor=codec, clevel=clevel, shuffle=shuffle ), pickler=pickler ) )
+    return result
+
+
+####### COMMANDS #######
+def runBenchmarks( args ):
+    results = []
+    for datasetName in args.datasets:
+        data = DATASETS[datasetName]( args.scale, args.seed )
+        for picklerName in args.picklers:
+            pickler = picklerName
+            for nthreads in args.nthreads:
+                bloscpickle.set_nthreads( nthreads )
+                for codec in args.codecs:
+                    for clevel in args.clevels:
+                        for shuffleName in args.shuffles:
+                            combination = { 'dataset': datasetName, 'pickler': picklerName,
+                                            'codec': codec, 'clevel': clevel,
+                                            'shuffle': shuffleName, 'nthreads': nthreads }
+                            try:
+                                combination.update( benchCombination( data, pickler, codec, clevel,
+                                        SHUFFLES[shuffleName], args.repeat, not args.no_memory ) )
+                            except (TypeError, ValueError, OverflowError) as e:
+                                # e.g. NumPy arrays inside JSON
+                                combination['error'] = "{}: {}".format( type(e).__name__, e )
+                            results.append( combination )
+                            if 'error' in combination:
+                                print( "{dataset}/{pickler}/{codec}{clevel}/{shuffle}/{nthreads}t:: "
+                                       "skipped, {error}".format( **combination ) )
+                                continue
+                            if not combination['round_trip']:
+                                print( "WARNING: {dataset}/{pickler} failed in/out assert test".format( 
+                                        **combination ) )
+                            print( "{dataset}/{pickler}/{codec}{clevel}/{shuffle}/{nthreads}t:: "
+                                   "dump {dump_MBps:.1f} MB/s, load {load_MBps:.1f} MB/s, "
+                                   "ratio {ratio:.2f}".format( **combination ) )
+    bloscpickle.set_nthreads( 1 )
+
+    report = { 'meta': { 'date': strftime( '%Y-%m-%dT%H:%M:%S' ),
+                         'python': platform.python_version(),
+                         'platform': platform.platform(),
+                         'cpu_count': os.cpu_count(),
+                         'blosc': blosc.__version__,
+                         'numpy': np.__version__,
+                         'bloscpickle': bloscpickle.__version__,
+                         'scale': args.scale, 'seed': args.seed, 'repeat': args.repeat },
+               'results': results }
+    with open( args.output, 'w' ) as fh:
+        json.dump( report, fh, indent=1 )
+    print( "Wrote {} results to {}".format( len(results), args.output ) )
+
+def _resultKey( result ):
+    return ( result['dataset'], result['pickler'], result['codec'],
+             result['clevel'], result['shuffle'], result['nthreads'] )
+
+def compareBenchmarks( args ):
+    """
+    Compare two 'run' outputs.  Returns the number of regressions, i.e.
+    combinations whose throughput or ratio dropped by more than threshold.
+    """
+    with open( args.baseline ) as fh:
+        baseline = { _resultKey(result): result for result in json.load( fh )['results'] }
+    with open( args.results ) as fh:
+        current = json.load( fh )['results']
+    regressions = 0
+    for result in current:
+        old = baseline.get( _resultKey(result) )
+        if old is None or 'error' in old or 'error' in result:
+            continue
+        changes = []
+        for metric in ('dump_MBps', 'load_MBps', 'ratio'):
+            change = result[metric] / old[metric] - 1.0
+            if change < -args.threshold:
+                changes.append( "{} {:+.1%}".format( metric, change ) )
+        if changes:
+            regressions += 1
+            print( "REGRESSION {}:: {}".format( '/'.join( str(part) for part in _resultKey(result) ),
+                                                ', '.join(changes) ) )
+    print( "{} of {} combinations regressed by more than {:.0%}".format(
+            regressions, len(current), args.threshold ) )
+    return regressions
+
+
+def _mpDictResult( seed ):
+    return { 'id': seed, 'uuids': [str(uuid.uuid4()) for I in range( 2**15 )],
+             'values': list(range( seed, seed + 2**17 )) }
+
+def _mpArrayResult( seed ):
+    return np.cumsum( np.random.RandomState(seed).normal( size=(2**10, 2**9) ), axis=0 )
+
+def benchMultiprocessing( args=None ):
+    """
+    Large results returned from Pool workers are pickled over a pipe.  This
+    compares the throughput of Pool.map() with the standard ForkingPickler
+    and with bloscpickle.install_multiprocessing().
+    """
+    nTasks = 32
+    for resultFunc in (_mpDictResult, _mpArrayResult):
+        resultSize = len( pickle.dumps( resultFunc(0), protocol=pickle.HIGHEST_PROTOCOL ) ) / MB
+        for useBlosc in (False, True):
+            if useBlosc:
+                bloscpickle.install_multiprocessing()
+            else:
+                bloscpickle.uninstall_multiprocessing()
+            # The initializer installs the same pickler in spawned workers
+            initializer = bloscpickle.install_multiprocessing if useBlosc else None
+            with multiprocessing.Pool( 4, initializer=initializer ) as pool:
+                pool.map( resultFunc, range(4) ) # warm-up
+                t0 = perf_counter()
+                pool.map( resultFunc, range(nTasks) )
+                mpTime = perf_counter() - t0
+            print( "{}, blosc={}:: {} results of {:.2f} MB in {:.2e} s, {:.1f} MB/s"\
+                  .format( resultFunc.__name__, useBlosc, nTasks, resultSize,
+                          mpTime, nTasks * resultSize / mpTime ) )
+    bloscpickle.uninstall_multiprocessing()
+
+def benchLoadsCache( args=None ):
+    """
+    Services often load the same few blobs (config snapshots, model
+    metadata) over and over.  This compares the latency of repeated
+    bloscpickle.loads() calls with and without a LoadsCache.
+    """
+    nBlobs = 16
+    nLoads = 2**12
+    blobs = []
+    for I in range( nBlobs ):
+        snapshot = { 'version': I,
+                    'settings': { 'key{}'.format(J): str(uuid.uuid4()) for J in range(2**10) },
+                    'weights': [float(J) / (I+1) for J in range(2**12)] }
+        blobs.append( bloscpickle.dumps( snapshot ) )
+
+    t0 = perf_counter()
+    for I in range( nLoads ):
+        bloscpickle.loads( blobs[I % nBlobs] )
+    uncachedTime = perf_counter() - t0
+
+    cache = bloscpickle.LoadsCache()
+    t1 = perf_counter()
+    for I in range( nLoads ):
+        cache.loads( blobs[I % nBlobs] )
+    cachedTime = perf_counter() - t1
+
+    print( "loads:: {:.2e} s per call".format( uncachedTime / nLoads ) )
+    print( "LoadsCache.loads:: {:.2e} s per call, {}".format( cachedTime / nLoads, cache.stats() ) )
+
+
+def benchPipeline( args ):
+    """
+    dump() of a large nested object to a file, with the serialize, compress 
+    and write stages run one after another and with pipelined=True.
+    """
+    data = makeRecords( args.scale, args.seed )
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join( tmpDir, 'pipeline.bpk' )
+        def dumpFile( pipelined ):
+            with open( path, 'wb' ) as fh:
+                bloscpickle.dump( data, fh, pipelined=pipelined )
+        stats = bloscpickle.BloscStats()
+        bloscpickle.add_hook( stats )
+        try:
+            serialTime, _ = timeCall( lambda: dumpFile( False ), args.repeat )
+            stats.reset()
+            dumpFile( False )
+            phases = stats.snapshot()['dump']
+            pipelinedTime, _ = timeCall( lambda: dumpFile( True ), args.repeat )
+        finally:
+            bloscpickle.remove_hook( stats )
+        rawSize = phases['raw_size'] / MB
+    print( "stages:: serialize {:.3f} s, compress {:.3f} s, write {:.3f} s".format(
+            phases['serialize_time'], phases['compress_time'], phases['io_time'] ) )
+    print( "dump:: {:.3f} s ({:.1f} MB/s), pipelined {:.3f} s ({:.1f} MB/s), {} workers".format(
+            serialTime, rawSize / serialTime, pipelinedTime, rawSize / pipelinedTime, 
+            bloscpickle._defaultWorkers ) )
+
+
+def benchSnapshots( args ):
+    """
+    Successive checkpoints of a slowly changing state, written with dump() 
+    and saved to a BloscSnapshots store.  Reports the bytes written and the 
+    time per checkpoint.
+    """
+    rng = random.Random( args.seed )
+    state = makeRecords( args.scale, args.seed )
+    with tempfile.TemporaryDirectory() as tmpDir:
+        store = bloscpickle.BloscSnapshots( os.path.join( tmpDir, 'store' ) )
+        for I in range( args.repeat ):
+            for J in range( args.changes ):
+                state[rng.randrange( len(state) )]['balance'] = rng.uniform( 0, 10000 )
+            path = os.path.join( tmpDir, 'checkpoint.bpk' )
+            t0 = perf_counter()
+            with open( path, 'wb' ) as fh:
+                bloscpickle.dump( state, fh )
+            dumpTime = perf_counter() - t0
+            t1 = perf_counter()
+            saved = store.save( 'checkpoint{}'.format(I), state )
+            saveTime = perf_counter() - t1
+            print( "checkpoint {}:: dump {:.2f} MB in {:.3f} s, snapshot {:.2f} MB "
+                   "({}/{} new chunks) in {:.3f} s".format( I, os.path.getsize(path) / MB, dumpTime,
+                    saved['written_size'] / MB, saved['new_chunks'], saved['chunks'], saveTime ) )
+
+
+_importScript = """
+import sys, time
+t0 = time.perf_counter()
+import bloscpickle
+importTime = time.perf_counter() - t0
+print( importTime, ' '.join( name for name in {}
+                             if name in sys.modules ) )
+"""
+
+def benchImport( args ):
+    """
+    Short-lived worker processes pay for 'import bloscpickle' on every start.  
+    This times the import in fresh interpreters (after blosc itself has been 
+    imported, which bloscpickle cannot avoid) and lists which optional 
+    modules were pulled in with it.
+    """
+    optional = ['msgpack', 'rapidjson', 'ujson', 'asyncio', 'multiprocessing.connection', 
+                'multiprocessing.reduction', 'concurrent.futures', 'hashlib']
+    # Compile once so the timed runs read bytecode from __pycache__
+    moduleDir = os.path.dirname( os.path.abspath(bloscpickle.__file__) )
+    script = "import sys; sys.path.insert(0, {!r}); import blosc\n".format( moduleDir ) \
+            + _importScript.format( optional )
+    subprocess.run( [sys.executable, '-c', script], check=True, stdout=subprocess.DEVNULL )
+    times = []
+    for I in range( args.repeat ):
+        output = subprocess.run( [sys.executable, '-c', script], check=True,
+                                 stdout=subprocess.PIPE, universal_newlines=True ).stdout.split()
+        times.append( float(output[0]) )
+    print( "import bloscpickle:: median {:.1f} ms, min {:.1f} ms over {} runs".format(
+            1e3 * statistics.median(times), 1e3 * min(times), args.repeat ) )
+    print( "optional modules imported: {}".format( ', '.join( output[1:] ) or 'none' ) )
+
+
+def _textStreamDump( pyObject, module ):
+    # How text-native picklers used to be serialized, for comparison
+    bloscStream = io.BytesIO()
+    textStream = io.TextIOWrapper( bloscStream, encoding='utf-8' )
+    module.dump( pyObject, textStream )
+    textStream.flush()
+    textStream.detach()
+    return bloscStream.getbuffer()
+
+def benchJSON( args ):
+    """
+    dumps() and loads() of the records dataset with every installed JSON 
+    backend, in MB/s of JSON.  For the text-native ones, the serialization 
+    time through a text stream, as bloscpickle used to do it, is given for 
+    comparison with the dumps()-and-encode path used now.
+    """
+    data = makeRecords( args.scale, args.seed )
+    for name in bloscpickle.available_picklers():
+        if name not in ('json', 'ujson', 'rapidjson', 'orjson'):
+            continue
+        module = bloscpickle._loadPickler( name )
+        kind = bloscpickle._picklerKind( module )
+        rawSize = len( bloscpickle._serialize( data, module ) ) / MB
+        dumpsTime, bloscBytes = timeCall( lambda: bloscpickle.dumps( data, pickler=name ), args.repeat )
+        loadsTime, _ = timeCall( lambda: bloscpickle.loads( bloscBytes, pickler=name ), args.repeat )
+        line = "{}:: {} kind, dumps {:.1f} MB/s, loads {:.1f} MB/s".format( 
+                name, kind, rawSize / dumpsTime, rawSize / loadsTime )
+        if hasattr( module, 'dump' ):
+            serializeTime, _ = timeCall( lambda: bloscpickle._serialize( data, module ), args.repeat )
+            streamTime, _ = timeCall( lambda: _textStreamDump( data, module ), args.repeat )
+            line += ", serialize {:.1f} MB/s (text stream {:.1f} MB/s)".format( 
+                    rawSize / serializeTime, rawSize / streamTime )
+        print( line )
+
+
+def benchTyped( args ):
+    """
+    dumps() and loads() with long lists of scalars and records stored as 
+    typed arrays, after set_typed(), and serialized element by element.
+    """
+    for datasetName in args.datasets:
+        data = DATASETS[datasetName]( args.scale, args.seed )
+        for pickler in args.picklers:
+            for minLength in (None, 2**10):
+                bloscpickle.set_typed( minLength )
+                try:
+                    dumpsTime, bloscBytes = timeCall( lambda: bloscpickle.dumps( data, pickler=pickler ), 
+                                                      args.repeat )
+                    loadsTime, _ = timeCall( lambda: bloscpickle.loads( bloscBytes, pickler=pickler ), 
+                                             args.repeat )
+                except TypeError: # not serializable with this pickler
+                    break
+                finally:
+                    bloscpickle.set_typed( None )
+                print( "{}/{}/{}:: {:.3f} s dumps, {:.3f} s loads, {:.2f} MB".format( 
+                        datasetName, pickler, 'typed' if minLength else 'rows', 
+                        dumpsTime, loadsTime, len(bloscBytes) / MB ) )
+
+
+def benchLazy( args ):
+    """
+    Reading a few random records out of a large list, with loads() of the 
+    whole list and with loads_lazy() of a chunked_sequence dump.
+    """
+    data = makeRecords( args.scale, args.seed )
+    rng = random.Random( args.seed )
+    indices = [ rng.randrange( len(data) ) for I in range( args.peeks ) ]
+    bloscBytes = bloscpickle.dumps( data )
+    chunkedBytes = bloscpickle.dumps( data, chunked_sequence=args.block )
+    fullTime, _ = timeCall( lambda: [ bloscpickle.loads( bloscBytes )[I] for I in indices ], 
+                            args.repeat )
+    lazyTime, _ = timeCall( lambda: [ bloscpickle.loads_lazy( chunkedBytes )[I] for I in indices ], 
+                            args.repeat )
+    print( "loads:: {:.2e} s per record, {:.2f} MB".format( fullTime / args.peeks, len(bloscBytes) / MB ) )
+    print( "loads_lazy:: {:.2e} s per record, {:.2f} MB in blocks of {}".format( 
+            lazyTime / args.peeks, len(chunkedBytes) / MB, args.block ) )
+
+
+def benchChannel( args ):
+    """
+    Objects sent over a socketpair() by a BloscChannel that sends raw bytes, 
+    one that compresses at a fixed clevel and an adaptive one.
+    """
+    for datasetName in args.datasets:
+        data = DATASETS[datasetName]( args.scale, args.seed )
+        rawSize = len( pickle.dumps( data, protocol=pickle.HIGHEST_PROTOCOL ) )
+        for label, options in (('raw', {'clevel': 0, 'adaptive': False}), 
+                               ('fixed', {'adaptive': False}), ('adaptive', {})):
+            sendSocket, recvSocket = socket.socketpair()
+            with bloscpickle.BloscChannel( sendSocket, **options ) as sender, \
+                    bloscpickle.BloscChannel( recvSocket ) as receiver:
+                def sendAll():
+                    for I in range( args.messages ):
+                        sender.send( data )
+                thread = threading.Thread( target=sendAll )
+                t0 = perf_counter()
+                thread.start()
+                for I in range( args.messages ):
+                    receiver.recv()
+                elapsed = perf_counter() - t0
+                thread.join()
+            print( "{}/{}:: {:.1f} MB/s, final clevel {}".format( 
+                    datasetName, label, args.messages * rawSize / MB / elapsed, sender.clevel ) )
+
+
+def parseArgs( argv ):
+    # Settings of 'run' left unset come from runDefaults, or from quickDefaults 
+    # with --quick, so explicit options still apply with --quick
+    runDefaults = {'codecs': ['blosclz', 'lz4', 'zstd'], 'clevels': [1, 5, 9], 
+                   'shuffles': sorted(SHUFFLES), 'scale': 4, 'repeat': 5}
+    quickDefaults = {'codecs': ['lz4', 'zstd'], 'clevels': [1, 9], 
+                     'shuffles': ['shuffle'], 'scale': 1, 'repeat': 3}
+    parser = argparse.ArgumentParser( description="bloscpickle benchmarks" )
+    commands = parser.add_subparsers( dest='command' )
+    commands.required = True
+
+    run = commands.add_parser( 'run', help="time every combination of settings" )
+    run.add_argument( '--output', default='bloscpickle_bench.json' )
+    run.add_argument( '--datasets', nargs='+', default=sorted(DATASETS), choices=sorted(DATASETS) )
+    run.add_argument( '--picklers', nargs='+', default=bloscpickle.available_picklers(),
+                      choices=bloscpickle.available_picklers() )
+    run.add_argument( '--codecs', nargs='+', choices=blosc.cnames )
+    run.add_argument( '--clevels', nargs='+', type=int )
+    run.add_argument( '--shuffles', nargs='+', choices=sorted(SHUFFLES) )
+    run.add_argument( '--nthreads', nargs='+', type=int, default=sorted({1, os.cpu_count() or 1}) )
+    run.add_argument( '--scale', type=int, help="dataset size multiplier" )
+    run.add_argument( '--seed', type=int, default=0 )
+    run.add_argument( '--repeat', type=int )
+    run.add_argument( '--no-memory', action='store_true', help="skip the peak memory measurement" )
+    run.add_argument( '--quick', action='store_true',
+                      help="unless given: lz4 and zstd at clevel 1 and 9 with shuffle only, on a small scale" )
+    run.set_defaults( func=runBenchmarks )
+
+    compare = commands.add_parser( 'compare', help="flag regressions between two 'run' outputs" )
+    compare.add_argument( 'baseline' )
+    compare.add_argument( 'results' )
+    compare.add_argument( '--threshold', type=float, default=0.10 )
+    compare.set_defaults( func=compareBenchmarks )
+
+    commands.add_parser( 'multiprocessing', help="Pool.map() with and without compression"
+                        ).set_defaults( func=benchMultiprocessing )
+    commands.add_parser( 'cache', help="repeated loads() with and without LoadsCache"
+                        ).set_defaults( func=benchLoadsCache )
+    pipeline = commands.add_parser( 'pipeline', help="dump() with and without pipelined=True" )
+    pipeline.add_argument( '--scale', type=int, default=16 )
+    pipeline.add_argument( '--seed', type=int, default=0 )
+    pipeline.add_argument( '--repeat', type=int, default=3 )
+    pipeline.set_defaults( func=benchPipeline )
+    snapshots = commands.add_parser( 'snapshots', help="checkpoints with dump() and BloscSnapshots" )
+    snapshots.add_argument( '--scale', type=int, default=16 )
+    snapshots.add_argument( '--seed', type=int, default=0 )
+    snapshots.add_argument( '--repeat', type=int, default=4 )
+    snapshots.add_argument( '--changes', type=int, default=10, help="records changed per checkpoint" )
+    snapshots.set_defaults( func=benchSnapshots )
+    importTime = commands.add_parser( 'import', help="time 'import bloscpickle' in fresh interpreters" )
+    importTime.add_argument( '--repeat', type=int, default=20 )
+    importTime.set_defaults( func=benchImport )
+    jsonBench = commands.add_parser( 'json', help="throughput of the JSON picklers on records" )
+    jsonBench.add_argument( '--scale', type=int, default=4 )
+    jsonBench.add_argument( '--seed', type=int, default=0 )
+    jsonBench.add_argument( '--repeat', type=int, default=5 )
+    jsonBench.set_defaults( func=benchJSON )
+    typed = commands.add_parser( 'typed', help="typed arrays against element by element serialization" )
+    typed.add_argument( '--datasets', nargs='+', default=['records', 'uuids'], choices=sorted(DATASETS) )
+    typed.add_argument( '--picklers', nargs='+', default=['pickle', 'json'],
+                        choices=bloscpickle.available_picklers() )
+    typed.add_argument( '--scale', type=int, default=4 )
+    typed.add_argument( '--seed', type=int, default=0 )
+    typed.add_argument( '--repeat', type=int, default=5 )
+    typed.set_defaults( func=benchTyped )
+    lazy = commands.add_parser( 'lazy', help="peeking at records with loads() and loads_lazy()" )
+    lazy.add_argument( '--scale', type=int, default=16 )
+    lazy.add_argument( '--seed', type=int, default=0 )
+    lazy.add_argument( '--repeat', type=int, default=3 )
+    lazy.add_argument( '--peeks', type=int, default=10, help="records read per call" )
+    lazy.add_argument( '--block', type=int, default=1024, help="elements per block" )
+    lazy.set_defaults( func=benchLazy )
+    channel = commands.add_parser( 'channel', help="BloscChannel over a socketpair, raw, fixed and adaptive" )
+    channel.add_argument( '--datasets', nargs='+', default=['arrays', 'records'], choices=sorted(DATASETS) )
+    channel.add_argument( '--scale', type=int, default=1 )
+    channel.add_argument( '--seed', type=int, default=0 )
+    channel.add_argument( '--messages', type=int, default=32 )
+    channel.set_defaults( func=benchChannel )
+
+    args = parser.parse_args( argv )
+    if args.command == 'run':
+        for name, value in (quickDefaults if args.quick else runDefaults).items():
+            if getattr( args, name ) is None:
+                setattr( args, name, value )
+    return args
+
+if __name__ == "__main__":
+    args = parseArgs( sys.argv[1:] )
+    status = args.func( args )
+    sys.exit( 1 if args.command == 'compare' and status else 0 )
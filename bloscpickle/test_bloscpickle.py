@@ -0,0 +1,622 @@
+# coding=UTF-8
+"""
+Round-trip and behaviour tests for bloscpickle, run with pytest from this
+directory or the repository root:
+
+    python -m pytest -q bloscpickle
+
+test.py holds the benchmark harness; these tests only check results.
+"""
+
+import bloscpickle
+import pickle
+
+import io
+import os
+import json
+import socket
+import asyncio
+import threading
+
+import blosc
+import pytest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+needsNumpy = pytest.mark.skipif( np is None, reason="numpy is not installed" )
+
+
+def makeRecords( count ):
+    return [ {'id': I, 'name': 'name {}'.format(I % 17), 'score': I / 7.0,
+              'active': I % 3 == 0, 'tags': ['a', 'b'][:I % 3]} for I in range( count ) ]
+
+@pytest.fixture
+def typed():
+    """
+    Enable typed storage for one test only.
+    """
+    bloscpickle.set_typed()
+    try:
+        yield
+    finally:
+        bloscpickle.set_typed( None )
+
+
+####### FRAMING AND HEADERS #######
+@pytest.mark.parametrize( 'pickler', bloscpickle.available_picklers() )
+def test_dumps_round_trip( pickler ):
+    data = {'text': 'x' * 1000, 'numbers': list( range(500) ), 'nested': {'a': [1.5, None, True]}}
+    if pickler == 'marshal':
+        data['nested']['a'].append( b'bytes' )
+    assert bloscpickle.loads( bloscpickle.dumps( data, pickler=pickler ) ) == data
+
+def test_dump_is_chunked( tmp_path ):
+    data = [ (I, str(I)) for I in range( 50000 ) ]
+    path = str( tmp_path / 'data.bpk' )
+    with io.open( path, 'wb' ) as fh:
+        bloscpickle.dump( data, fh, chunksize=2**12 )
+    with io.open( path, 'rb' ) as fh:
+        assert bloscpickle.load( fh ) == data
+    info = bloscpickle.inspect( io.open( path, 'rb' ).read() )
+    assert info['format'] == 'framed'
+    assert info['raw_size'] == len( pickle.dumps( data, protocol=pickle.HIGHEST_PROTOCOL ) )
+    assert bloscpickle.load_path( path ) == data
+
+def test_several_dumps_on_one_stream():
+    stream = io.BytesIO()
+    for I in range( 3 ):
+        bloscpickle.dump( {'message': I}, stream, chunksize=2**10 )
+    stream.seek( 0 )
+    assert [ bloscpickle.load( stream ) for I in range( 3 ) ] == [ {'message': I} for I in range( 3 ) ]
+
+def test_header_selects_the_pickler():
+    bloscBytes = bloscpickle.dumps( {'a': [1, 2]}, pickler='json', content_type='application/json' )
+    info = bloscpickle.inspect( bloscBytes )
+    assert (info['pickler'], info['content_type']) == ('json', 'application/json')
+    # Neither loads() nor load() needs to be told the pickler
+    assert bloscpickle.loads( bloscBytes ) == {'a': [1, 2]}
+    assert bloscpickle.load( io.BytesIO( bloscBytes ) ) == {'a': [1, 2]}
+
+def test_headerless_blobs_still_load():
+    bloscpickle.set_self_describing( False )
+    try:
+        bloscBytes = bloscpickle.dumps( {'a': 1} )
+    finally:
+        bloscpickle.set_self_describing( True )
+    assert bloscpickle.inspect( bloscBytes )['format'] == 'blosc'
+    assert bloscpickle.loads( bloscBytes ) == {'a': 1}
+    legacy = blosc.compress( pickle.dumps( {'b': 2} ), typesize=1 )
+    assert bloscpickle.loads( legacy ) == {'b': 2}
+
+class TrickleStream(io.RawIOBase):
+    """
+    A stream whose every read returns at most one byte, as a slow pipe might.
+    """
+    def __init__( self, data ):
+        self._data = io.BytesIO( data )
+        
+    def readable( self ):
+        return True
+    
+    def readinto( self, buffer ):
+        chunk = self._data.read( min(1, len(buffer)) )
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+def test_headers_survive_short_reads():
+    data = {'pairs': [ (I, 'x' * (I % 7)) for I in range( 2000 ) ]}
+    bloscpickle.set_self_describing( False )
+    try:
+        stream = io.BytesIO()
+        bloscpickle.dump( data, stream, chunksize=2**12 )
+    finally:
+        bloscpickle.set_self_describing( True )
+    legacy = blosc.compress( pickle.dumps( data ), typesize=1 )
+    buffer = bytearray( 2**20 )
+    for bloscBytes in (stream.getvalue(), legacy):
+        assert bloscpickle.load( TrickleStream( bloscBytes ) ) == data
+        nbytes = bloscpickle.load_into( TrickleStream( bloscBytes ), buffer )
+        assert pickle.loads( memoryview(buffer)[:nbytes] ) == data
+        for cut in (3, 14):
+            with pytest.raises( EOFError ):
+                bloscpickle.load( io.BytesIO( bloscBytes[:cut] ) )
+            with pytest.raises( EOFError ):
+                bloscpickle.load_into( io.BytesIO( bloscBytes[:cut] ), buffer )
+
+@pytest.mark.parametrize( 'pickler', ['pickle', 'json'] )
+def test_described_headers_survive_short_reads( pickler ):
+    data = {'words': [ 'w{}'.format(I) for I in range( 3000 ) ]}
+    stream = io.BytesIO()
+    bloscpickle.dump( data, stream, pickler=pickler, chunksize=2**12 )
+    for bloscBytes in (stream.getvalue(), bloscpickle.dumps( data, pickler=pickler )):
+        assert bloscpickle.inspect( bloscBytes )['pickler'] == pickler
+        assert bloscpickle.load( TrickleStream( bloscBytes ) ) == data
+        with pytest.raises( EOFError ):
+            bloscpickle.load( io.BytesIO( bloscBytes[:30] ) )
+
+@pytest.mark.parametrize( 'garbage', [b'', b'BP', b'BPKI' + bytes(20), b'BPKF\x01',
+                                      b'hello world, not blosc at all', bytes(64)] )
+def test_inspect_rejects_garbage( garbage ):
+    with pytest.raises( ValueError ):
+        bloscpickle.inspect( garbage )
+
+def test_loads_into_and_load_into( tmp_path ):
+    data = {'pairs': [ (I, 'x' * (I % 7)) for I in range( 10000 ) ]}
+    bloscBytes = bloscpickle.dumps( data )
+    buffer = bytearray( 2**20 )
+    nbytes = bloscpickle.loads_into( bloscBytes, buffer )
+    assert pickle.loads( memoryview(buffer)[:nbytes] ) == data
+    with pytest.raises( ValueError ):
+        bloscpickle.loads_into( bloscBytes, bytearray( 16 ) )
+
+    stream = io.BytesIO()
+    bloscpickle.dump( data, stream, chunksize=2**12 )
+    stream.seek( 0 )
+    nbytes = bloscpickle.load_into( stream, buffer )
+    assert pickle.loads( memoryview(buffer)[:nbytes] ) == data
+
+def test_load_mmap( tmp_path ):
+    data = [ (I, 'row {}'.format(I)) for I in range( 5000 ) ]
+    path, target = str( tmp_path / 'data.bpk' ), str( tmp_path / 'data.raw' )
+    with io.open( path, 'wb' ) as fh:
+        bloscpickle.dump( data, fh, chunksize=2**12 )
+    nbytes = bloscpickle.load_mmap( path, target )
+    with io.open( target, 'rb' ) as fh:
+        assert pickle.loads( fh.read( nbytes ) ) == data
+
+def test_open_is_a_file( tmp_path ):
+    path = str( tmp_path / 'text.bpk' )
+    lines = [ 'line {}\n'.format(I) for I in range( 10000 ) ]
+    with bloscpickle.open( path, 'wt', chunksize=2**12 ) as fh:
+        fh.writelines( lines )
+    with bloscpickle.open( path, 'rt' ) as fh:
+        assert fh.readlines() == lines
+    with bloscpickle.open( path, 'rb' ) as fh:
+        fh.seek( sum( map( len, lines[:5000] ) ) )
+        assert fh.read( len(lines[5000]) ) == lines[5000].encode()
+
+def test_append_updates_the_header( tmp_path ):
+    path = str( tmp_path / 'data.bpk' )
+    with io.open( path, 'wb' ) as fh:
+        bloscpickle.dump( b'first ' * 2000, fh, chunksize=2**12 )
+    with bloscpickle.open( path, 'ab' ) as fh:
+        fh.write( b'second ' * 2000 )
+    with io.open( path, 'r+b' ) as raw:
+        with bloscpickle.open( raw, 'ab' ) as fh:
+            fh.write( b'third ' * 2000 )
+    with bloscpickle.open( path, 'rb' ) as fh:
+        rawSize = len( fh.read() )
+    with io.open( path, 'rb' ) as fh:
+        assert bloscpickle.inspect( fh.read() )['raw_size'] == rawSize
+
+def test_dumps_many_loads_many():
+    objects = [ {'index': I, 'payload': 'x' * I} for I in range( 50 ) ]
+    assert bloscpickle.loads_many( bloscpickle.dumps_many( objects ) ) == objects
+    assert list( bloscpickle.loads_many( bloscpickle.dumps_many( objects ), as_generator=True ) ) == objects
+
+def test_reusable_picklers():
+    objects = [ {'index': I, 'payload': 'x' * I} for I in range( 50 ) ]
+    packer = bloscpickle.BloscPickler( 'json', compressor='lz4', clevel=9 )
+    unpacker = bloscpickle.BloscUnpickler( 'json' )
+    assert unpacker.loads( packer.dumps( objects ) ) == objects
+    # The scratch buffers are reused by the next call
+    assert unpacker.loads( packer.dumps( objects[:10] ) ) == objects[:10]
+
+def test_auto_compressor():
+    data = {'text': 'abc' * 10000, 'noise': os.urandom( 2**12 )}
+    bloscBytes = bloscpickle.dumps( data, compressor='auto' )
+    assert bloscpickle.loads( bloscBytes ) == data
+
+def test_hooks_see_every_call():
+    stats = bloscpickle.BloscStats()
+    bloscpickle.add_hook( stats )
+    try:
+        bloscpickle.loads( bloscpickle.dumps( list( range(1000) ) ) )
+    finally:
+        bloscpickle.remove_hook( stats )
+    snapshot = stats.snapshot()
+    assert snapshot['dumps']['calls'] == 1 and snapshot['loads']['calls'] == 1
+
+def test_pipelined_dump():
+    data = [ 'row {}'.format(I) for I in range( 10**5 ) ]
+    stream = io.BytesIO()
+    bloscpickle.dump( data, stream, chunksize=2**12, pipelined=True )
+    stream.seek( 0 )
+    assert bloscpickle.load( stream ) == data
+
+
+####### NUMPY AND OUT-OF-BAND #######
+@needsNumpy
+def test_numpy_arrays_round_trip():
+    data = {'float': np.linspace( 0, 1, 10**5 ), 'int': np.arange( 10**5, dtype=np.int32 ).reshape( 100, -1 ),
+            'list': [np.zeros( 10 ), np.ones( (3, 3), dtype=np.uint8 )], 'empty': np.zeros( 0 )}
+    bloscBytes = bloscpickle.dumps( data )
+    info = bloscpickle.inspect( bloscBytes )
+    assert info['format'] == 'numpy'
+    assert info['raw_size'] == sum( array.nbytes for array in
+                                    (data['float'], data['int'], data['empty']) + tuple(data['list']) )
+    out = bloscpickle.loads( bloscBytes )
+    for key in ('float', 'int', 'empty'):
+        assert out[key].dtype == data[key].dtype and np.array_equal( out[key], data[key] )
+    assert all( map( np.array_equal, out['list'], data['list'] ) )
+
+@needsNumpy
+def test_out_of_band_round_trip():
+    data = {'array': np.arange( 10**5 ), 'bytes': bytearray( b'abc' * 1000 ), 'label': 'x'}
+    stream = io.BytesIO()
+    bloscpickle.dump( data, stream, out_of_band=True, chunksize=2**14 )
+    out = bloscpickle.loads( stream.getvalue() )
+    assert np.array_equal( out['array'], data['array'] )
+    assert out['bytes'] == data['bytes'] and out['label'] == 'x'
+    with pytest.raises( ValueError ):
+        bloscpickle.dumps( data, pickler=json, out_of_band=True )
+
+def test_array_tree_guards_cycles():
+    loop = []
+    loop.append( loop )
+    out = bloscpickle.loads( bloscpickle.dumps( loop ) )
+    assert out[0] is out
+    # Containers without a single array are not array trees
+    assert not bloscpickle._isArrayTree( {'a': [[], {}]} )
+
+
+####### TYPED STORAGE #######
+def test_typed_is_off_by_default():
+    bloscBytes = bloscpickle.dumps( makeRecords( 5000 ) )
+    assert bloscpickle.inspect( bloscBytes )['format'] != 'typed'
+    buffer = bytearray( 2**22 )
+    stream = io.BytesIO()
+    bloscpickle.dump( makeRecords( 5000 ), stream )
+    stream.seek( 0 )
+    assert bloscpickle.load_into( stream, buffer ) > 0
+
+@pytest.mark.parametrize( 'pickler', ['pickle', 'json', 'msgpack'] )
+def test_typed_round_trip( typed, pickler ):
+    if pickler not in bloscpickle.available_picklers():
+        pytest.skip( "{} is not installed".format(pickler) )
+    data = {'records': makeRecords( 5000 ), 'ints': list( range(-3000, 3000) ),
+            'floats': [ I / 3 for I in range(2000) ], 'strings': [ str(I) for I in range(2000) ],
+            'categories': [ 'abc'[I % 3] for I in range(2000) ], 'small': [1, 2]}
+    bloscBytes = bloscpickle.dumps( data, pickler=pickler )
+    assert bloscpickle.inspect( bloscBytes )['format'] == 'typed'
+    assert bloscpickle.loads( bloscBytes ) == data
+    stream = io.BytesIO()
+    bloscpickle.dump( data, stream, pickler=pickler, chunksize=2**12 )
+    assert bloscpickle.loads( stream.getvalue() ) == data
+
+def test_typed_self_referencing_records( typed ):
+    records = makeRecords( 2000 )
+    for record in records:
+        record['self'] = record
+    out = bloscpickle.loads( bloscpickle.dumps( {'records': records} ) )
+    assert all( record['self'] is record for record in out['records'] )
+    assert [ record['id'] for record in out['records'] ] == list( range(2000) )
+
+def test_typed_keeps_shared_references( typed ):
+    shared = {'unit': 'm'}
+    records = [ {'id': I, 'meta': shared} for I in range( 2000 ) ]
+    numbers = list( range(2000) )
+    out = bloscpickle.loads( bloscpickle.dumps( {'records': records, 'a': numbers, 'b': numbers,
+                                                 'other': [records[0]]} ) )
+    assert all( record['meta'] is out['records'][0]['meta'] for record in out['records'] )
+    assert out['a'] is out['b']
+    assert out['other'][0] is out['records'][0]
+
+def test_tuples_follow_the_pickler( typed ):
+    data = {'short': (1, 2), 'long': tuple( range(5000) )}
+    out = bloscpickle.loads( bloscpickle.dumps( data ) )
+    assert type(out['short']) is tuple and type(out['long']) is tuple
+    out = bloscpickle.loads( bloscpickle.dumps( data, pickler='json' ) )
+    assert type(out['short']) is list and type(out['long']) is list
+
+
+####### CHUNKED SEQUENCES #######
+@pytest.mark.parametrize( 'pickler', ['pickle', 'json'] )
+def test_sequence_round_trip_and_lazy( pickler ):
+    data = makeRecords( 5000 )
+    bloscBytes = bloscpickle.dumps( data, pickler=pickler, chunked_sequence=128 )
+    info = bloscpickle.inspect( bloscBytes )
+    assert info['format'] == 'sequence' and info['raw_size'] > 0
+    assert bloscpickle.loads( bloscBytes ) == data
+    lazy = bloscpickle.loads_lazy( bloscBytes )
+    assert len(lazy) == len(data)
+    assert lazy[4999] == data[4999] and lazy[-1] == data[-1]
+    assert lazy[100:300:7] == data[100:300:7]
+    with pytest.raises( IndexError ):
+        lazy[5000]
+    with pytest.raises( ValueError ):
+        bloscpickle.loads_lazy( bloscpickle.dumps( data ) )
+
+def test_sequence_tuples_follow_the_pickler():
+    data = tuple( range(3000) )
+    assert bloscpickle.loads( bloscpickle.dumps( data, chunked_sequence=True ) ) == data
+    assert bloscpickle.loads( bloscpickle.dumps( data, pickler='json', chunked_sequence=True ) ) == list( data )
+
+
+####### SHELF AND SNAPSHOTS #######
+def test_shelf_round_trip( tmp_path ):
+    path = str( tmp_path / 'store' )
+    with bloscpickle.BloscShelf( path, 'c' ) as shelf:
+        for I in range( 100 ):
+            shelf['key {}'.format(I)] = {'value': I}
+        shelf['key 0'] = 'replaced'
+        del shelf['key 1']
+    with bloscpickle.BloscShelf( path, 'r' ) as shelf:
+        assert len(shelf) == 99
+        assert shelf['key 0'] == 'replaced' and 'key 1' not in shelf
+        assert shelf.get_many( ['key 50', 'key 2'] ) == [{'value': 50}, {'value': 2}]
+        with pytest.raises( PermissionError ):
+            shelf['new'] = 1
+    with bloscpickle.BloscShelf( path, 'w' ) as shelf:
+        shelf.compact()
+        assert shelf['key 99'] == {'value': 99}
+    with bloscpickle.BloscShelf( path, 'n' ) as shelf:
+        assert len(shelf) == 0
+
+def test_shelf_reopened_without_its_pickler( tmp_path ):
+    path = str( tmp_path / 'store' )
+    with bloscpickle.BloscShelf( path, 'c', pickler='json' ) as shelf:
+        shelf['a'] = {'value': 1}
+        shelf['b'] = [1, 2]
+    with bloscpickle.BloscShelf( path, 'r' ) as shelf:
+        assert shelf['a'] == {'value': 1}
+        assert shelf.get_many( ['b', 'a'] ) == [[1, 2], {'value': 1}]
+
+def test_shelf_does_not_truncate_without_index( tmp_path ):
+    path = str( tmp_path / 'store' )
+    with io.open( path, 'wb' ) as fh:
+        fh.write( b'precious' * 100 )
+    with pytest.raises( FileExistsError ):
+        bloscpickle.BloscShelf( path, 'c' )
+    assert os.path.getsize( path ) == 800
+    with pytest.raises( FileNotFoundError ):
+        bloscpickle.BloscShelf( path, 'w' )
+
+def test_shelf_index_is_not_a_header( tmp_path ):
+    path = str( tmp_path / 'store' )
+    with bloscpickle.BloscShelf( path, 'c' ) as shelf:
+        shelf['a'] = 1
+    with io.open( path + '.idx', 'rb' ) as fh:
+        with pytest.raises( ValueError ):
+            bloscpickle.inspect( fh.read() )
+
+@needsNumpy
+def test_snapshots_deduplicate( tmp_path ):
+    store = bloscpickle.BloscSnapshots( str( tmp_path / 'snapshots' ), avg_chunksize=2**12 )
+    data = makeRecords( 5000 )
+    first = store.save( 'first', data )
+    data[2500]['name'] = 'changed'
+    second = store.save( 'second', data )
+    assert second['new_chunks'] < first['new_chunks']
+    assert store['second'] == data and store['first'][2500]['name'] != 'changed'
+
+
+####### CACHE #######
+def test_loads_cache():
+    cache = bloscpickle.LoadsCache( maxsize=2 )
+    blobs = [ bloscpickle.dumps( {'index': I} ) for I in range( 3 ) ]
+    assert cache.loads( blobs[0] ) == {'index': 0}
+    assert cache.loads( blobs[0] ) is cache.loads( blobs[0] )
+    for blob in blobs:
+        cache.loads( blob )
+    assert len(cache) == 2 and cache.evictions == 1
+
+def test_loads_cache_reads_the_header():
+    cache = bloscpickle.LoadsCache()
+    bloscBytes = bloscpickle.dumps( {'a': [1, 2]}, pickler='json' )
+    assert cache.loads( bloscBytes ) == {'a': [1, 2]}
+    assert cache.loads( bloscBytes ) is cache.loads( bloscBytes )
+
+def test_loads_cache_memory_bound():
+    cache = bloscpickle.LoadsCache( maxbytes=2**16 )
+    small = bloscpickle.dumps( 'x' * 100 )
+    large = bloscpickle.dumps( 'y' * 2**17 )
+    cache.loads( small )
+    cache.loads( large )
+    assert len(cache) == 1
+
+def test_loads_cache_counts_every_part( typed ):
+    # Typed columns compress to a small fraction of what they decode to
+    cache = bloscpickle.LoadsCache( maxbytes=2**16 )
+    cache.loads( bloscpickle.dumps( {'ints': list( range(10**5) )} ) )
+    assert len(cache) == 0
+
+
+####### ASYNCIO #######
+@needsNumpy
+def test_adump_aload_over_a_socket( typed ):
+    messages = [ {'plain': 'x' * 1000}, np.arange( 10**5 ), {'records': makeRecords( 2000 )},
+                 {'array': np.ones( 10**4 )} ]
+
+    async def exchange():
+        received = []
+        async def handle( reader, writer ):
+            for I in range( len(messages) ):
+                received.append( await bloscpickle.aload( reader ) )
+            writer.close()
+        server = await asyncio.start_server( handle, '127.0.0.1', 0 )
+        reader, writer = await asyncio.open_connection( '127.0.0.1', server.sockets[0].getsockname()[1] )
+        for I, message in enumerate( messages ):
+            await bloscpickle.adump( message, writer, chunksize=2**14, out_of_band=I == 3 )
+        await reader.read()
+        writer.close()
+        server.close()
+        return received
+
+    received = asyncio.run( exchange() )
+    assert received[0] == messages[0] and received[2] == messages[2]
+    assert np.array_equal( received[1], messages[1] )
+    assert np.array_equal( received[3]['array'], messages[3]['array'] )
+
+
+####### CHANNELS #######
+def test_channel_over_a_socketpair():
+    left, right = socket.socketpair()
+    messages = [ {'small': 1}, 'x' * 2**20, makeRecords( 1000 ) ]
+    with bloscpickle.BloscChannel( left ) as sender, bloscpickle.BloscChannel( right ) as receiver:
+        def sendAll():
+            for message in messages:
+                sender.send( message )
+            sender.send_many( messages )
+        thread = threading.Thread( target=sendAll )
+        thread.start()
+        assert [ receiver.recv() for message in messages ] == messages
+        assert receiver.recv_many() == messages
+        thread.join()
+
+class SendallSocket(object):
+    """
+    A socket without sendmsg(), as on Windows, or whose sendmsg() is not 
+    implemented, as for ssl sockets.
+    """
+    def __init__( self, sock, sendmsg ):
+        self._sock = sock
+        if sendmsg:
+            self.sendmsg = self._notImplemented
+        
+    def _notImplemented( self, buffers ):
+        raise NotImplementedError( "sendmsg not allowed on instances of SSLSocket" )
+        
+    def sendall( self, data ):
+        return self._sock.sendall( data )
+    
+    def recv_into( self, buffer ):
+        return self._sock.recv_into( buffer )
+    
+    def close( self ):
+        self._sock.close()
+
+@pytest.mark.parametrize( 'sendmsg', [False, True] )
+def test_channel_without_sendmsg( sendmsg ):
+    left, right = socket.socketpair()
+    messages = [ {'small': 1}, 'x' * 2**20, makeRecords( 1000 ) ]
+    with bloscpickle.BloscChannel( SendallSocket( left, sendmsg ) ) as sender, \
+            bloscpickle.BloscChannel( right ) as receiver:
+        thread = threading.Thread( target=sender.send_many, args=(messages,) )
+        thread.start()
+        assert receiver.recv_many() == messages
+        thread.join()
+        sender.send( 'done' )
+        assert receiver.recv() == 'done'
+
+def test_channel_over_a_pipe():
+    readEnd, writeEnd = os.pipe()
+    with io.open( writeEnd, 'wb' ) as writeFile, io.open( readEnd, 'rb' ) as readFile:
+        sender = bloscpickle.BloscChannel( writeFile, adaptive=False, clevel=5 )
+        receiver = bloscpickle.BloscChannel( readFile )
+        thread = threading.Thread( target=sender.send, args=(list( range(10**5) ),) )
+        thread.start()
+        assert receiver.recv() == list( range(10**5) )
+        thread.join()
+
+
+####### MULTIPROCESSING #######
+def test_forking_pickler_round_trip():
+    data = list( range(10**5) )
+    compressed = bloscpickle.BloscForkingPickler.dumps( data )
+    assert len(compressed) < len( pickle.dumps( data ) )
+    # The receiving end needs only the standard unpickler
+    assert pickle.loads( bytes(compressed) ) == data
+
+def test_install_multiprocessing():
+    import multiprocessing
+    bloscpickle.install_multiprocessing( threshold=2**10 )
+    try:
+        sendEnd, recvEnd = multiprocessing.Pipe()
+        # Large messages fill the pipe, so they are sent from another thread
+        thread = threading.Thread( target=sendEnd.send, args=(list( range(10**5) ),) )
+        thread.start()
+        assert recvEnd.recv() == list( range(10**5) )
+        thread.join()
+    finally:
+        bloscpickle.uninstall_multiprocessing()
+
+@pytest.mark.skipif( not hasattr( os, 'fork' ), reason="needs fork()" )
+def test_forked_child_has_its_own_pool():
+    import multiprocessing
+    objects = [ {'index': I} for I in range( 10 ) ]
+    # Start the parent's thread pool before forking
+    assert bloscpickle.loads_many( bloscpickle.dumps_many( objects ) ) == objects
+    with multiprocessing.get_context( 'fork' ).Pool( 1 ) as pool:
+        blobs = pool.apply_async( bloscpickle.dumps_many, (objects,) ).get( timeout=60 )
+    assert bloscpickle.loads_many( blobs ) == objects
+
+
+####### COMMAND LINE #######
+@pytest.fixture
+def archive( tmp_path ):
+    """
+    A directory of files in every layout, and the objects they hold.
+    """
+    objects = {'plain.bp': {'x': list( range(10000) )}, 'json.bp': {'k': [1, 2, 3] * 1000},
+               'sequence.bp': list( range(5000) ), 'typed.bp': {'records': makeRecords( 2000 )},
+               'blosc.bp': {'words': [ 'w{}'.format(I % 50) for I in range( 5000 ) ]}}
+    os.makedirs( str( tmp_path / 'sub' ) )
+    for name, pyObject in objects.items():
+        path = str( tmp_path / name )
+        if name == 'sequence.bp':
+            with io.open( path, 'wb' ) as fh:
+                fh.write( bloscpickle.dumps( pyObject, chunked_sequence=100, clevel=5 ) )
+        elif name == 'blosc.bp':
+            with io.open( path, 'wb' ) as fh:
+                fh.write( bloscpickle.dumps( pyObject ) )
+        elif name == 'typed.bp':
+            bloscpickle.set_typed()
+            try:
+                with io.open( path, 'wb' ) as fh:
+                    bloscpickle.dump( pyObject, fh )
+            finally:
+                bloscpickle.set_typed( None )
+        else:
+            with io.open( path, 'wb' ) as fh:
+                bloscpickle.dump( pyObject, fh, pickler='json' if name == 'json.bp' else 'pickle',
+                                  compressor='lz4', clevel=9, chunksize=2**12 )
+    with io.open( str( tmp_path / 'sub' / 'junk.txt' ), 'wb' ) as fh:
+        fh.write( b'not a bloscpickle file' )
+    return tmp_path, objects
+
+def runMain( argv, capsys ):
+    status = bloscpickle.main( argv )
+    return status, capsys.readouterr().out
+
+def test_cli_inspect( archive, capsys ):
+    root, objects = archive
+    status, output = runMain( ['inspect', '--json', '-j', '1', str(root)], capsys )
+    assert status == 1 # junk.txt
+    results = { os.path.basename( result['path'] ): result
+                for result in map( json.loads, output.splitlines()[:-1] ) }
+    assert set(results) == set(objects)
+    assert results['sequence.bp']['format'] == 'sequence' and results['typed.bp']['format'] == 'typed'
+    assert results['json.bp']['pickler'] == 'json' and results['blosc.bp']['format'] == 'blosc'
+
+def test_cli_recompress_keeps_layouts( archive, capsys ):
+    root, objects = archive
+    status, output = runMain( ['recompress', '--pattern', '*.bp', '--compressor', 'zstd', '--clevel', '3',
+                               '-j', '2', '-q', str(root)], capsys )
+    assert status == 0
+    for name, pyObject in objects.items():
+        with io.open( str( root / name ), 'rb' ) as fh:
+            bloscBytes = fh.read()
+        info = bloscpickle.inspect( bloscBytes )
+        assert (info['compressor'], info['clevel']) == ('zstd', 3)
+        assert bloscpickle.loads( bloscBytes ) == pyObject
+    assert bloscpickle.inspect( io.open( str( root / 'typed.bp' ), 'rb' ).read() )['format'] == 'typed'
+    assert bloscpickle.inspect( io.open( str( root / 'blosc.bp' ), 'rb' ).read() )['format'] == 'blosc'
+    # The elements per block are carried over
+    assert bloscpickle.loads_lazy( io.open( str( root / 'sequence.bp' ), 'rb' ).read() )._blockLength == 100
+
+def test_cli_convert( archive, capsys ):
+    root, objects = archive
+    output = root / 'converted'
+    status, _ = runMain( ['convert', '--pattern', '*.bp', '--pickler', 'json', '--output', str(output),
+                          '-j', '1', '-q', str(root)], capsys )
+    assert status == 0
+    for name, pyObject in objects.items():
+        with io.open( str( output / name ), 'rb' ) as fh:
+            bloscBytes = fh.read()
+        info = bloscpickle.inspect( bloscBytes )
+        assert info['pickler'] == 'json'
+        assert (info['format'] == 'blosc') == (name == 'blosc.bp')
+        assert bloscpickle.loads( bloscBytes ) == pyObject